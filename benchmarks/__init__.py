@@ -0,0 +1,3 @@
+"""
+Бенчмарки горячих путей бота (запуск: python -m benchmarks.run).
+"""
@@ -0,0 +1,243 @@
+"""
+Бенчмарки Database и SQL веб-админки на БД с BENCH_QUERY_LOGS записями
+query_logs (по умолчанию 1 000 000).
+
+Засеянная БД кэшируется в benchmarks/.data/ (имя включает размер и версию
+схемы) и при каждом запуске копируется во временный каталог — записи
+бенчмарков не накапливаются в эталоне.
+"""
+
+import atexit
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.harness import DATA_DIR, bench
+
+QUERY_LOGS = int(os.getenv("BENCH_QUERY_LOGS", "1000000"))
+USERS = max(QUERY_LOGS // 20, 100)
+# Пользователи с полной историей диалога (CONVERSATION_HISTORY_LIMIT сообщений)
+HISTORY_USERS = min(USERS, 2000)
+BATCH = 50_000
+
+# Пользователь с историей и логами — на нём меряются точечные запросы
+HOT_USER = 1_000_001
+CITY = ("Астана", 51.1694, 71.4491)
+
+_TOPICS = [
+    "ораза", "намаз", "зекет", "сәресі", "ауызашар", "тарауих", "пітір садақа",
+    "құран", "дұға", "қажылық", "никах", "садақа", "ғұсыл", "дәрет", "мешіт",
+]
+_TEMPLATES = [
+    "{} кезінде тіс жууға бола ма",
+    "{} туралы не айтылған",
+    "{} қалай орындалады",
+    "{} уақыты қашан",
+    "{} бұзылса не істеу керек",
+    "что говорится про {}",
+    "можно ли {} в дороге",
+]
+
+_working_copy: str | None = None
+
+
+def _question(rng: random.Random) -> str:
+    topic = rng.choice(_TOPICS)
+    return rng.choice(_TEMPLATES).format(topic) + f" {rng.randint(1, 150)}"
+
+
+async def _seed(path: str):
+    """Создать БД со схемой приложения и синтетическими данными."""
+    from database.db import Database
+
+    db = Database(path)
+    await db.connect()
+    await db.close()
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    users = [
+        (HOT_USER + i, f"user{i}", f"Пайдаланушы {i}",
+         (now - timedelta(days=rng.uniform(0, 365))).strftime("%Y-%m-%d %H:%M:%S"))
+        for i in range(USERS)
+    ]
+    conn.executemany(
+        "INSERT INTO users (telegram_id, username, first_name, created_at) VALUES (?, ?, ?, ?)", users,
+    )
+    conn.commit()
+
+    # Логи за 90 дней; ~60% отвечены, вопросы с повторами — как в проде
+    for offset in range(0, QUERY_LOGS, BATCH):
+        rows = []
+        for _ in range(min(BATCH, QUERY_LOGS - offset)):
+            question = _question(rng)
+            answered = rng.random() < 0.6
+            created = now - timedelta(seconds=rng.uniform(0, 90 * 86400))
+            rows.append((
+                HOT_USER + rng.randrange(USERS), question, question,
+                question if answered else None,
+                f"Жауап: {question}. Толығырақ имамнан сұраңыз." if answered else None,
+                rng.uniform(0.7, 1.0) if answered else None,
+                answered, created.strftime("%Y-%m-%d %H:%M:%S"),
+            ))
+        conn.executemany(
+            "INSERT INTO query_logs (user_telegram_id, query_text, normalized_text, matched_question, "
+            "answer_text, similarity_score, was_answered, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+        print(f"  query_logs: {offset + len(rows)}/{QUERY_LOGS}", flush=True)
+
+    from config import CONVERSATION_HISTORY_LIMIT
+
+    conn.executemany(
+        "INSERT INTO conversation_history (user_telegram_id, role, message_text) VALUES (?, ?, ?)",
+        [
+            (HOT_USER + u, "user" if m % 2 == 0 else "assistant", _question(rng))
+            for u in range(HISTORY_USERS) for m in range(CONVERSATION_HISTORY_LIMIT)
+        ],
+    )
+
+    city, lat, lng = CITY
+    start = datetime(now.year, 1, 1)
+    conn.executemany(
+        "INSERT OR REPLACE INTO prayer_times_cache "
+        "(city_name, lat, lng, date, imsak, fajr, sunrise, dhuhr, asr, maghrib, isha) "
+        "VALUES (?, ?, ?, ?, '05:10', '05:20', '06:45', '13:05', '17:30', '19:50', '21:15')",
+        [(city, lat, lng, (start + timedelta(days=d)).strftime("%Y-%m-%d")) for d in range(366)],
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+async def _database_path() -> str:
+    """Рабочая копия засеянной БД (одна на запуск раннера)."""
+    global _working_copy
+    if _working_copy is not None:
+        return _working_copy
+
+    from database.migrations import LATEST_VERSION
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    seeded = os.path.join(DATA_DIR, f"bot_{QUERY_LOGS}_v{LATEST_VERSION}.db")
+    if not os.path.exists(seeded):
+        print(f"Seeding {seeded} ({QUERY_LOGS} query_logs)...", flush=True)
+        start = time.perf_counter()
+        await _seed(f"{seeded}.tmp")
+        os.replace(f"{seeded}.tmp", seeded)
+        print(f"Seeded in {time.perf_counter() - start:.0f} s", flush=True)
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_db_")
+    atexit.register(shutil.rmtree, tmp_dir, ignore_errors=True)
+    _working_copy = os.path.join(tmp_dir, "bot.db")
+    shutil.copyfile(seeded, _working_copy)
+    return _working_copy
+
+
+async def _open():
+    from database.db import Database
+
+    db = Database(await _database_path())
+    await db.connect()
+    return db
+
+
+def _case(name: str, number: int = 200, repeat: int = 5, params: tuple = (None,)):
+    """Бенчмарк метода БД: factory(db[, param]) → async callable; БД закрывается после замера."""
+    def decorator(factory):
+        async def setup(*param):
+            db = await _open()
+            return factory(db, *param), db.close
+        bench(name, number=number, repeat=repeat, params=params)(setup)
+        return factory
+    return decorator
+
+
+# ──────────────────────── Горячий путь сообщения ────────────────────────
+
+@_case("db.get_or_create_user", number=1000)
+def get_or_create_user(db):
+    return lambda: db.get_or_create_user(HOT_USER, "user0", "Пайдаланушы 0")
+
+
+@_case("db.get_user", number=1000)
+def get_user(db):
+    return lambda: db.get_user(HOT_USER)
+
+
+@_case("db.log_query", number=500)
+def log_query(db):
+    return lambda: db.log_query(
+        HOT_USER, "Ораза кезінде дәрі ішуге бола ма", "ораза кезінде дәрі ішуге бола ма",
+        "ораза кезінде дәрі ішуге бола ма", "Жауап", 0.93, True,
+    )
+
+
+@_case("db.get_conversation_history", number=1000)
+def get_conversation_history(db):
+    return lambda: db.get_conversation_history(HOT_USER)
+
+
+@_case("db.add_conversation_message", number=300)
+def add_conversation_message(db):
+    return lambda: db.add_conversation_message(HOT_USER, "user", "Сәресі уақыты қашан аяқталады")
+
+
+@_case("db.get_cached_prayer_times", number=500, params=("day", "month"))
+def get_cached_prayer_times(db, span: str):
+    _, lat, lng = CITY
+    year = datetime.utcnow().year
+    date_to = f"{year}-03-01" if span == "day" else f"{year}-03-31"
+    return lambda: db.get_cached_prayer_times(lat, lng, f"{year}-03-01", date_to)
+
+
+# ──────────────────────── Статистика и админка ────────────────────────
+
+@_case("db.get_stats_counters", number=1000)
+def get_stats_counters(db):
+    return db.get_stats_counters
+
+
+@_case("db.get_stats_rollup", number=200)
+def get_stats_rollup(db):
+    return lambda: db.get_stats_rollup("daily", 30)
+
+
+@_case("db.get_top_unanswered", number=1000)
+def get_top_unanswered(db):
+    return db.get_top_unanswered
+
+
+@_case("db.refresh_top_lists", number=1, repeat=3)
+def refresh_top_lists(db):
+    return db.refresh_top_lists
+
+
+@_case("admin.sql_list_logs", number=100, params=("first_page", "deep_cursor", "unanswered"))
+def list_logs(db, page: str):
+    from web_admin import sql_list_logs
+
+    if page == "first_page":
+        return lambda: sql_list_logs(db)
+    if page == "unanswered":
+        return lambda: sql_list_logs(db, filter_="unanswered")
+    # Курсор из середины таблицы
+    cursor = f"{(datetime.utcnow() - timedelta(days=45)).strftime('%Y-%m-%d %H:%M:%S')}|{QUERY_LOGS // 2}"
+    return lambda: sql_list_logs(db, cursor=cursor)
+
+
+@_case("admin.sql_search_logs", number=20, params=("ораза", "тіс жууға", "зекет уақыты"))
+def search_logs(db, query: str):
+    from web_admin import sql_search_logs
+
+    return lambda: sql_search_logs(db, query)
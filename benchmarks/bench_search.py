@@ -0,0 +1,164 @@
+"""
+Бенчмарки SearchEngine: search_context / search_cache при размерах базы
+1k / 10k / 100k документов («холодный» и «тёплый» случаи) и полная загрузка
+knowledge/ через load_all_knowledge.
+
+Холодный: новый PersistentClient (HNSW-индекс читается с диска) + первый
+запрос — как после рестарта бота. Тёплый: повторные запросы к открытому клиенту.
+Модель эмбеддингов грузится один раз и в замер не входит.
+
+Базы засеваются случайными нормированными векторами (кодировать 100k текстов
+моделью слишком долго) плюс настоящими эмбеддингами QUERIES — чтобы были
+попадания в кэш. Засеянные каталоги хранятся в benchmarks/.data/.
+"""
+
+import itertools
+import os
+import shutil
+import tempfile
+
+from benchmarks.harness import DATA_DIR, SkipBenchmark, bench
+
+SIZES = (1_000, 10_000, 100_000)
+SEED_BATCH = 5_000
+
+QUERIES = [
+    "ораза кезінде тіс жууға бола ма",
+    "сәресі уақыты қашан аяқталады",
+    "пітір садақа мөлшері қанша",
+    "можно ли принимать лекарства во время поста",
+    "тарауих намазы неше ракағат",
+]
+
+_model = None
+
+
+def _load_model():
+    global _model
+    if _model is None:
+        try:
+            from sentence_transformers import SentenceTransformer
+            import chromadb  # noqa: F401
+        except ImportError as e:
+            raise SkipBenchmark(f"search dependencies: {e}")
+        from config import EMBEDDING_MODEL
+
+        _model = SentenceTransformer(EMBEDDING_MODEL)
+    return _model
+
+
+def _open_engine(chroma_path: str):
+    """SearchEngine на каталоге ChromaDB с уже загруженной моделью."""
+    model = _load_model()
+    from core.search_engine import SearchEngine
+
+    engine = SearchEngine(chroma_path=chroma_path)
+    engine.init_cache_only()
+    engine._kb_collection = engine._client.get_or_create_collection(
+        name="knowledge_base", metadata={"hnsw:space": "cosine"},
+    )
+    engine._model = model
+    return engine
+
+
+def _forget_clients():
+    """Сбросить кэш клиентов ChromaDB — следующий откроет базу с диска."""
+    from chromadb.api.client import SharedSystemClient
+
+    SharedSystemClient.clear_system_cache()
+
+
+def _seed(path: str, size: int):
+    import numpy as np
+
+    model = _load_model()
+    engine = _open_engine(path)
+    dim = model.get_sentence_embedding_dimension()
+    rng = np.random.default_rng(size)
+    real = model.encode(QUERIES, show_progress_bar=False)
+
+    for collection in (engine._kb_collection, engine._cache_collection):
+        for offset in range(0, size, SEED_BATCH):
+            count = min(SEED_BATCH, size - offset)
+            vectors = rng.standard_normal((count, dim), dtype=np.float32)
+            if offset == 0:
+                vectors[:len(real)] = real
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            ids = [f"doc_{offset + i}" for i in range(count)]
+            documents = [
+                QUERIES[i] if offset == 0 and i < len(QUERIES) else f"Синтетикалық сұрақ {offset + i}"
+                for i in range(count)
+            ]
+            collection.upsert(
+                ids=ids,
+                embeddings=vectors.tolist(),
+                documents=documents,
+                metadatas=[
+                    {"answer": f"Жауап {doc_id}", "knowledge_id": doc_id, "source": "bench"}
+                    for doc_id in ids
+                ],
+            )
+    _forget_clients()
+
+
+def _chroma_path(size: int) -> str:
+    _load_model()
+    path = os.path.join(DATA_DIR, f"chroma_{size}")
+    marker = os.path.join(path, ".seeded")
+    if not os.path.exists(marker):
+        shutil.rmtree(path, ignore_errors=True)
+        print(f"Seeding {path} ({size} docs per collection)...", flush=True)
+        _seed(path, size)
+        open(marker, "w").close()
+    return path
+
+
+def _search(engine, method: str, query: str):
+    if method == "search_context":
+        return engine.search_context(query)
+    return engine.search_cache(query)
+
+
+def _cold(method: str):
+    def setup(size: int):
+        path = _chroma_path(size)
+        queries = itertools.cycle(QUERIES)
+
+        async def run():
+            _forget_clients()
+            engine = _open_engine(path)
+            await _search(engine, method, next(queries))
+        return run
+    return setup
+
+
+def _warm(method: str):
+    def setup(size: int):
+        engine = _open_engine(_chroma_path(size))
+        queries = itertools.cycle(QUERIES)
+        return lambda: _search(engine, method, next(queries))
+    return setup
+
+
+for _method in ("search_context", "search_cache"):
+    bench(f"search.{_method}.cold", number=1, repeat=5, params=SIZES)(_cold(_method))
+    bench(f"search.{_method}.warm", number=50, repeat=5, params=SIZES)(_warm(_method))
+
+
+@bench("search.load_all_knowledge", number=1, repeat=3)
+def load_all_knowledge():
+    _load_model()
+    from core.knowledge_loader import load_all_knowledge as load
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_chroma_")
+    engine = _open_engine(tmp_dir)
+
+    def run():
+        engine.reset_knowledge()
+        load(engine)
+
+    def cleanup():
+        _forget_clients()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return run, cleanup
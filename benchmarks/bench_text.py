@@ -0,0 +1,50 @@
+"""
+Бенчмарки обработки текста: normalize_text и parse_ai_response.
+"""
+
+from benchmarks.harness import SkipBenchmark, bench
+
+# Запросы пользователей: кириллица, казахская латиница и смесь в одной строке
+NORMALIZE_INPUTS = {
+    "cyrillic": "Ораза кезінде тіс жууға бола ма? Ауыз бекітуді бұзады ма!!!",
+    "latin": "Oraza kezinde tis juwǵa bola ma? Namaz uaqyty qashan bastalady?",
+    "mixed": "Oraza кезінде DÁRI ішуге bola ма?? Шай ішсем ne bolady... zhauap берiңiз",
+    "long_mixed": " ".join(
+        ["Sálem! Менің сұрағым: oraza ұстап жүргенде inhaliator қолдануға bola ma?"] * 20
+    ),
+}
+
+_SUGGESTIONS = "\n".join(f"💡 Ұсынылған сұрақ нөмірі {i}: ораза туралы не білесіз?" for i in range(3))
+_PARAGRAPH = (
+    "Ораза кезінде ауызға су кетпесе, тіс жуу оразаны бұзбайды. Дегенмен, "
+    "ғалымдар таңертеңгі сәресіден кейін пастаны аз қолдануды ұсынады. "
+    "Ханафи мазхабы бойынша мәкрүһ емес, бірақ абай болған жөн.\n\n"
+)
+
+# Длинные ответы ИИ: с маркером [SUGGESTIONS] (в т.ч. кириллическая «С»)
+# и с подсказками в хвосте без маркера (fallback-разбор)
+PARSE_INPUTS = {
+    "marker": _PARAGRAPH * 15 + "[SUGGESTIONS]\n" + _SUGGESTIONS,
+    "cyrillic_marker": "[СЕНІМСІЗ]\n" + _PARAGRAPH * 15 + "[СUGGESTIONS]\n" + _SUGGESTIONS,
+    "tail_fallback": _PARAGRAPH * 15 + _SUGGESTIONS,
+    "huge": _PARAGRAPH * 200 + "[SUGGESTIONS]\n" + _SUGGESTIONS,
+}
+
+
+@bench("text.normalize_text", number=2000, params=tuple(NORMALIZE_INPUTS))
+def normalize_text(kind: str):
+    from core.normalizer import normalize_text as normalize
+
+    text = NORMALIZE_INPUTS[kind]
+    return lambda: normalize(text)
+
+
+@bench("text.parse_ai_response", number=500, params=tuple(PARSE_INPUTS))
+def parse_ai_response(kind: str):
+    try:
+        from core.ai_engine import parse_ai_response as parse
+    except ImportError as e:
+        raise SkipBenchmark(f"core.ai_engine: {e}")
+
+    text = PARSE_INPUTS[kind]
+    return lambda: parse(text)
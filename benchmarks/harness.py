@@ -0,0 +1,191 @@
+"""
+Минимальный раннер бенчмарков (в духе asv, только stdlib).
+
+@bench регистрирует setup-функцию: она получает параметр (если заданы params)
+и возвращает измеряемый callable — обычный или async — либо пару
+(callable, cleanup). Setup может быть async. Callable вызывается number раз
+подряд, это повторяется repeat раз; в историю идёт время одного вызова.
+
+Если бенчмарку не хватает зависимостей или данных — setup бросает
+SkipBenchmark, и раннер пропускает его с причиной.
+"""
+
+import inspect
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+# Общие тяжёлые данные (засеянные БД и ChromaDB) — переиспользуются между запусками
+DATA_DIR = os.path.join(os.path.dirname(__file__), ".data")
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), "history.json")
+
+# Порог регрессии по медиане относительно прошлого запуска на этой машине
+REGRESSION_THRESHOLD = 0.10
+
+
+class SkipBenchmark(Exception):
+    """Бенчмарк нельзя выполнить в этом окружении."""
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable
+    number: int
+    repeat: int
+    params: tuple
+
+    def cases(self, quick: bool = False) -> list[tuple[str, Any]]:
+        """(полное имя, параметр) для каждого значения params."""
+        params = self.params[:1] if quick else self.params
+        if params == (None,):
+            return [(self.name, None)]
+        return [(f"{self.name}[{p}]", p) for p in params]
+
+
+BENCHMARKS: list[Benchmark] = []
+
+
+def bench(name: str, number: int = 100, repeat: int = 5, params: tuple = (None,)):
+    """Зарегистрировать бенчмарк (декоратор setup-функции)."""
+    def decorator(setup):
+        BENCHMARKS.append(Benchmark(name, setup, number, repeat, tuple(params)))
+        return setup
+    return decorator
+
+
+async def _call(func: Callable, *args):
+    result = func(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def measure(benchmark: Benchmark, param: Any, quick: bool = False) -> dict:
+    """Выполнить один случай бенчмарка; секунды на вызов по повторам."""
+    prepared = await _call(benchmark.setup) if param is None else await _call(benchmark.setup, param)
+    run, cleanup = prepared if isinstance(prepared, tuple) else (prepared, None)
+    number = benchmark.number
+    repeat = min(benchmark.repeat, 3) if quick else benchmark.repeat
+
+    timings = []
+    try:
+        # Прогрев: первый вызов не входит в замер (для «холодных» случаев
+        # run сам сбрасывает состояние на каждом вызове). Заодно узнаём,
+        # возвращает ли run awaitable (lambda вокруг корутины — тоже async)
+        first = run()
+        is_async = inspect.isawaitable(first)
+        if is_async:
+            await first
+        for _ in range(repeat):
+            start = time.perf_counter()
+            if is_async:
+                for _ in range(number):
+                    await run()
+            else:
+                for _ in range(number):
+                    run()
+            timings.append((time.perf_counter() - start) / number)
+    finally:
+        if cleanup is not None:
+            await _call(cleanup)
+
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+# ──────────────────────── История ────────────────────────
+
+def machine_info() -> dict:
+    return {
+        "host": socket.gethostname(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def load_history(path: str = HISTORY_PATH) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(history: list[dict], path: str = HISTORY_PATH):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def new_run(results: dict[str, dict], label: str = "") -> dict:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "label": label,
+        "machine": machine_info(),
+        "results": results,
+    }
+
+
+def compare(run: dict, history: list[dict], threshold: float = REGRESSION_THRESHOLD) -> list[dict]:
+    """
+    Сравнить медианы с последним прошлым запуском на той же машине
+    (host + python), где есть этот бенчмарк.
+    """
+    machine = run["machine"]
+    same_machine = [
+        h for h in history
+        if h["machine"].get("host") == machine["host"]
+        and h["machine"].get("python") == machine["python"]
+    ]
+    rows = []
+    for name, result in run["results"].items():
+        previous = next((h for h in reversed(same_machine) if name in h["results"]), None)
+        row = {"name": name, "median": result["median"], "previous": None, "ratio": None, "status": "new"}
+        if previous is not None:
+            before = previous["results"][name]["median"]
+            ratio = result["median"] / before if before else 1.0
+            row.update(previous=before, ratio=ratio, commit=previous.get("commit", ""))
+            if ratio > 1 + threshold:
+                row["status"] = "REGRESSION"
+            elif ratio < 1 - threshold:
+                row["status"] = "faster"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+    return rows
+
+
+def format_seconds(value: float) -> str:
+    if value >= 1:
+        return f"{value:.2f} s"
+    if value >= 1e-3:
+        return f"{value * 1e3:.2f} ms"
+    return f"{value * 1e6:.1f} µs"
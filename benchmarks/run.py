@@ -0,0 +1,125 @@
+"""
+Запуск бенчмарков и запись результатов в JSON-историю.
+
+Использование:
+    python -m benchmarks.run                       # все, результаты → benchmarks/history.json
+    python -m benchmarks.run -k db. -k normalize   # только имена с подстрокой
+    python -m benchmarks.run --quick               # первый параметр, 3 повтора
+    python -m benchmarks.run --query-logs 100000   # меньшая БД для быстрой проверки
+    python -m benchmarks.run --fail-on-regression  # код 1 при замедлении медианы > порога
+
+Каждый запуск сравнивается с предыдущим на той же машине (host + версия
+Python): медиана хуже больше чем на --threshold помечается REGRESSION.
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+MODULES = ("benchmarks.bench_text", "benchmarks.bench_search", "benchmarks.bench_db")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей бота")
+    parser.add_argument("-k", "--filter", action="append", default=[],
+                        help="Запускать только бенчмарки, имя которых содержит подстроку")
+    parser.add_argument("--quick", action="store_true", help="Только первый параметр, не больше 3 повторов")
+    parser.add_argument("--list", action="store_true", help="Показать бенчмарки и выйти")
+    parser.add_argument("--query-logs", type=int, help="Размер query_logs в засеянной БД (по умолчанию 1000000)")
+    parser.add_argument("--history", help="JSON-файл истории (по умолчанию benchmarks/history.json)")
+    parser.add_argument("--no-save", action="store_true", help="Не записывать результаты в историю")
+    parser.add_argument("--label", default="", help="Метка запуска в истории (например, имя деплоя)")
+    parser.add_argument("--threshold", type=float, help="Порог регрессии медианы (по умолчанию 0.10)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Код выхода 1 при регрессии")
+    return parser.parse_args()
+
+
+async def run_all(cases: list, quick: bool) -> dict[str, dict]:
+    from benchmarks.harness import SkipBenchmark, format_seconds, measure
+
+    results = {}
+    for benchmark, name, param in cases:
+        try:
+            result = await measure(benchmark, param, quick)
+        except (SkipBenchmark, ImportError) as e:
+            print(f"  {name:<50} skipped: {e}", flush=True)
+            continue
+        results[name] = result
+        print(
+            f"  {name:<50} {format_seconds(result['median']):>10}"
+            f"  (min {format_seconds(result['min'])}, ±{format_seconds(result['stdev'])})",
+            flush=True,
+        )
+    return results
+
+
+def main():
+    args = parse_args()
+    # Размер БД читается при импорте bench_db
+    if args.query_logs:
+        os.environ["BENCH_QUERY_LOGS"] = str(args.query_logs)
+
+    from loguru import logger
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    from benchmarks import harness
+
+    for module in MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"{module}: skipped ({e})")
+
+    cases = [
+        (benchmark, name, param)
+        for benchmark in harness.BENCHMARKS
+        for name, param in benchmark.cases(args.quick)
+        if not args.filter or any(f in name for f in args.filter)
+    ]
+    if args.list:
+        for _, name, _ in cases:
+            print(name)
+        return 0
+
+    results = asyncio.run(run_all(cases, args.quick))
+    if not results:
+        print("No benchmarks were run")
+        return 0
+
+    history_path = args.history or harness.HISTORY_PATH
+    history = harness.load_history(history_path)
+    run = harness.new_run(results, args.label)
+    threshold = harness.REGRESSION_THRESHOLD if args.threshold is None else args.threshold
+    rows = harness.compare(run, history, threshold)
+
+    print(f"\nCompared with the previous run on {run['machine']['host']} (threshold {threshold:.0%}):")
+    for row in rows:
+        if row["ratio"] is None:
+            print(f"  {row['name']:<50} {'new':>10}")
+        else:
+            print(
+                f"  {row['name']:<50} {row['ratio']:>9.2f}x  {row['status']}"
+                f"  (was {harness.format_seconds(row['previous'])} @ {row['commit'] or '?'})"
+            )
+
+    if not args.no_save:
+        history.append(run)
+        harness.save_history(history, history_path)
+        print(f"\nSaved to {history_path}")
+
+    regressions = [row for row in rows if row["status"] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regression(s)")
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
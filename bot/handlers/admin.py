@@ -4,12 +4,13 @@
 
 from aiogram import Router
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.types import BufferedInputFile, Message
 from loguru import logger
 
 from config import ADMIN_IDS, MSG_ADMIN_ONLY
 from core.search_engine import CacheEngine, SearchEngine
 from core.knowledge_loader import load_all_knowledge
+from core.profiler import FORMATS, ProfilerBusy, profile
 from database.db import Database
 
 router = Router()
@@ -26,10 +27,11 @@ async def cmd_admin_stats(message: Message, db: Database, cache_engine: CacheEng
         await message.answer(MSG_ADMIN_ONLY)
         return
 
-    total_users = await db.get_total_users()
-    total_queries = await db.get_total_queries()
-    answered = await db.get_answered_queries()
-    subscribed = await db.get_subscribed_users()
+    counters = await db.get_stats_counters()
+    total_users = counters.get("users_total", 0)
+    total_queries = counters.get("queries_total", 0)
+    answered = counters.get("queries_answered", 0)
+    subscribed = counters.get("users_subscribed", 0)
     top_questions = await db.get_top_questions(5)
     top_unanswered = await db.get_top_unanswered(5)
     cache_count = cache_engine.get_cache_count()
@@ -251,3 +253,39 @@ async def cmd_admin_consultation_stats(message: Message, db: Database, **kwargs)
 
     await message.answer(text)
     logger.info(f"Consultation stats requested by {message.from_user.id}")
+
+
+@router.message(Command("admin_profile"))
+async def cmd_admin_profile(message: Message, **kwargs):
+    """Профиль процесса бота: /admin_profile [секунд=10] [speedscope|collapsed]"""
+    if not is_admin(message.from_user.id):
+        await message.answer(MSG_ADMIN_ONLY)
+        return
+
+    parts = message.text.split()
+    try:
+        seconds = float(parts[1]) if len(parts) > 1 else 10
+    except ValueError:
+        await message.answer("Использование: /admin_profile [секунд] [speedscope|collapsed]")
+        return
+    fmt = parts[2].lower() if len(parts) > 2 else "speedscope"
+    if fmt not in FORMATS:
+        await message.answer(f"Формат: {' или '.join(FORMATS)}")
+        return
+
+    await message.answer(f"⏱ Профилирую процесс {seconds:g} с...")
+    try:
+        result = await profile(seconds)
+    except ProfilerBusy:
+        await message.answer("Профиль уже снимается, попробуйте позже.")
+        return
+
+    data, filename = result.render(fmt)
+    await message.answer_document(
+        BufferedInputFile(data, filename=filename),
+        caption=(
+            f"{result.seconds:.1f} с, {result.samples} выборок. "
+            f"Открыть: speedscope.app или flamegraph.pl (collapsed)"
+        ),
+    )
+    logger.info(f"Profile ({fmt}, {result.seconds:.1f}s) taken by admin {message.from_user.id}")
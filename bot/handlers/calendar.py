@@ -1,143 +1,23 @@
 """
 Обработчики Рамадан-календаря.
 Полный календарь на 30 дней без пагинации.
-Данные загружаются из API muftyat.kz и кэшируются в prayer_times_cache.
+Данные загружаются из API muftyat.kz и кэшируются в prayer_times_cache,
+готовые тексты — в core.calendar_render.
 """
 
-from datetime import datetime, date
-
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from loguru import logger
 
 from database.db import Database
 from core.muftyat_api import MuftyatAPI
-from core.ramadan_calendar import (
-    get_ramadan_day_number, is_ramadan,
-    ensure_prayer_times,
-    RAMADAN_START, RAMADAN_END,
-)
+from core.calendar_render import get_rendered
 
 router = Router()
 
-# Дни недели
-DOW_KK = {0: "Дс", 1: "Сс", 2: "Ср", 3: "Бс", 4: "Жм", 5: "Сб", 6: "Жк"}
-DOW_RU = {0: "Пн", 1: "Вт", 2: "Ср", 3: "Чт", 4: "Пт", 5: "Сб", 6: "Вс"}
-
-
-def _format_full_calendar(
-    schedule: list[dict],
-    city: str,
-    lang: str = "kk",
-) -> str:
-    """Сформировать полный красивый календарь на весь Рамадан."""
-    today_day = get_ramadan_day_number()
-    dow_names = DOW_KK if lang == "kk" else DOW_RU
-
-    # === Заголовок ===
-    if lang == "ru":
-        lines = ["🌙 <b>РАМАДАН 2026</b>"]
-        lines.append(f"📍 {city}")
-    else:
-        lines = ["🌙 <b>РАМАЗАН 2026</b>"]
-        lines.append(f"📍 {city}")
-
-    lines.append("")
-
-    # === Сегодняшний день (выделенный блок) ===
-    if today_day and 1 <= today_day <= len(schedule):
-        today_info = schedule[today_day - 1]
-        try:
-            dt = datetime.strptime(today_info["date"], "%Y-%m-%d")
-            dow = dow_names.get(dt.weekday(), "")
-        except (ValueError, KeyError):
-            dow = ""
-
-        day_date = today_info["date"][5:]  # MM-DD
-        fajr = today_info["fajr"]
-        maghrib = today_info["maghrib"]
-
-        if lang == "ru":
-            lines.append(f"📌 <b>СЕГОДНЯ: {today_day}-й день</b> ({day_date}, {dow})")
-            lines.append(f"    🌅 Сухур:  <b>{fajr}</b>")
-            lines.append(f"    🌇 Ифтар:  <b>{maghrib}</b>")
-        else:
-            lines.append(f"📌 <b>БҮГІН: {today_day}-күн</b> ({day_date}, {dow})")
-            lines.append(f"    🌅 Сәресі:   <b>{fajr}</b>")
-            lines.append(f"    🌇 Ауызашар: <b>{maghrib}</b>")
-
-        lines.append("")
-    elif not is_ramadan():
-        days_left = (RAMADAN_START - date.today()).days
-        if days_left > 0:
-            if lang == "ru":
-                lines.append(f"⏳ До Рамадана: <b>{days_left} дн.</b>")
-            else:
-                lines.append(f"⏳ Рамазанға: <b>{days_left} күн</b>")
-            lines.append("")
-
-    # === Таблица ===
-    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
-
-    if lang == "ru":
-        lines.append("<code> №  Дата  Дн │ Сухур  Ифтар</code>")
-    else:
-        lines.append("<code> №  Күні  Кн │ Сәрес  Ауыз.</code>")
-
-    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
 
-    for i, day_info in enumerate(schedule):
-        day_num = i + 1
-        date_str = day_info["date"][5:]  # MM-DD → "02-19"
-        fajr = day_info["fajr"]
-        maghrib = day_info["maghrib"]
-
-        try:
-            dt = datetime.strptime(day_info["date"], "%Y-%m-%d")
-            dow = dow_names.get(dt.weekday(), "  ")
-        except (ValueError, KeyError):
-            dow = "  "
-
-        is_today = today_day and day_num == today_day
-        line = f"{day_num:>2}  {date_str} {dow} │ {fajr}  {maghrib}"
-
-        if is_today:
-            lines.append(f"🟢<code>{line}</code>")
-        else:
-            lines.append(f"<code>{line}</code>")
-
-        # Визуальный разделитель каждые 10 дней
-        if day_num % 10 == 0 and day_num < len(schedule):
-            lines.append("<code>  ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─</code>")
-
-    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
-
-    # Подпись
-    if lang == "ru":
-        lines.append("🌅 Сухур — прекратить еду  |  🌇 Ифтар — разговение")
-    else:
-        lines.append("🌅 Сәресі — тамақ тоқтату  |  🌇 Ауызашар")
-
-    return "\n".join(lines)
-
-
-async def _get_ramadan_schedule(
-    db: Database, muftyat_api: MuftyatAPI, city: str, lat: float, lng: float
-) -> list[dict]:
-    """Получить расписание Рамадана из кэша или API."""
-    await ensure_prayer_times(muftyat_api, db, city, lat, lng)
-
-    all_days = await db.get_cached_prayer_times(
-        lat, lng,
-        RAMADAN_START.isoformat(),
-        RAMADAN_END.isoformat(),
-    )
-    return all_days
-
-
-async def _show_calendar(target, db: Database, muftyat_api: MuftyatAPI, user_id: int, edit: bool = False):
+async def _show_calendar(target, db: Database, muftyat_api: MuftyatAPI, user_id: int, user: dict = None, edit: bool = False):
     """Показать полный календарь."""
-    user = await db.get_user(user_id)
+    user = user or await db.get_user(user_id)
     lang = user.get("language", "kk") if user else "kk"
     city = user.get("city") if user else None
     lat = user.get("city_lat") if user else None
@@ -154,19 +34,12 @@ async def _show_calendar(target, db: Database, muftyat_api: MuftyatAPI, user_id:
             await target.answer(text)
         return
 
-    schedule = await _get_ramadan_schedule(db, muftyat_api, city, lat, lng)
-    if not schedule:
+    text = await get_rendered("calendar", db, muftyat_api, city, lat, lng, lang)
+    if text is None:
         if lang == "ru":
             text = "Рамадан ещё не начался или уже закончился."
         else:
             text = "Рамазан әлі басталмаған немесе аяқталған."
-        if edit and hasattr(target, "edit_text"):
-            await target.edit_text(text)
-        else:
-            await target.answer(text)
-        return
-
-    text = _format_full_calendar(schedule, city, lang)
 
     if edit and hasattr(target, "edit_text"):
         await target.edit_text(text)
@@ -177,105 +50,21 @@ async def _show_calendar(target, db: Database, muftyat_api: MuftyatAPI, user_id:
 # Казахский текст кнопки
 @router.message(F.text == "📅 Күнтізбе")
 async def btn_calendar_kk(message: Message, db: Database, muftyat_api: MuftyatAPI, **kwargs):
-    await _show_calendar(message, db, muftyat_api, message.from_user.id)
+    await _show_calendar(message, db, muftyat_api, message.from_user.id, user=kwargs.get("user"))
 
 
 # Русский текст кнопки
 @router.message(F.text == "📅 Календарь")
 async def btn_calendar_ru(message: Message, db: Database, muftyat_api: MuftyatAPI, **kwargs):
-    await _show_calendar(message, db, muftyat_api, message.from_user.id)
+    await _show_calendar(message, db, muftyat_api, message.from_user.id, user=kwargs.get("user"))
 
 
 # ──────────── Намаз уақыты / Время намаза (таблица 6 намазов) ────────────
 
-# Названия намазов
-PRAYER_NAMES_KK = ["Имсақ", "Таңғы", "Күн ш.", "Бесін", "Екінті", "Ақшам", "Құптан"]
-PRAYER_NAMES_RU = ["Имсак", "Фаджр", "Восход", "Зухр", "Аср", "Магриб", "Иша"]
-
-
-def _format_prayer_times_table(
-    schedule: list[dict],
-    city: str,
-    lang: str = "kk",
-) -> str:
-    """Сформировать таблицу всех намазов за 30 дней Рамадана."""
-    today_day = get_ramadan_day_number()
-    dow_names = DOW_KK if lang == "kk" else DOW_RU
-
-    if lang == "ru":
-        lines = ["🕌 <b>ВРЕМЯ НАМАЗА — РАМАДАН 2026</b>"]
-    else:
-        lines = ["🕌 <b>НАМАЗ УАҚЫТЫ — РАМАЗАН 2026</b>"]
-
-    lines.append(f"📍 {city}")
-    lines.append("")
-
-    # Сегодняшний день — подробная карточка
-    if today_day and 1 <= today_day <= len(schedule):
-        today_info = schedule[today_day - 1]
-        try:
-            dt = datetime.strptime(today_info["date"], "%Y-%m-%d")
-            dow = dow_names.get(dt.weekday(), "")
-        except (ValueError, KeyError):
-            dow = ""
-
-        day_date = today_info["date"][5:]
-        names = PRAYER_NAMES_RU if lang == "ru" else PRAYER_NAMES_KK
-
-        if lang == "ru":
-            lines.append(f"📌 <b>СЕГОДНЯ: {today_day}-й день</b> ({day_date}, {dow})")
-        else:
-            lines.append(f"📌 <b>БҮГІН: {today_day}-күн</b> ({day_date}, {dow})")
-
-        lines.append(f"    {names[0]}: <b>{today_info.get('imsak', '-')}</b>  |  {names[1]}: <b>{today_info.get('fajr', '-')}</b>")
-        lines.append(f"    {names[2]}: <b>{today_info.get('sunrise', '-')}</b>  |  {names[3]}: <b>{today_info.get('dhuhr', '-')}</b>")
-        lines.append(f"    {names[4]}: <b>{today_info.get('asr', '-')}</b>  |  {names[5]}: <b>{today_info.get('maghrib', '-')}</b>")
-        lines.append(f"    {names[6]}: <b>{today_info.get('isha', '-')}</b>")
-        lines.append("")
-
-    # Таблица
-    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
 
-    if lang == "ru":
-        lines.append("<code> №  Дата  │ Фадж Зухр  Аср Маг  Иша</code>")
-    else:
-        lines.append("<code> №  Күні  │ Таңғ Бесн Екнт Ақшм Құпт</code>")
-
-    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
-
-    for i, day_info in enumerate(schedule):
-        day_num = i + 1
-        date_str = day_info["date"][5:]  # MM-DD
-        fajr = day_info.get("fajr", "--:--")
-        dhuhr = day_info.get("dhuhr", "--:--")
-        asr = day_info.get("asr", "--:--")
-        maghrib = day_info.get("maghrib", "--:--")
-        isha = day_info.get("isha", "--:--")
-
-        is_today = today_day and day_num == today_day
-        line = f"{day_num:>2}  {date_str} │ {fajr} {dhuhr} {asr} {maghrib} {isha}"
-
-        if is_today:
-            lines.append(f"🟢<code>{line}</code>")
-        else:
-            lines.append(f"<code>{line}</code>")
-
-        if day_num % 10 == 0 and day_num < len(schedule):
-            lines.append("<code>  ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─</code>")
-
-    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
-
-    if lang == "ru":
-        lines.append("Фадж=Фаджр  Маг=Магриб  Иша=Ночной")
-    else:
-        lines.append("Таңғ=Таңғы  Бесн=Бесін  Ақшм=Ақшам  Құпт=Құптан")
-
-    return "\n".join(lines)
-
-
-async def _show_prayer_times(target, db: Database, muftyat_api: MuftyatAPI, user_id: int):
+async def _show_prayer_times(target, db: Database, muftyat_api: MuftyatAPI, user_id: int, user: dict = None):
     """Показать таблицу времён намаза."""
-    user = await db.get_user(user_id)
+    user = user or await db.get_user(user_id)
     lang = user.get("language", "kk") if user else "kk"
     city = user.get("city") if user else None
     lat = user.get("city_lat") if user else None
@@ -289,28 +78,24 @@ async def _show_prayer_times(target, db: Database, muftyat_api: MuftyatAPI, user
         await target.answer(text)
         return
 
-    schedule = await _get_ramadan_schedule(db, muftyat_api, city, lat, lng)
-    if not schedule:
+    text = await get_rendered("prayer_times", db, muftyat_api, city, lat, lng, lang)
+    if text is None:
         if lang == "ru":
             text = "Рамадан ещё не начался или уже закончился."
         else:
             text = "Рамазан әлі басталмаған немесе аяқталған."
-        await target.answer(text)
-        return
-
-    text = _format_prayer_times_table(schedule, city, lang)
     await target.answer(text)
 
 
 # Кнопки "Намаз уақыты" / "Время намаза"
 @router.message(F.text == "🕌 Намаз уақыты")
 async def btn_prayer_times_kk(message: Message, db: Database, muftyat_api: MuftyatAPI, **kwargs):
-    await _show_prayer_times(message, db, muftyat_api, message.from_user.id)
+    await _show_prayer_times(message, db, muftyat_api, message.from_user.id, user=kwargs.get("user"))
 
 
 @router.message(F.text == "🕌 Время намаза")
 async def btn_prayer_times_ru(message: Message, db: Database, muftyat_api: MuftyatAPI, **kwargs):
-    await _show_prayer_times(message, db, muftyat_api, message.from_user.id)
+    await _show_prayer_times(message, db, muftyat_api, message.from_user.id, user=kwargs.get("user"))
 
 
 # Inline-кнопка календаря под ответом ИИ
@@ -41,7 +41,7 @@ def _get_confirm_keyboard(lang: str = "kk") -> InlineKeyboardMarkup:
 @router.message(F.text.in_({"🕌 Ұстазға сұрақ", "🕌 Вопрос устазу"}))
 async def btn_ask_ustaz(message: Message, db: Database, state: FSMContext, **kwargs):
     """Кнопка 'Устазға сұрақ' из главной клавиатуры."""
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
 
     await state.set_state(ConsultationStates.waiting_for_question)
@@ -72,7 +72,7 @@ async def on_question_text(message: Message, db: Database, state: FSMContext, **
     if not question_text:
         return
 
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
 
     # Формируем тему (первое предложение, до 60 символов)
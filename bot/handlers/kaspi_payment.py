@@ -153,7 +153,7 @@ async def _verify_receipt(message: Message, db: Database, ai_engine: AIEngine,
 async def on_receipt_photo(message: Message, db: Database, ai_engine: AIEngine,
                            state: FSMContext, bot: Bot, **kwargs):
     """Пользователь отправил фото чека."""
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
 
     file_id = message.photo[-1].file_id
@@ -169,7 +169,7 @@ async def on_receipt_photo(message: Message, db: Database, ai_engine: AIEngine,
 async def on_receipt_document(message: Message, db: Database, ai_engine: AIEngine,
                               state: FSMContext, bot: Bot, **kwargs):
     """Пользователь отправил документ (PDF) чека."""
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
 
     doc = message.document
@@ -209,7 +209,7 @@ async def on_receipt_document(message: Message, db: Database, ai_engine: AIEngin
 @router.message(KaspiPaymentStates.waiting_for_receipt)
 async def on_receipt_not_photo(message: Message, db: Database, state: FSMContext, **kwargs):
     """Пользователь отправил не фото/PDF в состоянии ожидания чека."""
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
 
     await message.answer(
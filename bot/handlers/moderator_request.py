@@ -21,7 +21,7 @@ class ModeratorRequestStates(StatesGroup):
 @router.message(F.text.in_({"📝 Әкімшілікке жазу", "📝 Написать администрации"}))
 async def btn_write_admin(message: Message, db: Database, state: FSMContext, **kwargs):
     """Кнопка 'Написать администрации'."""
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
 
     await state.set_state(ModeratorRequestStates.waiting_for_message)
@@ -37,7 +37,7 @@ async def on_moderator_message(message: Message, db: Database, state: FSMContext
     if not text:
         return
 
-    user = await db.get_user(user_id)
+    user = kwargs.get("user") or await db.get_user(user_id)
     lang = user.get("language", "kk") if user else "kk"
 
     # Создаём тикет
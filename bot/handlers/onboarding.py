@@ -14,7 +14,7 @@ from loguru import logger
 from database.db import Database
 from core.messages import get_msg, LANGUAGE_NAMES
 from core.muftyat_api import MuftyatAPI
-from core.cities import CITIES, CITY_COORDINATES
+from core.cities import CITIES, CITY_COORDINATES, city_index
 from bot.states.onboarding import OnboardingStates
 from bot.handlers.user import get_main_keyboard
 
@@ -169,7 +169,7 @@ async def on_other_city(callback: CallbackQuery, state: FSMContext, **kwargs):
 async def on_city_search(
     message: Message, state: FSMContext, muftyat_api: MuftyatAPI, **kwargs
 ):
-    """Пользователь ввёл название города — ищем через API."""
+    """Пользователь ввёл название города — ищем в индексе городов."""
     await _do_city_search(message, state, muftyat_api, message.text)
 
 
@@ -184,12 +184,12 @@ async def on_city_search_retry(
 async def _do_city_search(
     message: Message, state: FSMContext, api: MuftyatAPI, query: str
 ):
-    """Поиск города через API muftyat.kz."""
+    """Поиск города: локальный индекс, при промахе — API muftyat.kz."""
     data = await state.get_data()
     lang = data.get("lang", "kk")
 
     query = query.strip()[:100]
-    cities = await api.search_cities(query)
+    cities = await city_index.search(query, api)
     if not cities:
         await message.answer(get_msg("onboarding_search_no_results", lang))
         await state.set_state(OnboardingStates.searching_city)
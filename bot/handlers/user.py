@@ -52,7 +52,7 @@ def get_main_keyboard(lang: str = "kk") -> ReplyKeyboardMarkup:
 
 @router.message(Command("help"))
 async def cmd_help(message: Message, db: Database, **kwargs):
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
     await message.answer(get_msg("help", lang))
 
@@ -60,7 +60,7 @@ async def cmd_help(message: Message, db: Database, **kwargs):
 @router.message(Command("clear"))
 async def cmd_clear(message: Message, db: Database, **kwargs):
     """Очистить историю диалога."""
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
     await db.clear_conversation_history(message.from_user.id)
     await message.answer(get_msg("history_cleared", lang))
@@ -69,7 +69,7 @@ async def cmd_clear(message: Message, db: Database, **kwargs):
 @router.message(Command("terms"))
 async def cmd_terms(message: Message, db: Database, **kwargs):
     """Условия использования (обязательно для Telegram Payments)."""
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
     await message.answer(get_msg("terms", lang))
 
@@ -77,20 +77,25 @@ async def cmd_terms(message: Message, db: Database, **kwargs):
 @router.message(Command("paysupport"))
 async def cmd_paysupport(message: Message, db: Database, **kwargs):
     """Поддержка по оплате (обязательно для Telegram Payments)."""
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
     await message.answer(get_msg("paysupport", lang))
 
 
 @router.message(Command("stats"))
 async def cmd_stats(message: Message, db: Database, search_engine: SearchEngine, **kwargs):
-    user = await db.get_or_create_user(
-        telegram_id=message.from_user.id,
-        username=message.from_user.username,
-        first_name=message.from_user.first_name,
-    )
+    # Пользователь и подписка уже загружены UserContextMiddleware
+    user = kwargs.get("user")
+    if user is None:
+        user = await db.get_or_create_user(
+            telegram_id=message.from_user.id,
+            username=message.from_user.username,
+            first_name=message.from_user.first_name,
+        )
+        is_subscribed = await db.check_subscription(message.from_user.id)
+    else:
+        is_subscribed = kwargs.get("is_subscribed", False)
     lang = user.get("language", "kk")
-    is_subscribed = await db.check_subscription(message.from_user.id)
     expires = user.get("subscription_expires_at", "—")
 
     if is_subscribed and expires:
@@ -126,7 +131,7 @@ async def btn_terms(message: Message, db: Database, **kwargs):
 # Кнопка смены языка KZ/RU
 @router.message(F.text == "🌐 KZ/RU")
 async def btn_switch_language(message: Message, db: Database, **kwargs):
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     current_lang = user.get("language", "kk") if user else "kk"
     new_lang = "ru" if current_lang == "kk" else "kk"
     await db.update_user_language(message.from_user.id, new_lang)
@@ -167,7 +172,7 @@ async def on_suggestion_click(
 
 @router.message(F.content_type != "text")
 async def handle_non_text(message: Message, db: Database, **kwargs):
-    user = await db.get_user(message.from_user.id)
+    user = kwargs.get("user") or await db.get_user(message.from_user.id)
     lang = user.get("language", "kk") if user else "kk"
     await message.answer(get_msg("non_text", lang))
 
@@ -184,7 +189,7 @@ async def handle_text_message(
     original_text = message.text.strip()
     normalized = normalize_text(original_text)
     if not normalized:
-        user = await db.get_user(message.from_user.id)
+        user = kwargs.get("user") or await db.get_user(message.from_user.id)
         lang = user.get("language", "kk") if user else "kk"
         await message.answer(get_msg("non_text", lang))
         return
@@ -207,7 +212,7 @@ async def _process_question(
 
     logger.info(f"Query from {user_id}: '{original_text[:80]}'")
 
-    user = await db.get_user(user_id)
+    user = kwargs.get("user") or await db.get_user(user_id)
     lang = user.get("language", "kk") if user else "kk"
 
     thinking_msg = await message.answer(get_msg("thinking", lang))
@@ -1,77 +1,53 @@
 """
-Middleware для rate limiting — защита от спама.
-Максимум RATE_LIMIT_PER_MINUTE запросов в минуту на пользователя.
-Нажатия кнопок главной клавиатуры НЕ учитываются в лимите.
+Rate limiting — защита от спама (применяется в UserContextMiddleware).
+Максимум RATE_LIMIT_PER_MINUTE запросов в минуту на пользователя (GCRA,
+O(1) памяти и времени на запрос). Состояние в памяти процесса: в run_cluster.py
+пользователь закреплён за одним процессом, общее хранилище не нужно.
 """
 
 import time
-from collections import defaultdict
-from typing import Any, Awaitable, Callable, Dict
-
-from aiogram import BaseMiddleware
-from aiogram.types import Message
+from typing import Dict
 
 from config import RATE_LIMIT_PER_MINUTE
-from core.messages import get_msg
-
-# Тексты кнопок главной клавиатуры (обоих языков) — не считаются в rate limit
-_BUTTON_TEXTS = {
-    "📅 Күнтізбе", "📅 Календарь",
-    "🕌 Ұстазға сұрақ", "🕌 Вопрос устазу",
-    "📊 Статистика",
-    "📝 Әкімшілікке жазу", "📝 Написать администрации",
-    "❓ Анықтама", "❓ Справка",
-    "📜 Шарттар", "📜 Условия",
-    "🌐 KZ/RU",
-}
-
-
-class RateLimitMiddleware(BaseMiddleware):
-    def __init__(self, limit: int = RATE_LIMIT_PER_MINUTE):
-        self.limit = limit
-        # {user_id: [timestamp1, timestamp2, ...]}
-        self._requests: Dict[int, list] = defaultdict(list)
-
-    async def __call__(
-        self,
-        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
-        event: Message,
-        data: Dict[str, Any],
-    ) -> Any:
-        if not isinstance(event, Message) or not event.from_user:
-            return await handler(event, data)
-
-        # Команды и кнопки клавиатуры — пропускаем без rate limit
-        if event.text and (event.text.startswith("/") or event.text in _BUTTON_TEXTS):
-            return await handler(event, data)
-
-        user_id = event.from_user.id
-        now = time.time()
-
-        # Очистка памяти при большом количестве пользователей
-        if len(self._requests) > 5000:
-            stale_users = [
-                uid for uid, timestamps in self._requests.items()
-                if not timestamps or now - timestamps[-1] > 120
-            ]
-            for uid in stale_users:
-                del self._requests[uid]
-
-        # Очищаем старые записи (старше 60 секунд)
-        self._requests[user_id] = [
-            ts for ts in self._requests[user_id] if now - ts < 60
-        ]
-
-        if len(self._requests[user_id]) >= self.limit:
-            # Определяем язык пользователя
-            db = data.get("db")
-            lang = "kk"
-            if db:
-                user = await db.get_user(user_id)
-                if user:
-                    lang = user.get("language", "kk")
-            await event.answer(get_msg("rate_limit", lang))
-            return None
 
-        self._requests[user_id].append(now)
-        return await handler(event, data)
+# Сколько пользователей помнить (сверх — вытесняются давно активные)
+MAX_TRACKED_USERS = 50000
+# Сколько записей проверять на истечение за один запрос
+EXPIRE_BATCH = 2
+
+
+class RateLimiter:
+    """
+    GCRA: на пользователя хранится одно число — теоретическое время прихода
+    следующего запроса (TAT). Допускается всплеск до limit сообщений,
+    дальше — одно сообщение каждые period / limit секунд.
+    """
+
+    def __init__(self, limit: int = RATE_LIMIT_PER_MINUTE, period: float = 60.0, max_users: int = MAX_TRACKED_USERS):
+        self.interval = period / limit
+        self.burst = period
+        self.max_users = max_users
+        # {user_id: TAT}; порядок вставки = порядок последнего обновления
+        self._tat: Dict[int, float] = {}
+
+    def hit(self, user_id: int, now: float = None) -> bool:
+        """Учесть запрос; False — лимит превышен (запрос не учитывается)."""
+        now = time.monotonic() if now is None else now
+        tat = max(self._tat.get(user_id, now), now) + self.interval
+        if tat - now > self.burst:
+            return False
+        # pop + вставка переносит пользователя в конец словаря
+        self._tat.pop(user_id, None)
+        self._tat[user_id] = tat
+        self._expire(now)
+        return True
+
+    def _expire(self, now: float):
+        """Амортизированная очистка: с начала словаря, не больше EXPIRE_BATCH записей за вызов."""
+        for _ in range(EXPIRE_BATCH):
+            user_id = next(iter(self._tat))
+            if self._tat[user_id] > now and len(self._tat) <= self.max_users:
+                break
+            # Истёкший TAT равносилен отсутствию записи; при переполнении
+            # вытесняется самый давно активный пользователь
+            del self._tat[user_id]
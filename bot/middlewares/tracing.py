@@ -0,0 +1,77 @@
+"""
+Трассировка на стороне aiogram (спаны — core.tracing).
+
+- TracingMiddleware — внешний middleware на dp.update: корневой спан апдейта,
+  счётчики апдейтов и ошибок.
+- TracedMiddleware — обёртка middleware: время до вызова хендлера (mw.*),
+  сам хендлер в спан middleware не входит.
+- TelegramTracing — middleware сессии бота: каждый запрос Bot API (telegram.*).
+"""
+
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+
+from core.metrics import registry
+from core.tracing import record, span, trace_update
+
+UPDATES = registry.counter("bot_updates_total", "Обработанные апдейты по типу", labels=("type",))
+UPDATE_ERRORS = registry.counter("bot_update_errors_total", "Апдейты с необработанной ошибкой", labels=("type",))
+TELEGRAM_ERRORS = registry.counter("telegram_api_errors_total", "Ошибки запросов Bot API", labels=("method",))
+
+
+class TracingMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        event_type = event.event_type
+        UPDATES.inc(event_type)
+        with trace_update(f"update.{event_type}", event.update_id):
+            try:
+                return await handler(event, data)
+            except Exception:
+                UPDATE_ERRORS.inc(event_type)
+                raise
+
+
+class TracedMiddleware(BaseMiddleware):
+    def __init__(self, inner: BaseMiddleware, stage: str = None):
+        self.inner = inner
+        self.stage = stage or f"mw.{type(inner).__name__}"
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        start = time.perf_counter()
+        reached = False
+
+        async def next_handler(event: TelegramObject, data: Dict[str, Any]) -> Any:
+            nonlocal reached
+            reached = True
+            record(self.stage, start, time.perf_counter() - start)
+            return await handler(event, data)
+
+        result = await self.inner(next_handler, event, data)
+        if not reached:
+            # Middleware сам ответил и не передал апдейт дальше
+            record(self.stage, start, time.perf_counter() - start)
+        return result
+
+
+class TelegramTracing(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        with span(f"telegram.{method.__api_method__}"):
+            try:
+                return await make_request(bot, method)
+            except Exception:
+                TELEGRAM_ERRORS.inc(method.__api_method__)
+                raise
@@ -0,0 +1,106 @@
+"""
+Middleware контекста пользователя: один SELECT на входящее сообщение.
+
+Загружает пользователя (создаёт при первом сообщении), определяет язык,
+подписку и кладёт всё в data для хендлеров: user, user_lang, is_subscribed.
+Затем rate limit и лимит бесплатных ответов.
+
+- Команды, платёжные сообщения и кнопки главной клавиатуры проходят
+  без rate limit и проверки лимита.
+- Пользователи в активных FSM-состояниях (онбординг, Kaspi, консультация,
+  тикеты) проходят без проверки лимита.
+"""
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+from aiogram.fsm.context import FSMContext
+
+from config import FREE_ANSWERS_LIMIT
+from core.messages import get_msg
+from database.db import Database
+from bot.keyboards.inline import get_subscription_keyboard
+from bot.middlewares.rate_limit import RateLimiter
+
+# Тексты кнопок главной клавиатуры (обоих языков)
+BUTTON_TEXTS = {
+    "📅 Күнтізбе", "📅 Календарь",
+    "🕌 Ұстазға сұрақ", "🕌 Вопрос устазу",
+    "📊 Статистика",
+    "📝 Әкімшілікке жазу", "📝 Написать администрации",
+    "❓ Анықтама", "❓ Справка",
+    "📜 Шарттар", "📜 Условия",
+    "🌐 KZ/RU",
+}
+
+# FSM-состояния, в которых лимит бесплатных ответов не проверяется
+_FREE_STATES = (
+    "OnboardingStates:",
+    "KaspiPaymentStates:",
+    "ConsultationStates:",
+    "ModeratorRequestStates:",
+)
+
+
+class UserContextMiddleware(BaseMiddleware):
+    def __init__(self, db: Database, limiter: RateLimiter = None):
+        self.db = db
+        self.limiter = limiter or RateLimiter()
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Message) or not event.from_user:
+            return await handler(event, data)
+
+        user_id = event.from_user.id
+        user = await self.db.get_or_create_user(
+            telegram_id=user_id,
+            username=event.from_user.username,
+            first_name=event.from_user.first_name,
+        )
+        user_lang = user.get("language", "kk")
+
+        is_subscribed = self.db.subscription_active(user)
+        if user["is_subscribed"] and not is_subscribed:
+            # Подписка истекла — редкая запись, только в момент истечения
+            await self.db.expire_subscription(user_id)
+            user["is_subscribed"] = False
+            user["subscription_expires_at"] = None
+
+        data["user"] = user
+        data["user_lang"] = user_lang
+        data["is_subscribed"] = is_subscribed
+
+        # Платёжные сообщения, команды и кнопки главной клавиатуры — без ограничений
+        if event.successful_payment or (
+            event.text and (event.text.startswith("/") or event.text in BUTTON_TEXTS)
+        ):
+            return await handler(event, data)
+
+        if not self.limiter.hit(user_id):
+            await event.answer(get_msg("rate_limit", user_lang))
+            return None
+
+        if is_subscribed:
+            return await handler(event, data)
+
+        state: FSMContext = data.get("state")
+        if state:
+            current_state = await state.get_state()
+            if current_state and current_state.startswith(_FREE_STATES):
+                return await handler(event, data)
+
+        # Проверяем лимит бесплатных ответов
+        if user["answers_count"] >= FREE_ANSWERS_LIMIT:
+            await event.answer(
+                get_msg("limit_reached", user_lang, limit=FREE_ANSWERS_LIMIT),
+                reply_markup=get_subscription_keyboard(lang=user_lang),
+            )
+            return None
+
+        return await handler(event, data)
@@ -0,0 +1,146 @@
+"""
+FSM-хранилище aiogram в SQLite (таблица fsm_storage в bot.db).
+
+Состояния онбординга, Kaspi, консультаций и тикетов переживают перезапуск.
+Горячие записи держатся в памяти; изменения копятся и пишутся в БД пачкой
+раз в FLUSH_INTERVAL (и при остановке диспетчера — storage.close()).
+
+Кэш в памяти рассчитан на то, что апдейты пользователя обрабатывает один
+процесс: один процесс на бота или run_cluster.py (шардирование по user_id).
+Для произвольного балансировщика — FSM_STORAGE=redis: штатный RedisStorage
+aiogram (нужен пакет redis).
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from loguru import logger
+
+from config import FSM_STORAGE, FSM_CACHE_TTL, REDIS_URL
+
+FLUSH_INTERVAL = 0.5
+# Пауза между повторами при ошибке записи растёт до этого предела, сек
+FLUSH_RETRY_MAX = 30
+CACHE_MAX_SIZE = 10000
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, db, cache_ttl: float = FSM_CACHE_TTL):
+        self.db = db
+        self.cache_ttl = cache_ttl
+        self._key_builder = DefaultKeyBuilder(
+            with_bot_id=True, with_business_connection_id=True, with_destiny=True,
+        )
+        # key → [state, data, последний доступ]
+        self._cache: dict[str, list] = {}
+        self._dirty: set[str] = set()
+        # Ключи пачки, которая сейчас пишется: из кэша не вытесняются,
+        # при ошибке записи возвращаются в _dirty
+        self._flushing: set[str] = set()
+        self._flusher: asyncio.Task | None = None
+
+    async def _load(self, key: StorageKey) -> list:
+        skey = self._key_builder.build(key)
+        now = time.monotonic()
+        entry = self._cache.get(skey)
+        if entry is not None and (skey in self._dirty or now - entry[2] < self.cache_ttl):
+            entry[2] = now
+            return entry
+        row = await self.db.get_fsm_record(skey)
+        entry = [row["state"], json.loads(row["data"]), now] if row else [None, {}, now]
+        self._cache[skey] = entry
+        if len(self._cache) > CACHE_MAX_SIZE:
+            self._evict(now)
+        return entry
+
+    def _evict(self, now: float):
+        self._cache = {
+            k: v for k, v in self._cache.items()
+            if k in self._dirty or k in self._flushing or now - v[2] < self.cache_ttl
+        }
+
+    def _mark_dirty(self, key: StorageKey):
+        self._dirty.add(self._key_builder.build(key))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        """
+        Пишет, пока есть изменения: ключи, помеченные во время записи
+        (флашер ещё не завершён — новый не создаётся), уходят следующей пачкой.
+        """
+        delay = FLUSH_INTERVAL
+        while self._dirty:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+                delay = FLUSH_INTERVAL
+            except Exception as e:
+                logger.error(f"FSM storage flush failed: {e}")
+                delay = min(delay * 2, FLUSH_RETRY_MAX)
+
+    async def flush(self):
+        """Записать накопленные изменения одной транзакцией."""
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        self._flushing |= keys
+        try:
+            upserts, deletes = [], []
+            for skey in keys:
+                state, data, _ = self._cache[skey]
+                if state is None and not data:
+                    deletes.append(skey)
+                else:
+                    upserts.append((skey, state, json.dumps(data, ensure_ascii=False)))
+            await self.db.save_fsm_records(upserts, deletes)
+        except BaseException:
+            # В т.ч. отмена флашера в close() — ключи запишет финальный flush
+            self._dirty |= keys
+            raise
+        finally:
+            self._flushing -= keys
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._load(key)
+        entry[0] = state.state if isinstance(state, State) else state
+        self._mark_dirty(key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self._load(key)
+        entry[1] = data.copy()
+        self._mark_dirty(key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._load(key))[1].copy()
+
+    async def close(self) -> None:
+        if self._flusher and not self._flusher.done():
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+
+def create_fsm_storage(db) -> BaseStorage:
+    """Хранилище по FSM_STORAGE: sqlite (по умолчанию), redis или memory."""
+    if FSM_STORAGE == "redis":
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(
+            REDIS_URL,
+            key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+        )
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return SQLiteStorage(db)
@@ -17,11 +17,23 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 DATABASE_PATH = os.getenv("DATABASE_PATH", "./database/bot.db")
 CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_db")
 LOG_PATH = os.getenv("LOG_PATH", "./logs/bot.log")
+# JSON-лог трассировки апдейтов (пусто — выключен) и порог записи, мс
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "")
+TRACE_LOG_MIN_MS = float(os.getenv("TRACE_LOG_MIN_MS", "1000"))
+# Как часто процесс сохраняет снимок метрик для /metrics веб-админки, сек
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "15"))
+# Колбэк, занявший event loop дольше порога, пишется в лог (0 — детектор выключен), мс
+SLOW_CALLBACK_MS = float(os.getenv("SLOW_CALLBACK_MS", "100"))
+# Профилировщик по запросу (/admin_profile, веб-админка): шаг выборки, мс; предел длительности, сек
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "120"))
 KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", "./knowledge")
 
 # Cache (ChromaDB используется только как кэш для ИИ-ответов)
 CACHE_THRESHOLD = float(os.getenv("CACHE_THRESHOLD", "0.90"))
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "paraphrase-multilingual-MiniLM-L12-v2")
+# Порог косинусной близости для группировки похожих вопросов в веб-админке
+SIMILAR_QUESTIONS_THRESHOLD = float(os.getenv("SIMILAR_QUESTIONS_THRESHOLD", "0.80"))
 
 # Legacy (для совместимости)
 SIMILARITY_THRESHOLD = CACHE_THRESHOLD
@@ -34,6 +46,18 @@ RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "5"))
 # Conversation History
 CONVERSATION_HISTORY_LIMIT = int(os.getenv("CONVERSATION_HISTORY_LIMIT", "50"))
 
+# Statistics (пересчёт топ-N вопросов для дашборда, секунды)
+STATS_REFRESH_INTERVAL = int(os.getenv("STATS_REFRESH_INTERVAL", "600"))
+
+# Delivery (очередь исходящих сообщений; лимит Telegram ~30 сообщений/с глобально, 1/с на чат)
+DELIVERY_RATE_PER_SECOND = float(os.getenv("DELIVERY_RATE_PER_SECOND", "25"))
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "8"))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "3"))
+
+# Ramadan: даты по объявлению ДУМК ("начало:конец" через запятую);
+# для остальных лет — табличный хиджри-календарь (core.ramadan_calendar)
+RAMADAN_DATES = os.getenv("RAMADAN_DATES", "2026-02-19:2026-03-20")
+
 # Ustaz Consultations
 USTAZ_MONTHLY_LIMIT = int(os.getenv("USTAZ_MONTHLY_LIMIT", "5"))
 
@@ -44,6 +68,21 @@ WEB_ADMIN_PASSWORD = os.getenv("WEB_ADMIN_PASSWORD", "")
 # Domain
 DOMAIN = os.getenv("DOMAIN", "")
 
+# FSM storage: sqlite (bot.db, переживает перезапуск) | redis (несколько процессов) | memory
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_CACHE_TTL = float(os.getenv("FSM_CACHE_TTL", "300"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Webhook (run_webhook.py за nginx; без WEBHOOK_SECRET боты работают через polling)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", f"https://{DOMAIN}" if DOMAIN else "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8091"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "16"))
+# run_cluster.py: процессов-обработчиков апдейтов (+ один процесс-планировщик)
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "4"))
+
 # Kaspi Payment
 KASPI_PAY_LINK = os.getenv("KASPI_PAY_LINK", "")
 KASPI_PRICE_KZT = int(os.getenv("KASPI_PRICE_KZT", "990"))
@@ -12,11 +12,24 @@ import asyncio
 import base64
 import json
 import re
+import time
 
 from openai import AsyncOpenAI
 from loguru import logger
 
 from config import OPENAI_API_KEY, OPENAI_MODEL
+from core.metrics import registry
+from core.tracing import traced
+
+OPENAI_REQUESTS = registry.counter(
+    "openai_requests_total", "Запросы к OpenAI по методу и исходу", labels=("method", "result"),
+)
+OPENAI_SECONDS = registry.histogram(
+    "openai_request_duration_seconds", "Длительность запроса к OpenAI (без ожидания семафора)", labels=("method",),
+)
+OPENAI_TOKENS = registry.counter(
+    "openai_tokens_total", "Токены OpenAI", labels=("method", "kind"),
+)
 
 SYSTEM_PROMPT = (
     "Сен — Рамазан айына қатысты сұрақтарға жауап беретін көмекшісің.\n\n"
@@ -219,6 +232,25 @@ class AIEngine:
     def is_available(self) -> bool:
         return self._client is not None
 
+    async def _complete(self, method: str, **kwargs):
+        """chat.completions.create под семафором; метрики длительности, исхода и токенов."""
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self._client.chat.completions.create(**kwargs)
+            except Exception:
+                OPENAI_REQUESTS.inc(method, "error")
+                raise
+            finally:
+                OPENAI_SECONDS.observe(time.perf_counter() - start, method)
+        OPENAI_REQUESTS.inc(method, "ok")
+        usage = getattr(response, "usage", None)
+        if usage:
+            OPENAI_TOKENS.inc(method, "prompt", amount=usage.prompt_tokens or 0)
+            OPENAI_TOKENS.inc(method, "completion", amount=usage.completion_tokens or 0)
+        return response
+
+    @traced("ai.analyze_receipt")
     async def analyze_receipt(self, image_bytes: bytes) -> dict | None:
         """Анализирует фото чека Kaspi через GPT Vision. Возвращает {amount, date}."""
         if not self.is_available():
@@ -261,13 +293,13 @@ class AIEngine:
         ]
 
         try:
-            async with self._semaphore:
-                response = await self._client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
-                    temperature=0.0,
-                    max_tokens=200,
-                )
+            response = await self._complete(
+                "analyze_receipt",
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.0,
+                max_tokens=200,
+            )
 
             content = response.choices[0].message.content.strip() if response.choices else ""
             if not content:
@@ -287,6 +319,7 @@ class AIEngine:
             logger.error(f"Receipt analysis error: {e}")
             return None
 
+    @traced("ai.translate")
     async def translate(self, text: str, target_lang: str = "ru") -> str | None:
         """Переводит текст с казахского на указанный язык через ChatGPT."""
         if not self.is_available():
@@ -306,12 +339,12 @@ class AIEngine:
         ]
 
         try:
-            async with self._semaphore:
-                response = await self._client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    temperature=0.1,
-                )
+            response = await self._complete(
+                "translate",
+                model=self.model_name,
+                messages=messages,
+                temperature=0.1,
+            )
             if response.choices and response.choices[0].message.content:
                 translated = response.choices[0].message.content.strip()
                 logger.info(f"Translated {len(text)} chars kk→{target_lang}")
@@ -321,6 +354,7 @@ class AIEngine:
 
         return None
 
+    @traced("ai.ask")
     async def ask(
         self,
         question: str,
@@ -396,12 +430,12 @@ class AIEngine:
         messages.append({"role": "user", "content": user_prompt})
 
         try:
-            async with self._semaphore:
-                response = await self._client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    temperature=0.1,
-                )
+            response = await self._complete(
+                "ask",
+                model=self.model_name,
+                messages=messages,
+                temperature=0.1,
+            )
 
             answer_text = None
             if response.choices and response.choices[0].message.content:
@@ -0,0 +1,359 @@
+"""
+Рендеринг Рамадан-календаря и таблицы намазов с кэшем готовых текстов.
+
+Тексты одинаковы для всех пользователей одного города и языка в пределах дня,
+поэтому кэшируются по (вид, lat, lng, язык, город, сезон, номер дня) и сбрасываются
+в полночь (меняется «сегодня» в таблице). Фоновая задача прогревает кэш
+для всех групп координат, нажатие кнопки — поиск в dict.
+
+Кэш у каждого процесса свой (воркеры run_cluster.py прогревают его сами).
+Когда данные намазов меняются (локальный расчёт заменён данными API), поколение
+"render" в SQLite увеличивается, и остальные процессы сбрасывают кэш
+не позже чем через RENDER_GENERATION_CHECK секунд.
+"""
+
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+
+from loguru import logger
+
+from core.metrics import CACHE_LOOKUPS
+from core.ramadan_calendar import (
+    RamadanSeason, season, tz_offset_for,
+    ensure_prayer_times, replace_local_prayer_times,
+)
+
+# Дни недели
+DOW_KK = {0: "Дс", 1: "Сс", 2: "Ср", 3: "Бс", 4: "Жм", 5: "Сб", 6: "Жк"}
+DOW_RU = {0: "Пн", 1: "Вт", 2: "Ср", 3: "Чт", 4: "Пт", 5: "Сб", 6: "Вс"}
+
+# Как часто сверять поколение кэша с SQLite, сек
+RENDER_GENERATION_CHECK = 30.0
+
+
+def format_full_calendar(
+    schedule: list[dict],
+    city: str,
+    lang: str = "kk",
+    tz: float = None,
+) -> str:
+    """Сформировать полный красивый календарь на весь Рамадан."""
+    tz = tz if tz is not None else tz_offset_for()
+    today_day = season.day_number(tz)
+    year = season.current(tz).year
+    dow_names = DOW_KK if lang == "kk" else DOW_RU
+
+    # === Заголовок ===
+    if lang == "ru":
+        lines = [f"🌙 <b>РАМАДАН {year}</b>"]
+        lines.append(f"📍 {city}")
+    else:
+        lines = [f"🌙 <b>РАМАЗАН {year}</b>"]
+        lines.append(f"📍 {city}")
+
+    lines.append("")
+
+    # === Сегодняшний день (выделенный блок) ===
+    if today_day and 1 <= today_day <= len(schedule):
+        today_info = schedule[today_day - 1]
+        try:
+            dow = dow_names.get(date.fromisoformat(today_info["date"]).weekday(), "")
+        except (ValueError, KeyError):
+            dow = ""
+
+        day_date = today_info["date"][5:]  # MM-DD
+        fajr = today_info["fajr"]
+        maghrib = today_info["maghrib"]
+
+        if lang == "ru":
+            lines.append(f"📌 <b>СЕГОДНЯ: {today_day}-й день</b> ({day_date}, {dow})")
+            lines.append(f"    🌅 Сухур:  <b>{fajr}</b>")
+            lines.append(f"    🌇 Ифтар:  <b>{maghrib}</b>")
+        else:
+            lines.append(f"📌 <b>БҮГІН: {today_day}-күн</b> ({day_date}, {dow})")
+            lines.append(f"    🌅 Сәресі:   <b>{fajr}</b>")
+            lines.append(f"    🌇 Ауызашар: <b>{maghrib}</b>")
+
+        lines.append("")
+    elif today_day is None:
+        days_left = season.days_until(tz)
+        if days_left > 0:
+            if lang == "ru":
+                lines.append(f"⏳ До Рамадана: <b>{days_left} дн.</b>")
+            else:
+                lines.append(f"⏳ Рамазанға: <b>{days_left} күн</b>")
+            lines.append("")
+
+    # === Таблица ===
+    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
+
+    if lang == "ru":
+        lines.append("<code> №  Дата  Дн │ Сухур  Ифтар</code>")
+    else:
+        lines.append("<code> №  Күні  Кн │ Сәрес  Ауыз.</code>")
+
+    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
+
+    for i, day_info in enumerate(schedule):
+        day_num = i + 1
+        date_str = day_info["date"][5:]  # MM-DD → "02-19"
+        fajr = day_info["fajr"]
+        maghrib = day_info["maghrib"]
+
+        try:
+            dow = dow_names.get(date.fromisoformat(day_info["date"]).weekday(), "  ")
+        except (ValueError, KeyError):
+            dow = "  "
+
+        is_today = today_day and day_num == today_day
+        line = f"{day_num:>2}  {date_str} {dow} │ {fajr}  {maghrib}"
+
+        if is_today:
+            lines.append(f"🟢<code>{line}</code>")
+        else:
+            lines.append(f"<code>{line}</code>")
+
+        # Визуальный разделитель каждые 10 дней
+        if day_num % 10 == 0 and day_num < len(schedule):
+            lines.append("<code>  ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─</code>")
+
+    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
+
+    # Подпись
+    if lang == "ru":
+        lines.append("🌅 Сухур — прекратить еду  |  🌇 Ифтар — разговение")
+    else:
+        lines.append("🌅 Сәресі — тамақ тоқтату  |  🌇 Ауызашар")
+
+    return "\n".join(lines)
+
+
+# Названия намазов
+PRAYER_NAMES_KK = ["Имсақ", "Таңғы", "Күн ш.", "Бесін", "Екінті", "Ақшам", "Құптан"]
+PRAYER_NAMES_RU = ["Имсак", "Фаджр", "Восход", "Зухр", "Аср", "Магриб", "Иша"]
+
+
+def format_prayer_times_table(
+    schedule: list[dict],
+    city: str,
+    lang: str = "kk",
+    tz: float = None,
+) -> str:
+    """Сформировать таблицу всех намазов за дни Рамадана."""
+    tz = tz if tz is not None else tz_offset_for()
+    today_day = season.day_number(tz)
+    year = season.current(tz).year
+    dow_names = DOW_KK if lang == "kk" else DOW_RU
+
+    if lang == "ru":
+        lines = [f"🕌 <b>ВРЕМЯ НАМАЗА — РАМАДАН {year}</b>"]
+    else:
+        lines = [f"🕌 <b>НАМАЗ УАҚЫТЫ — РАМАЗАН {year}</b>"]
+
+    lines.append(f"📍 {city}")
+    lines.append("")
+
+    # Сегодняшний день — подробная карточка
+    if today_day and 1 <= today_day <= len(schedule):
+        today_info = schedule[today_day - 1]
+        try:
+            dow = dow_names.get(date.fromisoformat(today_info["date"]).weekday(), "")
+        except (ValueError, KeyError):
+            dow = ""
+
+        day_date = today_info["date"][5:]
+        names = PRAYER_NAMES_RU if lang == "ru" else PRAYER_NAMES_KK
+
+        if lang == "ru":
+            lines.append(f"📌 <b>СЕГОДНЯ: {today_day}-й день</b> ({day_date}, {dow})")
+        else:
+            lines.append(f"📌 <b>БҮГІН: {today_day}-күн</b> ({day_date}, {dow})")
+
+        lines.append(f"    {names[0]}: <b>{today_info.get('imsak', '-')}</b>  |  {names[1]}: <b>{today_info.get('fajr', '-')}</b>")
+        lines.append(f"    {names[2]}: <b>{today_info.get('sunrise', '-')}</b>  |  {names[3]}: <b>{today_info.get('dhuhr', '-')}</b>")
+        lines.append(f"    {names[4]}: <b>{today_info.get('asr', '-')}</b>  |  {names[5]}: <b>{today_info.get('maghrib', '-')}</b>")
+        lines.append(f"    {names[6]}: <b>{today_info.get('isha', '-')}</b>")
+        lines.append("")
+
+    # Таблица
+    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
+
+    if lang == "ru":
+        lines.append("<code> №  Дата  │ Фадж Зухр  Аср Маг  Иша</code>")
+    else:
+        lines.append("<code> №  Күні  │ Таңғ Бесн Екнт Ақшм Құпт</code>")
+
+    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
+
+    for i, day_info in enumerate(schedule):
+        day_num = i + 1
+        date_str = day_info["date"][5:]  # MM-DD
+        fajr = day_info.get("fajr", "--:--")
+        dhuhr = day_info.get("dhuhr", "--:--")
+        asr = day_info.get("asr", "--:--")
+        maghrib = day_info.get("maghrib", "--:--")
+        isha = day_info.get("isha", "--:--")
+
+        is_today = today_day and day_num == today_day
+        line = f"{day_num:>2}  {date_str} │ {fajr} {dhuhr} {asr} {maghrib} {isha}"
+
+        if is_today:
+            lines.append(f"🟢<code>{line}</code>")
+        else:
+            lines.append(f"<code>{line}</code>")
+
+        if day_num % 10 == 0 and day_num < len(schedule):
+            lines.append("<code>  ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─ ─</code>")
+
+    lines.append("▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬")
+
+    if lang == "ru":
+        lines.append("Фадж=Фаджр  Маг=Магриб  Иша=Ночной")
+    else:
+        lines.append("Таңғ=Таңғы  Бесн=Бесін  Ақшм=Ақшам  Құпт=Құптан")
+
+    return "\n".join(lines)
+
+
+RENDERERS = {
+    "calendar": format_full_calendar,
+    "prayer_times": format_prayer_times_table,
+}
+LANGUAGES = ("kk", "ru")
+
+
+class RenderCache:
+    """Готовые тексты на текущий день; при смене даты кэш очищается."""
+
+    def __init__(self):
+        self._day: date | None = None
+        self._texts: dict[tuple, str] = {}
+        self._generation: int | None = None
+        self._checked_at = 0.0
+
+    def _check_day(self):
+        today = date.today()
+        if today != self._day:
+            self._texts.clear()
+            self._day = today
+
+    def get(self, key: tuple) -> str | None:
+        self._check_day()
+        return self._texts.get(key)
+
+    def put(self, key: tuple, text: str):
+        self._check_day()
+        self._texts[key] = text
+
+    def clear(self):
+        self._texts.clear()
+
+    async def sync(self, db):
+        """Сбросить кэш, если другой процесс увеличил поколение (не чаще RENDER_GENERATION_CHECK)."""
+        now = time.monotonic()
+        if now - self._checked_at < RENDER_GENERATION_CHECK:
+            return
+        self._checked_at = now
+        generation = await db.get_cache_generation("render")
+        if generation != self._generation:
+            self._texts.clear()
+            self._generation = generation
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+
+render_cache = RenderCache()
+
+
+async def load_ramadan_schedule(
+    db, muftyat_api, city: str, lat: float, lng: float, current: RamadanSeason = None,
+) -> list[dict]:
+    """Получить расписание Рамадана (по умолчанию ближайшего) из кэша или API."""
+    current = current or season.current(tz_offset_for(lat, lng))
+    await ensure_prayer_times(muftyat_api, db, city, lat, lng)
+
+    return await db.get_cached_prayer_times(
+        lat, lng,
+        current.start.isoformat(),
+        current.end.isoformat(),
+    )
+
+
+def _render_key(kind: str, lat: float, lng: float, lang: str, city: str) -> tuple[tuple, float]:
+    """Ключ кэша включает номер дня в поясе города: «сегодня» меняется в его полночь."""
+    tz = tz_offset_for(lat, lng)
+    return (kind, lat, lng, lang, city, season.current(tz).start, season.day_number(tz)), tz
+
+
+async def get_rendered(
+    kind: str, db, muftyat_api, city: str, lat: float, lng: float, lang: str = "kk",
+) -> str | None:
+    """Готовый текст календаря/таблицы намазов. None — нет данных за Рамадан."""
+    await render_cache.sync(db)
+    key, tz = _render_key(kind, lat, lng, lang, city)
+    text = render_cache.get(key)
+    CACHE_LOOKUPS.inc("render", "miss" if text is None else "hit")
+    if text is not None:
+        return text
+
+    schedule = await load_ramadan_schedule(db, muftyat_api, city, lat, lng)
+    if not schedule:
+        return None
+    text = RENDERERS[kind](schedule, city, lang, tz)
+    render_cache.put(key, text)
+    return text
+
+
+async def warm_render_cache(db, muftyat_api) -> int:
+    """Отрендерить тексты для всех групп координат и языков."""
+    await render_cache.sync(db)
+    warmed = 0
+    for group in await db.get_users_grouped_by_coordinates():
+        city = group["city"]
+        if not city:
+            continue
+        schedule = None
+        for kind, renderer in RENDERERS.items():
+            for lang in LANGUAGES:
+                key, tz = _render_key(kind, group["city_lat"], group["city_lng"], lang, city)
+                if render_cache.get(key) is not None:
+                    continue
+                if schedule is None:
+                    schedule = await load_ramadan_schedule(
+                        db, muftyat_api, city, group["city_lat"], group["city_lng"],
+                    )
+                if not schedule:
+                    break
+                render_cache.put(key, renderer(schedule, city, lang, tz))
+                warmed += 1
+        # Не блокировать цикл событий на больших списках городов
+        await asyncio.sleep(0)
+    return warmed
+
+
+async def calendar_warm_task(db, muftyat_api, replace_local: bool = True):
+    """
+    Background task: прогрев кэша при старте и после каждой полуночи.
+    replace_local=False — воркеры run_cluster.py: только прогрев своего кэша,
+    замену локально рассчитанных времён выполняет планировщик.
+    """
+    while True:
+        try:
+            # Локально рассчитанные времена → данные API, как только оно доступно
+            if replace_local and await replace_local_prayer_times(muftyat_api, db):
+                render_cache.clear()
+                await db.bump_cache_generation("render")
+            warmed = await warm_render_cache(db, muftyat_api)
+            if warmed:
+                logger.info(f"Calendar render cache warmed: {warmed} texts")
+            now = datetime.now()
+            next_midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            await asyncio.sleep((next_midnight - now).total_seconds() + 5)
+        except asyncio.CancelledError:
+            logger.info("Calendar warm task cancelled")
+            break
+        except Exception as e:
+            logger.error(f"Calendar warm task error: {e}")
+            await asyncio.sleep(300)
@@ -1,8 +1,21 @@
 """
 Список 36 городов Казахстана для обратной совместимости.
 CITY_COORDINATES используется для миграции существующих пользователей → координаты.
+CityIndex — локальный индекс городов muftyat.kz для онбординга.
 """
 
+import asyncio
+import bisect
+import difflib
+import itertools
+import math
+import time
+
+from loguru import logger
+
+from core.geo import snap_coords
+from core.normalizer import transliterate_kaz_latin_to_cyrillic
+
 CITIES = {
     "Алматы": {"kk": "Алматы", "ru": "Алматы"},
     "Астана": {"kk": "Астана", "ru": "Астана"},
@@ -89,3 +102,210 @@ def get_city_name(city_key: str, lang: str = "kk") -> str:
     if not city:
         return city_key
     return city.get(lang, city_key)
+
+
+# ──────────────── Локальный индекс городов muftyat.kz ────────────────
+#
+# Онбординг не должен зависеть от скорости muftyat.kz: список городов
+# выгружается из API целиком, хранится в SQLite (таблица muftyat_cities)
+# и в памяти. Поиск по префиксу и нечёткий поиск по kk/ru написаниям,
+# ближайший город — по сетке 1°×1°. К API обращаемся только если локально
+# ничего не нашлось; такие ответы кэшируются с TTL.
+
+CITY_INDEX_REFRESH_INTERVAL = 7 * 24 * 3600
+CITY_API_CACHE_TTL = 24 * 3600
+CITY_API_TIMEOUT = 3.0
+NEAREST_MAX_KM = 100.0
+
+# Казахские буквы и похожие русские сводятся к одной форме: «Ақтөбе» = «Актобе»
+_FOLD = str.maketrans({
+    "ә": "а", "ғ": "г", "қ": "к", "ң": "н", "ө": "о", "ұ": "у", "ү": "у",
+    "һ": "х", "і": "и", "ы": "и", "й": "и", "ё": "е", "ъ": "", "ь": "",
+    "-": " ", ".": " ", ",": " ",
+})
+
+
+def fold_city_name(name: str) -> str:
+    """Ключ поиска: нижний регистр, латиница → кириллица, kk/ru буквы сведены."""
+    text = transliterate_kaz_latin_to_cyrillic(name.strip().lower())
+    return " ".join(text.translate(_FOLD).split())
+
+
+def _distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Равнопромежуточная аппроксимация — достаточно на расстояниях до сотен км."""
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371.0 * math.hypot(x, y)
+
+
+class CityIndex:
+    """Индекс городов в памяти: префикс/нечёткий поиск и ближайший город."""
+
+    def __init__(self):
+        self._cities: list[dict] = []
+        self._keys: list[tuple[str, int]] = []      # (folded name/слово, idx) по возрастанию
+        self._names: dict[str, list[int]] = {}      # folded name → idx
+        self._grid: dict[tuple[int, int], list[int]] = {}
+        self._api_cache: dict[tuple, tuple[float, object]] = {}
+        self._db = None
+        self.updated_at: float = 0.0
+        self._add_builtin()
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    def _add_builtin(self):
+        """36 городов из CITY_COORDINATES — индекс работает и без API."""
+        for key, (lat, lng) in CITY_COORDINATES.items():
+            names = CITIES.get(key, {})
+            self._add({"id": 0, "name": key, "lat": lat, "lng": lng}, extra=names.values())
+        self._rebuild()
+
+    def _add(self, city: dict, extra=()) -> int:
+        idx = len(self._cities)
+        self._cities.append(city)
+        for name in {city["name"], *extra}:
+            folded = fold_city_name(name)
+            if folded:
+                self._names.setdefault(folded, []).append(idx)
+        cell = (math.floor(city["lat"]), math.floor(city["lng"]))
+        self._grid.setdefault(cell, []).append(idx)
+        return idx
+
+    def _rebuild(self):
+        keys = set()
+        for folded, idxs in self._names.items():
+            words = {folded, *folded.split()}
+            keys.update((w, i) for w in words for i in idxs)
+        self._keys = sorted(keys)
+
+    def replace(self, cities: list[dict]):
+        """Заменить индекс списком городов API (встроенные города сохраняются)."""
+        self._cities, self._names, self._grid = [], {}, {}
+        self._add_builtin()
+        for city in cities:
+            self._add(city)
+        self._rebuild()
+
+    async def load(self, db):
+        """Загрузить сохранённый список из SQLite (при старте, без сети)."""
+        self._db = db
+        rows = await db.get_muftyat_cities()
+        if rows:
+            self.replace(rows)
+            self.updated_at = await db.get_muftyat_cities_updated_at()
+        logger.info(f"City index loaded: {len(self)} cities")
+
+    async def refresh(self, api) -> int:
+        """Выгрузить все города из API и сохранить. Возвращает их число (0 — не удалось)."""
+        cities = await api.list_cities()
+        if not cities:
+            return 0
+        self.replace(cities)
+        self.updated_at = time.time()
+        if self._db:
+            await self._db.save_muftyat_cities(cities)
+        logger.info(f"City index refreshed from API: {len(cities)} cities")
+        return len(cities)
+
+    def _unique(self, idxs) -> list[dict]:
+        seen, result = set(), []
+        for i in idxs:
+            city = self._cities[i]
+            # Один и тот же город из встроенного списка и из API; соседние
+            # посёлки в той же ячейке сетки — разные города
+            key = (fold_city_name(city["name"]), snap_coords(city["lat"], city["lng"]))
+            if key not in seen:
+                seen.add(key)
+                result.append(city)
+        return result
+
+    def search_local(self, query: str, limit: int = 8) -> list[dict]:
+        """Точное совпадение → префикс имени/слова → нечёткое совпадение."""
+        folded = fold_city_name(query)
+        if not folded:
+            return []
+        found = list(self._names.get(folded, []))
+        start = bisect.bisect_left(self._keys, (folded, -1))
+        for key, idx in itertools.islice(self._keys, start, None):
+            if not key.startswith(folded) or len(found) >= limit * 4:
+                break
+            found.append(idx)
+        if not found and len(folded) >= 3:
+            for name in difflib.get_close_matches(folded, self._names.keys(), n=limit, cutoff=0.75):
+                found.extend(self._names[name])
+        return self._unique(found)[:limit]
+
+    def nearest_local(self, lat: float, lng: float) -> dict | None:
+        """Ближайший город в радиусе NEAREST_MAX_KM: 5×5 ячеек вокруг точки (≥ 2 ячейки ≈ 128 км)."""
+        cell_lat, cell_lng = math.floor(lat), math.floor(lng)
+        best, best_km = None, NEAREST_MAX_KM
+        for ring in range(3):
+            for dlat in range(-ring, ring + 1):
+                for dlng in range(-ring, ring + 1):
+                    if max(abs(dlat), abs(dlng)) != ring:
+                        continue
+                    for i in self._grid.get((cell_lat + dlat, cell_lng + dlng), ()):
+                        city = self._cities[i]
+                        km = _distance_km(lat, lng, city["lat"], city["lng"])
+                        if km < best_km:
+                            best, best_km = city, km
+        return best
+
+    async def _api_cached(self, key: tuple, call):
+        now = time.monotonic()
+        cached = self._api_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        try:
+            result = await asyncio.wait_for(call(), timeout=CITY_API_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"City lookup via API failed: {e}")
+            return None
+        if len(self._api_cache) > 1000:
+            self._api_cache = {k: v for k, v in self._api_cache.items() if v[0] > now}
+        self._api_cache[key] = (now + CITY_API_CACHE_TTL, result)
+        return result
+
+    async def search(self, query: str, api=None, limit: int = 8) -> list[dict]:
+        """Поиск города: локальный индекс, при промахе — API (с TTL-кэшем)."""
+        found = self.search_local(query, limit)
+        if found or api is None:
+            return found
+        folded = fold_city_name(query)
+        return (await self._api_cached(("search", folded), lambda: api.search_cities(query)) or [])[:limit]
+
+    async def nearest(self, lat: float, lng: float, api=None) -> dict | None:
+        """Ближайший город: локальный индекс, при промахе — API (с TTL-кэшем)."""
+        city = self.nearest_local(lat, lng)
+        if city or api is None:
+            return city
+        key = ("nearest", round(lat, 2), round(lng, 2))
+        return await self._api_cached(key, lambda: api.get_nearest_city(lat, lng))
+
+
+city_index = CityIndex()
+
+
+async def city_index_task(db, muftyat_api, refresh: bool = True):
+    """
+    Background task: загрузить индекс из SQLite и обновлять его из API раз в неделю.
+    refresh=False (воркеры run_cluster.py) — только перечитывать SQLite раз в час.
+    """
+    try:
+        await city_index.load(db)
+    except Exception as e:
+        logger.error(f"City index load error: {e}")
+    while True:
+        try:
+            if refresh and time.time() - city_index.updated_at >= CITY_INDEX_REFRESH_INTERVAL:
+                await city_index.refresh(muftyat_api)
+            await asyncio.sleep(3600)
+            if not refresh:
+                await city_index.load(db)
+        except asyncio.CancelledError:
+            logger.info("City index task cancelled")
+            break
+        except Exception as e:
+            logger.error(f"City index refresh error: {e}")
+            await asyncio.sleep(3600)
@@ -0,0 +1,241 @@
+"""
+Доставка исходящих сообщений через очередь outbox (SQLite).
+
+Отправители (напоминания, совет дня, рассылка из веб-админки) только ставят
+сообщения в очередь; DeliveryEngine в процессе бота забирает их пачками
+и отправляет несколькими воркерами под общим token bucket
+(глобальный лимит Telegram) и с интервалом не чаще 1 сообщения в секунду на чат.
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator
+
+from aiogram import Bot
+from aiogram.enums import ParseMode
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+from loguru import logger
+
+from config import DELIVERY_RATE_PER_SECOND, DELIVERY_WORKERS, DELIVERY_MAX_ATTEMPTS
+
+# Приоритеты: меньше — раньше
+PRIORITY_REMINDER = 0
+PRIORITY_BROADCAST = 10
+
+PER_CHAT_INTERVAL = 1.0
+POLL_INTERVAL = 1.0
+PURGE_INTERVAL = 3600
+
+
+# Ошибки, после которых чат считается недоступным (см. Database.mark_users_undeliverable)
+DEAD_CHAT_REASONS = {"blocked", "deactivated", "chat_not_found"}
+
+
+def classify_delivery_error(e: Exception) -> str:
+    """retry_after | blocked | deactivated | chat_not_found | bad_request | transient."""
+    if isinstance(e, TelegramRetryAfter):
+        return "retry_after"
+    text = str(e).lower()
+    if isinstance(e, TelegramForbiddenError):
+        return "deactivated" if "deactivated" in text else "blocked"
+    if isinstance(e, TelegramBadRequest):
+        if "chat not found" in text or "user not found" in text:
+            return "chat_not_found"
+        return "bad_request"
+    return "transient"
+
+
+async def _single_chunk(items: list) -> AsyncIterator[list]:
+    yield items
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, запас до capacity."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Остановить выдачу токенов (ответ RetryAfter от Telegram)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class DeliveryEngine:
+    def __init__(
+        self,
+        bot: Bot,
+        db,
+        rate: float = DELIVERY_RATE_PER_SECOND,
+        workers: int = DELIVERY_WORKERS,
+        max_attempts: int = DELIVERY_MAX_ATTEMPTS,
+    ):
+        self.bot = bot
+        self.db = db
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._bucket = TokenBucket(rate)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 4)
+        self._wake = asyncio.Event()
+        self._chat_next: dict[int, float] = {}
+        # Результаты копятся в памяти и пишутся в БД пачкой
+        self._sent: list[int] = []
+        self._failed: list[tuple[str, str, int]] = []
+        self._retry: list[tuple[int, str, int]] = []
+        self._dead_chats: list[tuple[str, int]] = []
+        self._revived_chats: list[int] = []
+
+    def wake(self):
+        """Сообщить, что в очереди появились сообщения (в этом же процессе)."""
+        self._wake.set()
+
+    async def enqueue(
+        self,
+        kind: str,
+        items: list[tuple[int, str, str]] | AsyncIterator[list[tuple[int, str, str]]],
+        priority: int = PRIORITY_BROADCAST,
+        expires_at=None,
+        text: str = None,
+    ) -> int:
+        """
+        Создать задание и поставить сообщения в очередь. Возвращает id задания.
+        items — список или асинхронный итератор чанков: отправка начинается
+        с первого чанка, не дожидаясь всей аудитории.
+        """
+        job_id = await self.db.create_delivery_job(kind, text)
+        if isinstance(items, list):
+            items = _single_chunk(items)
+        async for chunk in items:
+            await self.db.enqueue_outbox(job_id, chunk, priority, expires_at)
+            self.wake()
+        return job_id
+
+    async def _chat_slot(self, chat_id: int):
+        """Не чаще одного сообщения в PER_CHAT_INTERVAL на чат."""
+        now = time.monotonic()
+        slot = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = slot + PER_CHAT_INTERVAL
+        if len(self._chat_next) > 10000:
+            self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _send(self, item: dict):
+        oid = item["id"]
+        chat_id = item["chat_id"]
+        if not item["reachable"]:
+            # Чат стал недоступен уже после постановки в очередь
+            self._failed.append(("unreachable", f"skipped: {item['delivery_status']}", oid))
+            return
+
+        await self._chat_slot(chat_id)
+        await self._bucket.acquire()
+        try:
+            await self.bot.send_message(chat_id, item["text"], parse_mode=ParseMode.HTML)
+            self._sent.append(oid)
+            if item["delivery_status"] != "ok":
+                self._revived_chats.append(chat_id)
+        except Exception as e:
+            reason = classify_delivery_error(e)
+            error = f"{reason}: {e}"[:200]
+            if reason == "retry_after":
+                logger.warning(f"Delivery: flood control, retry after {e.retry_after}s")
+                self._bucket.pause(e.retry_after)
+                self._retry.append((e.retry_after, error, oid))
+            elif reason in DEAD_CHAT_REASONS:
+                self._failed.append(("unreachable", error, oid))
+                self._dead_chats.append((reason, chat_id))
+            elif reason == "bad_request" or item["attempts"] >= self.max_attempts:
+                self._failed.append(("failed", error, oid))
+            else:
+                self._retry.append((5 * 2 ** (item["attempts"] - 1), error, oid))
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._send(item)
+            except Exception as e:
+                logger.error(f"Delivery worker error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _flush(self):
+        if self._sent or self._failed or self._retry:
+            sent, failed, retry = self._sent, self._failed, self._retry
+            self._sent, self._failed, self._retry = [], [], []
+            await self.db.complete_outbox(sent, failed, retry)
+        if self._dead_chats or self._revived_chats:
+            dead, revived = self._dead_chats, self._revived_chats
+            self._dead_chats, self._revived_chats = [], []
+            await self.db.mark_users_undeliverable(dead)
+            await self.db.mark_users_reachable(revived)
+
+    async def run(self):
+        """Background task: забирать сообщения из outbox и отправлять."""
+        released = await self.db.release_stuck_outbox()
+        if released:
+            logger.info(f"Delivery: {released} messages returned to queue")
+
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        last_purge = 0.0
+        try:
+            while True:
+                try:
+                    await self._flush()
+                    await self.db.expire_outbox()
+                    if time.monotonic() - last_purge > PURGE_INTERVAL:
+                        await self.db.purge_outbox()
+                        last_purge = time.monotonic()
+
+                    free = self._queue.maxsize - self._queue.qsize()
+                    batch = await self.db.claim_outbox(free) if free else []
+                    for item in batch:
+                        await self._queue.put(item)
+
+                    if not batch:
+                        self._wake.clear()
+                        try:
+                            await asyncio.wait_for(self._wake.wait(), timeout=POLL_INTERVAL)
+                        except asyncio.TimeoutError:
+                            pass
+                    elif self._queue.full():
+                        await asyncio.sleep(0.2)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Delivery loop error: {e}")
+                    await asyncio.sleep(POLL_INTERVAL)
+        except asyncio.CancelledError:
+            logger.info("Delivery engine cancelled")
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"Delivery final flush failed: {e}")
@@ -0,0 +1,26 @@
+"""
+Привязка координат к сетке: близкие точки (один город с чуть разными
+координатами из API) получают один набор времён намаза, одну запись
+в prayer_times_cache и одну группу напоминаний.
+
+Шаг сетки выводится из допустимой разницы времён намаза:
+1° долготы = 4 мин; по широте для 40–56° с.ш. восход/закат и фаджр/иша
+сдвигаются не больше чем на ~8 мин на градус. Точка смещается к центру
+ячейки максимум на полшага, т.е. расхождение ≤ GEO_TOLERANCE_MINUTES.
+
+Смена шага требует новой миграции (пересчёт users и prayer_times_cache).
+"""
+
+GEO_TOLERANCE_MINUTES = 0.5
+MAX_MINUTES_PER_DEGREE = 8.0
+GEO_BUCKET_STEP = 2 * GEO_TOLERANCE_MINUTES / MAX_MINUTES_PER_DEGREE  # 0.125°
+
+
+def snap_coord(value: float, step: float = GEO_BUCKET_STEP) -> float:
+    """Центр ячейки сетки; повторный вызов возвращает то же значение."""
+    return round(round(value / step) * step, 6)
+
+
+def snap_coords(lat: float, lng: float) -> tuple[float, float]:
+    """Канонические координаты ячейки для (lat, lng)."""
+    return snap_coord(lat), snap_coord(lng)
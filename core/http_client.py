@@ -0,0 +1,250 @@
+"""
+Устойчивый HTTP-клиент для внешних API (muftyat.kz и др.).
+
+- Circuit breaker (closed → open → half-open): при серии сбоев запросы
+  не отправляются, вызывающий сразу получает кэш или None вместо ожидания таймаутов.
+- Повторы с экспоненциальной задержкой и full jitter.
+- Таймауты по префиксу пути.
+- Hedging: если ответ не пришёл за hedge_after секунд, параллельно уходит
+  второй такой же запрос, берётся первый ответ.
+- Stale-while-revalidate: устаревший ответ из кэша отдаётся сразу,
+  обновление идёт в фоне; одинаковые одновременные запросы объединяются.
+
+CircuitBreaker и backoff_delay не зависят от aiohttp и годятся
+для синхронных скриптов (scripts/scrape_*.py).
+"""
+
+import asyncio
+import random
+import time
+from collections import OrderedDict
+
+import aiohttp
+from loguru import logger
+
+from core.metrics import CACHE_LOOKUPS, registry
+
+HTTP_REQUESTS = registry.counter(
+    "http_client_requests_total", "Запросы к внешним API по исходу", labels=("client", "result"),
+)
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Задержка перед повтором attempt (0, 1, ...): full jitter в [0, min(cap, base·2^attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitOpenError(Exception):
+    """Запрос не отправлен: circuit breaker открыт."""
+
+
+class CircuitBreaker:
+    """Размыкатель: failure_threshold сбоев подряд → open на reset_timeout, затем одна проба."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit {self.name}: closed")
+        self.state = self.CLOSED
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit {self.name}: open for {self.reset_timeout:.0f}s")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+
+
+class _TransientError(Exception):
+    """5xx или сетевая ошибка — имеет смысл повторить."""
+
+
+class ResilientHTTPClient:
+    """GET → JSON с breaker, повторами, hedging и stale-while-revalidate кэшем."""
+
+    def __init__(
+        self,
+        base_url: str,
+        name: str = None,
+        timeout: float = 10.0,
+        endpoint_timeouts: dict[str, float] = None,
+        retries: int = 2,
+        hedge_after: float = None,
+        cache_size: int = 1000,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.endpoint_timeouts = endpoint_timeouts or {}
+        self.retries = retries
+        self.hedge_after = hedge_after
+        self.breaker = CircuitBreaker(name or base_url, failure_threshold, reset_timeout)
+        self._session: aiohttp.ClientSession | None = None
+        # key → (fetched_at, data)
+        self._cache: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+        self._cache_size = cache_size
+        self._inflight: dict[tuple, asyncio.Task] = {}
+
+    async def init(self):
+        self._session = aiohttp.ClientSession()
+
+    async def close(self):
+        for task in self._inflight.values():
+            task.cancel()
+        if self._session:
+            await self._session.close()
+
+    def _timeout_for(self, path: str) -> float:
+        for prefix, seconds in self.endpoint_timeouts.items():
+            if path.startswith(prefix):
+                return seconds
+        return self.timeout
+
+    async def _request(self, path: str, params: dict | None, timeout: float):
+        """Один HTTP-запрос. None — ответ 4xx (повторять бессмысленно)."""
+        url = f"{self.base_url}{path}"
+        try:
+            async with self._session.get(
+                url, params=params, timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as resp:
+                if resp.status == 200:
+                    return await resp.json()
+                if resp.status >= 500 or resp.status == 429:
+                    raise _TransientError(f"HTTP {resp.status}: {url}")
+                logger.error(f"{self.breaker.name} error {resp.status}: {url}")
+                return None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise _TransientError(f"{type(e).__name__}: {e}") from e
+
+    async def _hedged(self, path: str, params: dict | None, timeout: float, hedge: bool):
+        """Запрос; если не ответил за hedge_after — второй параллельно, берётся первый ответ."""
+        if not hedge or not self.hedge_after or self.hedge_after >= timeout:
+            return await self._request(path, params, timeout)
+
+        first = asyncio.create_task(self._request(path, params, timeout))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+        second = asyncio.create_task(self._request(path, params, timeout - self.hedge_after))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # Оба запроса упали — отдаём ошибку первого
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _fetch(self, key: tuple, path: str, params: dict | None, timeout: float, hedge: bool):
+        """Запрос с повторами через breaker; успешный ответ кладётся в кэш."""
+        for attempt in range(self.retries):
+            if not self.breaker.allow():
+                HTTP_REQUESTS.inc(self.breaker.name, "circuit_open")
+                raise CircuitOpenError(self.breaker.name)
+            try:
+                data = await self._hedged(path, params, timeout, hedge)
+            except _TransientError as e:
+                HTTP_REQUESTS.inc(self.breaker.name, "error")
+                self.breaker.record_failure()
+                if attempt + 1 < self.retries:
+                    logger.warning(f"{self.breaker.name} request error, retrying: {e}")
+                    await asyncio.sleep(backoff_delay(attempt))
+                    continue
+                logger.error(f"{self.breaker.name} request failed: {e}")
+                return None
+            self.breaker.record_success()
+            HTTP_REQUESTS.inc(self.breaker.name, "ok" if data is not None else "client_error")
+            if data is not None:
+                self._cache[key] = (time.monotonic(), data)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+            return data
+        return None
+
+    def _single_flight(self, key: tuple, path: str, params: dict | None, timeout: float, hedge: bool) -> asyncio.Task:
+        """Одинаковые одновременные запросы ждут одну задачу."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, path, params, timeout, hedge))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def get_json(
+        self,
+        path: str,
+        params: dict = None,
+        ttl: float = 0,
+        stale_ttl: float = 0,
+        hedge: bool = False,
+    ):
+        """
+        GET и разбор JSON. None — ошибка, 4xx или открытый breaker без кэша.
+        ttl — ответ свежий, сеть не трогаем; до stale_ttl — отдаём устаревший
+        ответ сразу и обновляем в фоне (и при открытом breaker).
+        """
+        key = (path, tuple(sorted((params or {}).items())))
+        cached = self._cache.get(key) if ttl or stale_ttl else None
+        if cached:
+            age = time.monotonic() - cached[0]
+            if age < ttl:
+                CACHE_LOOKUPS.inc(self.breaker.name, "hit")
+                return cached[1]
+            if age < max(ttl, stale_ttl):
+                CACHE_LOOKUPS.inc(self.breaker.name, "stale")
+                if key not in self._inflight and self.breaker.state != CircuitBreaker.OPEN:
+                    task = self._single_flight(key, path, params, self._timeout_for(path), hedge)
+                    task.add_done_callback(_consume_exception)
+                return cached[1]
+        if ttl or stale_ttl:
+            CACHE_LOOKUPS.inc(self.breaker.name, "miss")
+
+        try:
+            return await asyncio.shield(
+                self._single_flight(key, path, params, self._timeout_for(path), hedge)
+            )
+        except CircuitOpenError:
+            logger.debug(f"{self.breaker.name}: circuit open, skipping {path}")
+            return cached[1] if cached else None
+
+
+def _consume_exception(task: asyncio.Task):
+    """Фоновое обновление: ошибка уже залогирована, не оставляем её непрочитанной."""
+    if not task.cancelled():
+        task.exception()
@@ -94,7 +94,7 @@ MESSAGES = {
         "btn_lang_switch": "🌐 KZ/RU",
         "lang_switched": "✅ Тіл ауыстырылды: Қазақша",
         # Calendar
-        "calendar_title": "📅 Рамазан 2026 — {city}",
+        "calendar_title": "📅 Рамазан {year} — {city}",
         "calendar_today": "Бүгін: {day}-ші күн ({date}, {dow})",
         "calendar_sahoor": "🌅 Сәресі",
         "calendar_iftar": "🌇 Ауызашар",
@@ -286,7 +286,7 @@ MESSAGES = {
         "btn_lang_switch": "🌐 KZ/RU",
         "lang_switched": "✅ Язык изменён: Русский",
         # Calendar
-        "calendar_title": "📅 Рамадан 2026 — {city}",
+        "calendar_title": "📅 Рамадан {year} — {city}",
         "calendar_today": "Сегодня: {day}-й день ({date}, {dow})",
         "calendar_sahoor": "🌅 Сухур",
         "calendar_iftar": "🌇 Ифтар",
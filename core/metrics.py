@@ -0,0 +1,228 @@
+"""
+Метрики процесса бота и их экспорт в формате Prometheus.
+
+Реестр: счётчики (Counter), значения (Gauge, в т.ч. вычисляемые при снимке)
+и гистограммы (Histogram). Метрики объявляются на уровне модуля там,
+где они измеряются; общие — здесь (CACHE_LOOKUPS).
+
+Каждый процесс (бот, воркеры и планировщик run_cluster.py) копит метрики
+в памяти и раз в METRICS_FLUSH_INTERVAL сохраняет снимок в SQLite
+(metrics_snapshots). web_admin.py складывает свежие снимки всех процессов
+и отдаёт их на /metrics — отдельный порт в процессе бота не нужен.
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import socket
+import threading
+from typing import Callable
+
+from loguru import logger
+
+from config import METRICS_FLUSH_INTERVAL
+
+# Границы бакетов латентности, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Идентификатор процесса в metrics_snapshots
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Counter:
+    """Монотонный счётчик; серии — по значениям меток."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        # label values → [значение]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0]
+            series[0] += amount
+
+    def _collect(self) -> dict[tuple, list]:
+        with self._lock:
+            return {k: list(v) for k, v in self._series.items()}
+
+    def snapshot(self) -> dict:
+        series = {json.dumps(k, ensure_ascii=False): v for k, v in self._collect().items()}
+        return {"kind": self.kind, "help": self.help, "labels": list(self.labels), "series": series}
+
+
+class Gauge(Counter):
+    """Текущее значение: set() или func, вызываемая при снимке (без меток)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), func: Callable[[], float] = None):
+        super().__init__(name, help, labels)
+        self.func = func
+
+    def set(self, value: float, *label_values: str):
+        with self._lock:
+            self._series[label_values] = [value]
+
+    def _collect(self) -> dict[tuple, list]:
+        if self.func is None:
+            return super()._collect()
+        try:
+            return {(): [self.func()]}
+        except Exception as e:
+            logger.debug(f"Gauge {self.name}: {e}")
+            return {}
+
+
+class Histogram:
+    """Гистограмма с фиксированными бакетами; серии — по значениям меток."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values → [счётчики бакетов..., +Inf, sum]
+        self._series: dict[tuple, list] = {}
+        # observe вызывается и из потоков asyncio.to_thread
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            series = {json.dumps(k, ensure_ascii=False): list(v) for k, v in self._series.items()}
+        return {
+            "kind": self.kind, "help": self.help, "labels": list(self.labels),
+            "buckets": list(self.buckets), "series": series,
+        }
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram] = {}
+
+    def _get(self, cls, name: str, *args):
+        """Метрика по имени (создаётся при первом обращении)."""
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args)
+        elif type(metric) is not cls:
+            raise ValueError(f"Metric {name} is already registered as {metric.kind}")
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = (), func: Callable[[], float] = None) -> Gauge:
+        gauge = self._get(Gauge, name, help, labels)
+        if func is not None:
+            gauge.func = func
+        return gauge
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labels, buckets)
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+
+registry = Registry()
+
+CACHE_LOOKUPS = registry.counter(
+    "bot_cache_lookups_total", "Обращения к кэшам: hit / miss", labels=("cache", "result"),
+)
+
+
+def _executor_backlog() -> int:
+    """Задачи asyncio.to_thread, ждущие свободного потока."""
+    executor = getattr(asyncio.get_running_loop(), "_default_executor", None)
+    return executor._work_queue.qsize() if executor else 0
+
+
+registry.gauge("bot_to_thread_queue_size", "Очередь пула потоков asyncio.to_thread", func=_executor_backlog)
+registry.gauge("bot_asyncio_tasks", "Задачи asyncio в процессе", func=lambda: len(asyncio.all_tasks()))
+
+
+def merge_snapshots(snapshots: list[dict]) -> dict:
+    """Сложить снимки нескольких процессов (одинаковые серии суммируются)."""
+    merged: dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.get(name)
+            if target is None or target.get("buckets") != metric.get("buckets"):
+                if target is not None:
+                    logger.warning(f"Metric {name}: bucket mismatch between processes")
+                merged[name] = json.loads(json.dumps(metric))
+                continue
+            for key, values in metric["series"].items():
+                series = target["series"].get(key)
+                if series is None:
+                    target["series"][key] = list(values)
+                else:
+                    target["series"][key] = [a + b for a, b in zip(series, values)]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: list[str], values: list[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render_prometheus(snapshot: dict) -> str:
+    """Текстовый формат Prometheus (exposition format 0.0.4)."""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for key in sorted(metric["series"]):
+            values = json.loads(key)
+            series = metric["series"][key]
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_labels(metric['labels'], values)} {series[0]}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + ["+Inf"], series[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_labels(metric['labels'], values, le)} {cumulative}")
+            label_str = _labels(metric["labels"], values)
+            lines.append(f"{name}_sum{label_str} {series[-1]:.6f}")
+            lines.append(f"{name}_count{label_str} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+async def metrics_flush_task(db, interval: float = METRICS_FLUSH_INTERVAL):
+    """Background task: снимок метрик процесса в SQLite каждые interval секунд."""
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            await db.save_metrics_snapshot(PROCESS_ID, json.dumps(registry.snapshot(), ensure_ascii=False))
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Metrics flush error: {e}")
@@ -2,48 +2,47 @@
 Асинхронный клиент API muftyat.kz для получения городов и времён намаза.
 """
 
-import aiohttp
 from loguru import logger
 
+from core.http_client import ResilientHTTPClient
+
 
 class MuftyatAPI:
     BASE = "https://api.muftyat.kz"
-    TIMEOUT = aiohttp.ClientTimeout(total=15)
+    # Поиск городов — в онбординге, пользователь ждёт; годовые времена — тяжёлый ответ
+    ENDPOINT_TIMEOUTS = {"/cities/": 5.0, "/prayer-times/": 15.0}
+    HEDGE_AFTER = 1.5
+    CITIES_TTL = 3600
+    CITIES_STALE_TTL = 7 * 24 * 3600
 
     def __init__(self):
-        self._session: aiohttp.ClientSession | None = None
+        self._http = ResilientHTTPClient(
+            self.BASE,
+            name="muftyat.kz",
+            endpoint_timeouts=self.ENDPOINT_TIMEOUTS,
+            hedge_after=self.HEDGE_AFTER,
+        )
 
     async def init(self):
         """Создать HTTP-сессию."""
-        self._session = aiohttp.ClientSession(timeout=self.TIMEOUT)
+        await self._http.init()
         logger.info("MuftyatAPI session created")
 
     async def close(self):
         """Закрыть HTTP-сессию."""
-        if self._session:
-            await self._session.close()
-            logger.info("MuftyatAPI session closed")
+        await self._http.close()
+        logger.info("MuftyatAPI session closed")
 
-    async def _get(self, path: str, params: dict = None) -> dict | list | None:
-        """GET-запрос с retry на 5xx."""
-        url = f"{self.BASE}{path}"
-        for attempt in range(2):
-            try:
-                async with self._session.get(url, params=params) as resp:
-                    if resp.status == 200:
-                        return await resp.json()
-                    if resp.status >= 500 and attempt == 0:
-                        logger.warning(f"MuftyatAPI 5xx ({resp.status}), retrying: {url}")
-                        continue
-                    logger.error(f"MuftyatAPI error {resp.status}: {url}")
-                    return None
-            except Exception as e:
-                if attempt == 0:
-                    logger.warning(f"MuftyatAPI request error, retrying: {e}")
-                    continue
-                logger.error(f"MuftyatAPI request failed: {e}")
-                return None
-        return None
+    async def _get(self, path: str, params: dict = None, cached: bool = False) -> dict | list | None:
+        """
+        GET через ResilientHTTPClient: повторы с jitter, circuit breaker.
+        cached=True — короткие справочные ответы (города): stale-while-revalidate + hedging.
+        """
+        if cached:
+            return await self._http.get_json(
+                path, params, ttl=self.CITIES_TTL, stale_ttl=self.CITIES_STALE_TTL, hedge=True,
+            )
+        return await self._http.get_json(path, params)
 
     def _normalize_city(self, raw: dict) -> dict:
         """Нормализовать ключи города из API (title → name)."""
@@ -56,14 +55,26 @@ class MuftyatAPI:
 
     async def search_cities(self, query: str) -> list[dict]:
         """Поиск городов по названию. Возвращает [{id, name, lat, lng}]."""
-        data = await self._get("/cities/", params={"search": query})
+        data = await self._get("/cities/", params={"search": query}, cached=True)
         if data and "results" in data:
             return [self._normalize_city(c) for c in data["results"]]
         return []
 
+    async def list_cities(self, max_pages: int = 200) -> list[dict]:
+        """Все города постранично (для локального индекса core.cities). [] при ошибке."""
+        cities = []
+        for page in range(1, max_pages + 1):
+            data = await self._get("/cities/", params={"page": str(page)})
+            if not data or "results" not in data:
+                return []
+            cities.extend(self._normalize_city(c) for c in data["results"])
+            if not data.get("next"):
+                break
+        return [c for c in cities if c["name"] and c["lat"] and c["lng"]]
+
     async def get_nearest_city(self, lat: float, lng: float) -> dict | None:
         """Найти ближайший город по координатам. Возвращает {id, name, lat, lng}."""
-        data = await self._get("/cities/", params={"lat": str(lat), "lng": str(lng)})
+        data = await self._get("/cities/", params={"lat": str(lat), "lng": str(lng)}, cached=True)
         if data and "results" in data and data["results"]:
             return self._normalize_city(data["results"][0])
         return None
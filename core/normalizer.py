@@ -6,6 +6,8 @@
 import re
 import unicodedata
 
+from core.tracing import traced
+
 # Казахская латиница → кириллица (новый казахский алфавит на основе латиницы)
 # Диграфы (обрабатываются первыми, до одиночных символов)
 _DIGRAPH_MAP = {
@@ -129,6 +131,7 @@ def transliterate_kaz_latin_to_cyrillic(text: str) -> str:
     return "".join(new_result)
 
 
+@traced("normalize")
 def normalize_text(text: str) -> str:
     """
     Полная нормализация текста:
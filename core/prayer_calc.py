@@ -0,0 +1,116 @@
+"""
+Локальный расчёт времён намаза (без сети) — запасной источник к API muftyat.kz.
+
+Положение Солнца считается векторно (NumPy) сразу для всех дней года
+по упрощённым формулам USNO/NOAA (точность ~1 мин для широт Казахстана).
+Результат в формате ответа API (Date, imsak, fajr, sunrise, dhuhr, asr, maghrib, isha),
+поэтому кладётся в prayer_times_cache тем же кодом.
+
+Параметры метода подбираются под таблицы ДУМК; сверка с закэшированными
+ответами API — scripts/compare_prayer_times.py.
+"""
+
+from datetime import date
+
+import numpy as np
+
+# Казахстан с 01.03.2024 — единый часовой пояс UTC+5
+KZ_UTC_OFFSET = 5.0
+
+MUFTYAT_METHOD = {
+    "fajr_angle": 15.0,      # градусов под горизонтом
+    "isha_angle": 15.0,
+    "asr_factor": 2.0,       # ханафитский аср: тень = 2 × высота предмета
+    "imsak_offset": -10,     # минут относительно фаджра
+    # Поправки (ихтият), минуты
+    "adjust": {"fajr": 0, "sunrise": 0, "dhuhr": 0, "asr": 0, "maghrib": 0, "isha": 0},
+}
+
+SUN_ALTITUDE_HORIZON = -0.833  # рефракция + видимый радиус диска
+JD_UNIX_EPOCH = 2440587.5
+JD_J2000 = 2451545.0
+
+
+def _sun_position(jd: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Склонение Солнца (рад) и уравнение времени (часы) на юлианские даты."""
+    d = jd - JD_J2000
+    g = np.radians(357.529 + 0.98560028 * d)
+    q = 280.459 + 0.98564736 * d
+    ecl_lng = np.radians(q + 1.915 * np.sin(g) + 0.020 * np.sin(2 * g))
+    obliquity = np.radians(23.439 - 0.00000036 * d)
+
+    ra = np.degrees(np.arctan2(np.cos(obliquity) * np.sin(ecl_lng), np.cos(ecl_lng))) / 15.0
+    declination = np.arcsin(np.sin(obliquity) * np.sin(ecl_lng))
+    eqt = q / 15.0 - np.mod(ra, 24.0)
+    eqt = np.mod(eqt + 12.0, 24.0) - 12.0
+    return declination, eqt
+
+
+def _hour_angle(altitude: float | np.ndarray, phi: float, declination: np.ndarray) -> np.ndarray:
+    """Часовой угол (часы) для высоты Солнца; NaN, если высота за сутки не достигается."""
+    cos_h = (np.sin(np.radians(altitude)) - np.sin(phi) * np.sin(declination)) / (
+        np.cos(phi) * np.cos(declination)
+    )
+    with np.errstate(invalid="ignore"):
+        return np.degrees(np.arccos(cos_h)) / 15.0
+
+
+def _format_hhmm(hours: np.ndarray) -> list[str]:
+    minutes = np.mod(np.rint(hours * 60.0).astype(int), 1440)
+    return [f"{m // 60:02d}:{m % 60:02d}" for m in minutes.tolist()]
+
+
+def compute_prayer_times(
+    year: int,
+    lat: float,
+    lng: float,
+    tz: float = KZ_UTC_OFFSET,
+    method: dict = MUFTYAT_METHOD,
+) -> list[dict]:
+    """Времена намаза на весь год одним векторным расчётом."""
+    days = np.arange(np.datetime64(date(year, 1, 1)), np.datetime64(date(year + 1, 1, 1)))
+    # Юлианская дата местного полудня
+    jd = days.astype(np.int64) + JD_UNIX_EPOCH + 0.5 - lng / 360.0
+    declination, eqt = _sun_position(jd)
+    phi = np.radians(lat)
+
+    dhuhr = 12.0 + tz - lng / 15.0 - eqt
+    horizon = _hour_angle(SUN_ALTITUDE_HORIZON, phi, declination)
+    sunrise = dhuhr - horizon
+    maghrib = dhuhr + horizon
+    fajr = dhuhr - _hour_angle(-method["fajr_angle"], phi, declination)
+    isha = dhuhr + _hour_angle(-method["isha_angle"], phi, declination)
+
+    asr_altitude = np.degrees(np.arctan(1.0 / (method["asr_factor"] + np.tan(np.abs(phi - declination)))))
+    asr = dhuhr + _hour_angle(asr_altitude, phi, declination)
+
+    # Летом на севере Солнце не опускается на 15°: доля ночи пропорционально углу
+    night = 24.0 - (maghrib - sunrise)
+    fajr_limit = sunrise - night * method["fajr_angle"] / 60.0
+    isha_limit = maghrib + night * method["isha_angle"] / 60.0
+    fajr = np.where(np.isnan(fajr) | (fajr < fajr_limit), fajr_limit, fajr)
+    isha = np.where(np.isnan(isha) | (isha > isha_limit), isha_limit, isha)
+
+    times = {
+        "fajr": fajr, "sunrise": sunrise, "dhuhr": dhuhr,
+        "asr": asr, "maghrib": maghrib, "isha": isha,
+    }
+    for name, minutes in method["adjust"].items():
+        times[name] = times[name] + minutes / 60.0
+    times["imsak"] = times["fajr"] + method["imsak_offset"] / 60.0
+
+    formatted = {name: _format_hhmm(values) for name, values in times.items()}
+    dates = days.astype(str).tolist()
+    return [
+        {
+            "Date": dates[i],
+            "imsak": formatted["imsak"][i],
+            "fajr": formatted["fajr"][i],
+            "sunrise": formatted["sunrise"][i],
+            "dhuhr": formatted["dhuhr"][i],
+            "asr": formatted["asr"][i],
+            "maghrib": formatted["maghrib"][i],
+            "isha": formatted["isha"][i],
+        }
+        for i in range(len(dates))
+    ]
@@ -0,0 +1,281 @@
+"""
+Профилирование работающего процесса бота.
+
+- profile(seconds) — семплирующий профилировщик на stdlib (в духе py-spy):
+  отдельный поток каждые PROFILE_INTERVAL_MS снимает стеки всех потоков через
+  sys._current_frames(). Профиль по «стенным часам»: видно, где стоит event
+  loop (MainThread), потоки asyncio.to_thread (эмбеддинги, ChromaDB) и потоки
+  aiosqlite. Результат — collapsed stacks (flamegraph.pl, speedscope)
+  или JSON speedscope.
+- SlowCallbackDetector — пишет в лог колбэки, занявшие event loop дольше
+  SLOW_CALLBACK_MS, вместе со стеком, на котором loop стоял.
+- profile_request_task — выполняет заявки на профиль из веб-админки
+  (таблица profile_requests): админка и бот — разные процессы.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+from config import PROFILE_INTERVAL_MS, PROFILE_MAX_SECONDS, SLOW_CALLBACK_MS
+from core.metrics import PROCESS_ID, registry
+
+FORMATS = ("speedscope", "collapsed")
+
+SLOW_CALLBACKS = registry.counter("bot_loop_slow_callbacks_total", "Колбэки, занявшие event loop дольше порога")
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Одновременно снимается только один профиль
+_profiling = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """Профиль уже снимается."""
+
+
+@dataclass
+class Profile:
+    seconds: float
+    interval: float
+    samples: int = 0
+    # (имя потока, кадры от корня к листу) → число выборок
+    stacks: Counter = field(default_factory=Counter)
+
+    def collapsed(self) -> str:
+        """Формат collapsed stacks: «поток;кадр;кадр N» на строку."""
+        return "".join(
+            f"{';'.join((thread,) + frames)} {count}\n"
+            for (thread, frames), count in self.stacks.most_common()
+        )
+
+    def speedscope(self) -> str:
+        """JSON для https://www.speedscope.app: по профилю на поток."""
+        frames: list[dict] = []
+        frame_index: dict[str, int] = {}
+        profiles: dict[str, dict] = {}
+        weight = self.seconds / self.samples if self.samples else self.interval
+
+        for (thread, stack), count in self.stacks.items():
+            indices = []
+            for label in stack:
+                index = frame_index.get(label)
+                if index is None:
+                    index = frame_index[label] = len(frames)
+                    frames.append(_speedscope_frame(label))
+                indices.append(index)
+            profile = profiles.setdefault(thread, {
+                "type": "sampled", "name": thread, "unit": "seconds",
+                "startValue": 0, "endValue": self.seconds, "samples": [], "weights": [],
+            })
+            profile["samples"].append(indices)
+            profile["weights"].append(count * weight)
+
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{PROCESS_ID} {self.seconds:g}s",
+            "exporter": "ramadan-bot core.profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": sorted(profiles.values(), key=lambda p: p["name"] != "MainThread"),
+        }, ensure_ascii=False)
+
+    def render(self, fmt: str) -> tuple[bytes, str]:
+        """(содержимое файла, имя файла) в формате fmt."""
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if fmt == "collapsed":
+            return self.collapsed().encode("utf-8"), f"profile-{stamp}.collapsed.txt"
+        return self.speedscope().encode("utf-8"), f"profile-{stamp}.speedscope.json"
+
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    """Путь относительно проекта или site-packages — без префиксов окружения."""
+    if filename.startswith(_ROOT + os.sep):
+        return filename[len(_ROOT) + 1:]
+    for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+        position = filename.rfind(marker)
+        if position >= 0:
+            return filename[position:]
+    return filename
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _speedscope_frame(label: str) -> dict:
+    name, _, location = label.rpartition(" (")
+    file, _, line = location.rstrip(")").rpartition(":")
+    return {"name": name, "file": file, "line": int(line)}
+
+
+def _sample(profile: Profile):
+    """Цикл выборки (в отдельном потоке); свой поток в профиль не попадает."""
+    own = threading.get_ident()
+    deadline = time.monotonic() + profile.seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            profile.stacks[(names.get(ident, f"thread-{ident}"), tuple(stack))] += 1
+        profile.samples += 1
+        time.sleep(profile.interval)
+
+
+async def profile(seconds: float, interval: float = PROFILE_INTERVAL_MS / 1000) -> Profile:
+    """Снять профиль процесса за seconds секунд (не блокирует event loop)."""
+    seconds = min(max(seconds, 1), PROFILE_MAX_SECONDS)
+    if not _profiling.acquire(blocking=False):
+        raise ProfilerBusy("Profiler is already running")
+    try:
+        result = Profile(seconds, interval)
+        started = time.monotonic()
+        await asyncio.to_thread(_sample, result)
+        result.seconds = time.monotonic() - started
+        logger.info(f"Profile taken: {result.seconds:.1f}s, {result.samples} samples, {len(result.stacks)} stacks")
+        return result
+    finally:
+        _profiling.release()
+
+
+# ──────────────────────── Медленные колбэки ────────────────────────
+
+def _describe(handle: asyncio.Handle) -> str:
+    """Чей колбэк: задача с корутиной или функция."""
+    callback = handle._callback
+    owner = getattr(callback, "__self__", None)
+    if isinstance(owner, asyncio.Task):
+        coro = owner.get_coro()
+        return f"task {owner.get_name()} ({getattr(coro, '__qualname__', coro)})"
+    return getattr(callback, "__qualname__", repr(callback))
+
+
+def _callback_stack(frame) -> list[str]:
+    """Стек колбэка без кадров самого event loop (всё до Handle._run включительно)."""
+    entries = traceback.extract_stack(frame)
+    for i in range(len(entries) - 1, -1, -1):
+        if entries[i].name == "_run" and entries[i].filename.endswith(os.path.join("asyncio", "events.py")):
+            entries = entries[i + 1:]
+            break
+    return traceback.format_list(entries)
+
+
+class SlowCallbackDetector:
+    """
+    Замер каждого колбэка event loop (обёртка asyncio.Handle._run — то же,
+    что делает loop.slow_callback_duration, но без накладных расходов debug-режима).
+    Сторожевой поток снимает стек loop, пока медленный колбэк ещё выполняется, —
+    в лог попадает место, где loop блокировался, а не только имя задачи.
+    """
+
+    def __init__(self, threshold: float = SLOW_CALLBACK_MS / 1000):
+        self.threshold = threshold
+        self._thread_id: int | None = None
+        self._original = None
+        # (handle, начало) текущего колбэка и стек, снятый сторожем
+        self._current: tuple | None = None
+        self._stack: tuple | None = None
+        self._stopped = threading.Event()
+
+    def install(self):
+        """Включить для event loop текущего потока."""
+        if self._original is not None:
+            return
+        self._thread_id = threading.get_ident()
+        self._original = original = asyncio.Handle._run
+        detector = self
+
+        def _run(handle):
+            if threading.get_ident() != detector._thread_id:
+                return original(handle)
+            current = detector._current = (handle, time.perf_counter())
+            try:
+                return original(handle)
+            finally:
+                duration = time.perf_counter() - current[1]
+                detector._current = None
+                if duration >= detector.threshold:
+                    detector._report(handle, duration, current)
+
+        asyncio.Handle._run = _run
+        self._stopped.clear()
+        threading.Thread(target=self._watch, name="slow-callback-watchdog", daemon=True).start()
+        logger.info(f"Slow callback detector: threshold {self.threshold * 1000:.0f} ms")
+
+    def uninstall(self):
+        if self._original is None:
+            return
+        asyncio.Handle._run = self._original
+        self._original = None
+        self._stopped.set()
+
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 2):
+            current = self._current
+            if current is None or time.perf_counter() - current[1] < self.threshold:
+                continue
+            if self._stack is not None and self._stack[0] is current:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None and self._current is current:
+                self._stack = (current, _callback_stack(frame))
+
+    def _report(self, handle: asyncio.Handle, duration: float, current: tuple):
+        SLOW_CALLBACKS.inc()
+        captured = self._stack
+        stack = ""
+        if captured is not None and captured[0] is current:
+            stack = "\n" + "".join(captured[1][-15:]).rstrip()
+        logger.warning(f"Slow callback: {duration * 1000:.0f} ms in {_describe(handle)}{stack}")
+
+
+async def slow_callback_task(threshold: float = SLOW_CALLBACK_MS / 1000):
+    """Background task: детектор медленных колбэков на время жизни процесса."""
+    if threshold <= 0:
+        return
+    detector = SlowCallbackDetector(threshold)
+    detector.install()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        detector.uninstall()
+
+
+# ──────────────────────── Заявки из веб-админки ────────────────────────
+
+async def profile_request_task(db, interval: float = 2):
+    """Background task: снять профиль по заявке из profile_requests и сохранить результат."""
+    while True:
+        try:
+            await asyncio.sleep(interval)
+            request = await db.claim_profile_request(PROCESS_ID)
+            if request is None:
+                continue
+            try:
+                result = await profile(request["seconds"])
+                data, _ = result.render(request["format"])
+                await db.finish_profile_request(request["id"], result=data.decode("utf-8"))
+            except Exception as e:
+                logger.warning(f"Profile request #{request['id']} failed: {e}")
+                await db.finish_profile_request(request["id"], error=str(e))
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.error(f"Profile request error: {e}")
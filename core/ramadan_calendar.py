@@ -1,50 +1,278 @@
 """
-Логика Рамадан-календаря: загрузка данных из API muftyat.kz, кэширование, фильтрация.
+Логика Рамадан-календаря: даты Рамадана по годам (SeasonService),
+загрузка данных из API muftyat.kz, кэширование, фильтрация.
 """
 
-from datetime import date
+import asyncio
+import functools
+import math
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
 
 from loguru import logger
 
+from config import RAMADAN_DATES
+from core.prayer_calc import KZ_UTC_OFFSET, compute_prayer_times
 
-RAMADAN_START = date(2026, 2, 19)
-RAMADAN_END = date(2026, 3, 20)  # 30 дней
 
+@dataclass(frozen=True)
+class RamadanSeason:
+    start: date
+    end: date
 
-def get_ramadan_day_number() -> int | None:
-    """Получить номер текущего дня Рамадана (1-30) или None если не Рамадан."""
-    today = date.today()
-    if today < RAMADAN_START or today > RAMADAN_END:
-        return None
-    return (today - RAMADAN_START).days + 1
+    @property
+    def year(self) -> int:
+        return self.start.year
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days + 1
+
+    def day_number(self, day: date) -> int | None:
+        if day < self.start or day > self.end:
+            return None
+        return (day - self.start).days + 1
+
+
+def _hijri_to_ordinal(year: int, month: int, day: int) -> int:
+    """Табличный (арифметический) хиджри-календарь → date.toordinal()."""
+    jdn = day + math.ceil(29.5 * (month - 1)) + (year - 1) * 354 + (3 + 11 * year) // 30 + 1948439
+    return jdn - 1721425
+
+
+def tabular_season(hijri_year: int) -> RamadanSeason:
+    """Рамадан (9-й месяц) по табличному календарю; ± 1 день от объявленных дат."""
+    start = date.fromordinal(_hijri_to_ordinal(hijri_year, 9, 1))
+    end = date.fromordinal(_hijri_to_ordinal(hijri_year, 10, 1) - 1)
+    return RamadanSeason(start, end)
+
+
+def _parse_seasons(value: str) -> list[RamadanSeason]:
+    seasons = []
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        try:
+            start, end = item.split(":")
+            seasons.append(RamadanSeason(date.fromisoformat(start.strip()), date.fromisoformat(end.strip())))
+        except ValueError:
+            logger.error(f"Invalid RAMADAN_DATES entry: {item!r}")
+    return seasons
+
+
+# Граница Казахстана упрощённым многоугольником (lng, lat), точность — десятки км;
+# Каспий внутри (там нет пользователей). Весь Казахстан — UTC+5 (с марта 2024)
+_KZ_BORDER = (
+    (49.0, 46.4), (47.4, 47.6), (46.5, 48.5), (46.8, 49.4), (47.5, 50.4), (48.7, 50.6),
+    (50.0, 51.0), (52.5, 51.6), (54.0, 51.0), (55.6, 50.6), (57.5, 51.0), (58.6, 50.9),
+    (60.0, 51.0), (61.0, 52.0), (61.0, 53.0), (61.3, 53.9), (63.0, 54.0), (65.5, 54.6),
+    (68.2, 55.2), (70.0, 55.3), (71.0, 54.3), (73.4, 53.9), (74.5, 53.6), (76.5, 53.9),
+    (78.0, 53.0), (79.0, 52.5), (80.5, 51.3), (81.5, 50.8), (83.4, 51.0), (84.0, 50.2),
+    (85.5, 49.6), (86.8, 49.8), (87.3, 49.1), (85.6, 47.1), (83.0, 47.2), (82.5, 45.3),
+    (80.8, 44.9), (80.3, 44.2), (80.2, 42.9), (76.0, 43.0), (74.6, 42.95), (73.5, 43.0),
+    (72.5, 42.7), (71.1, 42.6), (70.5, 42.1), (69.4, 41.4), (68.5, 40.6), (67.9, 40.9),
+    (66.5, 42.0), (64.0, 43.6), (61.0, 44.3), (58.5, 45.3), (56.0, 45.0), (56.0, 41.3),
+    (55.4, 41.3), (52.9, 41.8), (49.8, 44.6),
+)
+
+# Соседние регионы, где пояс не совпадает с долготой: (lat, lng, UTC-смещение).
+# Берётся ближайший город не дальше TZ_REFERENCE_MAX_KM
+_TZ_REFERENCE = (
+    (42.87, 74.59, 6.0),    # Бишкек
+    (40.51, 72.80, 6.0),    # Ош
+    (42.49, 78.39, 6.0),    # Каракол
+    (41.43, 75.99, 6.0),    # Нарын
+    (42.52, 72.24, 6.0),    # Талас
+    (41.30, 69.28, 5.0),    # Ташкент
+    (40.78, 72.34, 5.0),    # Андижан
+    (40.28, 69.62, 5.0),    # Худжанд
+    (42.46, 59.60, 5.0),    # Нукус
+    (41.84, 59.97, 5.0),    # Дашогуз
+    (40.02, 52.96, 5.0),    # Туркменбашы
+    (54.98, 73.37, 6.0),    # Омск
+    (55.03, 82.92, 7.0),    # Новосибирск
+    (53.35, 83.78, 7.0),    # Барнаул
+    (51.50, 81.20, 7.0),    # Рубцовск
+    (51.96, 85.96, 7.0),    # Горно-Алтайск
+    (43.83, 87.62, 8.0),    # Урумчи
+    (43.91, 81.32, 8.0),    # Кульджа
+    (46.75, 82.98, 8.0),    # Чугучак
+    (47.85, 88.13, 8.0),    # Алтай (Синьцзян)
+    (39.47, 75.99, 8.0),    # Кашгар
+    (46.35, 48.03, 4.0),    # Астрахань
+    (51.53, 46.03, 4.0),    # Саратов
+    (53.20, 50.15, 4.0),    # Самара
+    (51.77, 55.10, 5.0),    # Оренбург
+    (55.16, 61.40, 5.0),    # Челябинск
+    (55.45, 65.33, 5.0),    # Курган
+)
+TZ_REFERENCE_MAX_KM = 400.0
+
+
+def _in_kazakhstan(lat: float, lng: float) -> bool:
+    """Точка внутри _KZ_BORDER (чётность пересечений луча)."""
+    inside = False
+    x1, y1 = _KZ_BORDER[-1]
+    for x2, y2 in _KZ_BORDER:
+        if (y1 > lat) != (y2 > lat) and lng < x1 + (lat - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+@functools.lru_cache(maxsize=4096)
+def tz_offset_for(lat: float | None = None, lng: float | None = None) -> float:
+    """
+    Смещение от UTC (часы) для координат — приближение без базы часовых поясов:
+    внутри границы Казахстана (упрощённый многоугольник) — UTC+5; в соседних
+    регионах — пояс ближайшего города из _TZ_REFERENCE (в пределах
+    TZ_REFERENCE_MAX_KM); дальше — по долготе (ошибается на час-два там,
+    где пояс не следует долготе, например в Китае).
+    """
+    if lat is None or lng is None or _in_kazakhstan(lat, lng):
+        return KZ_UTC_OFFSET
+    best, best_km = None, TZ_REFERENCE_MAX_KM
+    for ref_lat, ref_lng, offset in _TZ_REFERENCE:
+        x = math.radians(lng - ref_lng) * math.cos(math.radians((lat + ref_lat) / 2))
+        km = 6371.0 * math.hypot(x, math.radians(lat - ref_lat))
+        if km < best_km:
+            best, best_km = offset, km
+    if best is not None:
+        return best
+    return float(round(lng / 15.0))
+
+class SeasonService:
+    """
+    Окна Рамадана по годам: объявленные даты из RAMADAN_DATES, иначе табличный расчёт.
+    Номер дня для часового пояса считается раз в локальные сутки, дальше — O(1).
+    """
+
+    def __init__(self, announced: str = RAMADAN_DATES):
+        self._announced = _parse_seasons(announced)
+        self._by_hijri: dict[int, RamadanSeason] = {}
+        # tz → (действует до, unix; сегодня; ближайший сезон; номер дня)
+        self._today: dict[float, tuple[float, date, RamadanSeason, int | None]] = {}
+
+    def season(self, hijri_year: int) -> RamadanSeason:
+        cached = self._by_hijri.get(hijri_year)
+        if cached is None:
+            cached = tabular_season(hijri_year)
+            for announced in self._announced:
+                # Объявленные даты отличаются от табличных на день-два
+                if abs((announced.start - cached.start).days) <= 5:
+                    cached = announced
+                    break
+            self._by_hijri[hijri_year] = cached
+        return cached
+
+    def season_for(self, day: date) -> RamadanSeason:
+        """Текущий Рамадан, если day внутри него, иначе ближайший следующий."""
+        # Хиджри-год короче григорианского на ~11 дней: оценка с запасом в один год
+        hijri_year = int((day.toordinal() - _hijri_to_ordinal(1, 1, 1)) / 354.367) + 1
+        for year in range(hijri_year - 1, hijri_year + 2):
+            season = self.season(year)
+            if season.end >= day:
+                return season
+        return self.season(hijri_year + 2)
+
+    def _state(self, tz: float) -> tuple[float, date, RamadanSeason, int | None]:
+        state = self._today.get(tz)
+        if state is None or time.time() >= state[0]:
+            now = datetime.now(timezone.utc) + timedelta(hours=tz)
+            today = now.date()
+            midnight = datetime.combine(today + timedelta(days=1), datetime.min.time(), timezone.utc)
+            valid_until = (midnight - timedelta(hours=tz)).timestamp()
+            season = self.season_for(today)
+            state = (valid_until, today, season, season.day_number(today))
+            self._today[tz] = state
+        return state
+
+    def today(self, tz: float = KZ_UTC_OFFSET) -> date:
+        return self._state(tz)[1]
+
+    def current(self, tz: float = KZ_UTC_OFFSET) -> RamadanSeason:
+        """Идущий или ближайший Рамадан."""
+        return self._state(tz)[2]
+
+    def day_number(self, tz: float = KZ_UTC_OFFSET) -> int | None:
+        """Номер дня Рамадана (1-30) сегодня в поясе tz или None."""
+        return self._state(tz)[3]
+
+    def days_until(self, tz: float = KZ_UTC_OFFSET) -> int:
+        _, today, season, _ = self._state(tz)
+        return (season.start - today).days
+
+
+season = SeasonService()
+
+
+def get_ramadan_day_number(today: date | None = None) -> int | None:
+    """Получить номер дня Рамадана (1-30) на дату (по умолчанию сегодня) или None если не Рамадан."""
+    if today is None:
+        return season.day_number()
+    return season.season_for(today).day_number(today)
 
 
 def is_ramadan() -> bool:
     """Проверить, идёт ли Рамадан сейчас."""
-    return get_ramadan_day_number() is not None
+    return season.day_number() is not None
+
 
+async def ensure_prayer_times(api, db, city_name: str, lat: float, lng: float, year: int = None):
+    """
+    Загрузить и закэшировать данные за год (по умолчанию — годы ближайшего Рамадана).
+    Если API недоступно — локальный расчёт (core.prayer_calc), позже заменяется данными API.
+    """
+    if year is None:
+        current = season.current(tz_offset_for(lat, lng))
+        ok = True
+        for y in sorted({current.start.year, current.end.year}):
+            ok = await ensure_prayer_times(api, db, city_name, lat, lng, y) and ok
+        return ok
 
-async def ensure_prayer_times(api, db, city_name: str, lat: float, lng: float):
-    """Загрузить и закэшировать данные если нет в кэше."""
-    if await db.is_prayer_times_cached(lat, lng, 2026):
+    if await db.is_prayer_times_cached(lat, lng, year):
         return True
     try:
-        data = await api.get_prayer_times(2026, lat, lng)
-        if not data:
-            logger.warning(f"No prayer times from API for {city_name} ({lat}, {lng})")
-            return False
-        await db.cache_prayer_times(city_name, lat, lng, data)
-        logger.info(f"Prayer times cached: {city_name} ({lat}, {lng}), {len(data)} days")
-        return True
+        data = await api.get_prayer_times(year, lat, lng)
+        if data:
+            await db.cache_prayer_times(city_name, lat, lng, data)
+            logger.info(f"Prayer times cached: {city_name} ({lat}, {lng}) {year}, {len(data)} days")
+            return True
+        logger.warning(f"No prayer times from API for {city_name} ({lat}, {lng}) {year}")
     except Exception as e:
         logger.error(f"Failed to load prayer times for {city_name}: {e}")
+
+    try:
+        data = await asyncio.to_thread(compute_prayer_times, year, lat, lng, tz_offset_for(lat, lng))
+        await db.cache_prayer_times(city_name, lat, lng, data, source="local")
+        logger.info(f"Prayer times computed locally: {city_name} ({lat}, {lng}) {year}")
+        return True
+    except Exception as e:
+        logger.error(f"Local prayer time calculation failed for {city_name}: {e}")
         return False
 
 
-def filter_ramadan_days(all_days: list[dict]) -> list[dict]:
-    """Из кэшированных записей отфильтровать дни Рамадана (19.02-20.03.2026)."""
-    start_str = RAMADAN_START.isoformat()
-    end_str = RAMADAN_END.isoformat()
+async def replace_local_prayer_times(api, db) -> int:
+    """Заменить локально рассчитанные годы данными API, если оно снова отвечает."""
+    replaced = 0
+    for item in await db.get_local_prayer_years():
+        try:
+            data = await api.get_prayer_times(item["year"], item["lat"], item["lng"])
+        except Exception as e:
+            logger.debug(f"API still unavailable for ({item['lat']}, {item['lng']}): {e}")
+            continue
+        if data:
+            await db.cache_prayer_times(item["city_name"] or "?", item["lat"], item["lng"], data)
+            replaced += 1
+    return replaced
+
+
+def filter_ramadan_days(all_days: list[dict], current: RamadanSeason = None) -> list[dict]:
+    """Из кэшированных записей отфильтровать дни Рамадана (по умолчанию — ближайшего)."""
+    current = current or season.current()
+    start_str = current.start.isoformat()
+    end_str = current.end.isoformat()
     ramadan_days = []
     for day in all_days:
         d = day.get("date", "")
@@ -0,0 +1,163 @@
+"""
+Планировщик напоминаний Рамадана: сәресі / ауызашар за 10 минут и совет дня в 12:00.
+
+Раз в сутки (и при старте) строится куча событий (время, вид, группа координат),
+цикл спит до ближайшего дедлайна — между событиями БД не трогается.
+Наступившее событие ставит сообщения в outbox (core.delivery) со сроком
+годности: опоздавшие досылаются, пока не прошёл их крайний срок
+(время намаза для сәресі/ауызашар, конец дня для совета).
+"""
+
+import asyncio
+import heapq
+import itertools
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator
+
+from loguru import logger
+
+from core.daily_tips import DAILY_TIPS
+from core.delivery import PRIORITY_REMINDER
+from core.messages import get_msg
+from core.ramadan_calendar import ensure_prayer_times, get_ramadan_day_number
+
+REMINDER_LEAD = timedelta(minutes=10)
+DAILY_TIP_TIME = time(12, 0)
+# Пересборка расписания в течение дня — подхватить новые города пользователей
+RESCHEDULE_INTERVAL = timedelta(hours=1)
+
+_seq = itertools.count()
+
+
+def _parse_hhmm(day: date, value: str) -> datetime | None:
+    try:
+        hours, minutes = value.split(":")[:2]
+        return datetime.combine(day, time(int(hours), int(minutes)))
+    except (ValueError, AttributeError):
+        return None
+
+
+async def build_daily_schedule(db, muftyat_api, day: date) -> list[tuple]:
+    """Куча событий на день: (fire_at, seq, kind, deadline, payload)."""
+    heap: list[tuple] = []
+    day_num = get_ramadan_day_number(day)
+    if day_num is None:
+        return heap
+
+    groups = await db.get_users_grouped_by_coordinates()
+    day_str = day.isoformat()
+
+    for group in groups:
+        lat = group["city_lat"]
+        lng = group["city_lng"]
+        city = group["city"] or "?"
+
+        await ensure_prayer_times(muftyat_api, db, city, lat, lng)
+        cached = await db.get_cached_prayer_times(lat, lng, day_str, day_str)
+        if not cached:
+            continue
+
+        for kind, field in (("suhoor", "fajr"), ("iftar", "maghrib")):
+            value = cached[0].get(field, "")
+            prayer_at = _parse_hhmm(day, value)
+            if prayer_at is None:
+                continue
+            payload = {"lat": lat, "lng": lng, "city": city, "time": value}
+            heapq.heappush(heap, (prayer_at - REMINDER_LEAD, next(_seq), kind, prayer_at, payload))
+
+    if groups and 1 <= day_num <= len(DAILY_TIPS):
+        tip_at = datetime.combine(day, DAILY_TIP_TIME)
+        end_of_day = datetime.combine(day + timedelta(days=1), time.min)
+        heapq.heappush(heap, (tip_at, next(_seq), "daily_tip", end_of_day, {"day_num": day_num}))
+
+    return heap
+
+
+async def _tip_items(db, day: date) -> AsyncIterator[list[tuple]]:
+    async for chunk in db.iter_audience(with_location=True):
+        yield [(u["telegram_id"], None, f"{day}:{u['telegram_id']}:daily_tip") for u in chunk]
+
+
+async def _reminder_items(db, day: date, kind: str, payload: dict) -> AsyncIterator[list[tuple]]:
+    if kind == "suhoor":
+        msg_key, time_arg = "suhoor_reminder", "fajr"
+    else:
+        msg_key, time_arg = "iftar_reminder", "maghrib"
+
+    texts: dict[str, str] = {}
+    async for chunk in db.iter_audience(payload["lat"], payload["lng"]):
+        items = []
+        for u in chunk:
+            lang = u.get("language") or "kk"
+            if lang not in texts:
+                texts[lang] = get_msg(msg_key, lang, city=payload["city"], **{time_arg: payload["time"]})
+            items.append((u["telegram_id"], texts[lang], f"{day}:{u['telegram_id']}:{kind}"))
+        yield items
+
+
+async def _fire(delivery, db, day: date, kind: str, deadline: datetime, payload: dict):
+    """Поставить сообщения события в очередь доставки (повторы отсекаются по dedup_key)."""
+    if kind == "daily_tip":
+        tip = DAILY_TIPS[payload["day_num"] - 1]
+        job_id = await delivery.enqueue("daily_tip", _tip_items(db, day), PRIORITY_REMINDER, deadline, text=tip)
+        logger.info(f"Daily tip #{payload['day_num']} queued (job #{job_id})")
+        return
+
+    job_id = await delivery.enqueue(kind, _reminder_items(db, day, kind, payload), PRIORITY_REMINDER, deadline)
+    logger.debug(f"{kind} reminder for {payload['city']} queued (job #{job_id})")
+
+
+def _event_key(day: date, kind: str, payload: dict) -> tuple:
+    return (day, kind, payload.get("lat"), payload.get("lng"))
+
+
+async def ramadan_reminder_task(delivery, db, muftyat_api):
+    """Background task: напоминания за 10 мин до сәресі/ауызашар и совет дня."""
+    fired: set[tuple] = set()
+    heap: list[tuple] = []
+    schedule_day: date | None = None
+    next_rebuild = datetime.min
+
+    while True:
+        try:
+            now = datetime.now()
+
+            if now.date() != schedule_day or now >= next_rebuild:
+                if now.date() != schedule_day:
+                    fired.clear()
+                schedule_day = now.date()
+                heap = await build_daily_schedule(db, muftyat_api, schedule_day)
+                next_rebuild = min(
+                    now + RESCHEDULE_INTERVAL,
+                    datetime.combine(schedule_day + timedelta(days=1), time.min),
+                )
+                if heap:
+                    logger.info(f"Reminder schedule for {schedule_day}: {len(heap)} events")
+
+            # Все наступившие события: ставим в очередь или пропускаем просроченные
+            now = datetime.now()
+            while heap and heap[0][0] <= now:
+                fire_at, _, kind, deadline, payload = heapq.heappop(heap)
+                key = _event_key(schedule_day, kind, payload)
+                if key in fired:
+                    continue
+                fired.add(key)
+                if now >= deadline:
+                    logger.warning(f"Reminder {kind} {payload.get('city', '')} missed its deadline {deadline:%H:%M}")
+                    continue
+                if now - fire_at > timedelta(seconds=60):
+                    logger.info(f"Catching up {kind} reminder scheduled at {fire_at:%H:%M}")
+                await _fire(delivery, db, schedule_day, kind, deadline, payload)
+                now = datetime.now()
+
+            wake_at = next_rebuild
+            if heap and heap[0][0] < wake_at:
+                wake_at = heap[0][0]
+            await asyncio.sleep(max((wake_at - datetime.now()).total_seconds(), 0.5))
+
+        except asyncio.CancelledError:
+            logger.info("Ramadan reminder task cancelled")
+            break
+        except Exception as e:
+            logger.error(f"Ramadan reminder task error: {e}")
+            await asyncio.sleep(60)
@@ -11,11 +11,17 @@ import time
 from typing import Optional
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 from loguru import logger
 
 from config import EMBEDDING_MODEL, CHROMA_PATH, CACHE_THRESHOLD, SIMILARITY_THRESHOLD
+from core.metrics import CACHE_LOOKUPS
+from core.tracing import traced
+
+# Предел запомненных эмбеддингов неотвеченных вопросов (веб-админка)
+ENCODED_QUESTIONS_LIMIT = 20_000
 
 
 class SearchEngine:
@@ -32,6 +38,10 @@ class SearchEngine:
         self._client: Optional[chromadb.ClientAPI] = None
         self._kb_collection = None
         self._cache_collection = None
+        self._stored_embeddings: dict[str, np.ndarray] = {}
+        self._stored_embeddings_count = -1
+        # Эмбеддинги вопросов, которых нет в ai_cache (неотвеченные), посчитанные моделью
+        self._encoded_questions: dict[str, np.ndarray] = {}
 
     def init(self):
         """Инициализация модели и ChromaDB."""
@@ -61,6 +71,18 @@ class SearchEngine:
         cache_count = self._cache_collection.count()
         logger.info(f"ChromaDB: {kb_count} knowledge docs, {cache_count} cached answers")
 
+    def init_cache_only(self):
+        """Открыть только коллекцию кэша, без загрузки модели (для веб-админки)."""
+        os.makedirs(self.chroma_path, exist_ok=True)
+        self._client = chromadb.PersistentClient(
+            path=self.chroma_path,
+            settings=Settings(anonymized_telemetry=False),
+        )
+        self._cache_collection = self._client.get_or_create_collection(
+            name="ai_cache",
+            metadata={"hnsw:space": "cosine"},
+        )
+
     def get_collection_count(self) -> int:
         if self._kb_collection is None:
             return 0
@@ -126,6 +148,7 @@ class SearchEngine:
 
         return output
 
+    @traced("search.context")
     async def search_context(self, query: str, n_results: int = 5) -> list[dict]:
         return await asyncio.to_thread(self._sync_search_context, query, n_results)
 
@@ -163,8 +186,11 @@ class SearchEngine:
             "from_cache": True,
         }
 
+    @traced("search.cache")
     async def search_cache(self, question: str) -> Optional[dict]:
-        return await asyncio.to_thread(self._sync_search_cache, question)
+        cached = await asyncio.to_thread(self._sync_search_cache, question)
+        CACHE_LOOKUPS.inc("ai_answers", "hit" if cached else "miss")
+        return cached
 
     def _sync_cache_answer(self, question: str, answer: str, sources: str = ""):
         """Сохраняет ИИ-ответ в кэш."""
@@ -180,9 +206,105 @@ class SearchEngine:
         )
         logger.info(f"Cached answer for: '{question[:50]}...'")
 
+    @traced("search.cache_store")
     async def cache_answer(self, question: str, answer: str, sources: str = ""):
         return await asyncio.to_thread(self._sync_cache_answer, question, answer, sources)
 
+    # ==================== Similar Questions ====================
+
+    def _sync_load_stored_embeddings(self) -> dict[str, np.ndarray]:
+        """
+        Вопрос → нормированный эмбеддинг, уже сохранённый в ai_cache.
+        Перечитывается только при изменении размера коллекции.
+        """
+        if self._cache_collection is None:
+            return {}
+        count = self._cache_collection.count()
+        if count == self._stored_embeddings_count:
+            return self._stored_embeddings
+
+        stored = {}
+        for offset in range(0, count, 1000):
+            batch = self._cache_collection.get(
+                limit=1000, offset=offset, include=["documents", "embeddings"],
+            )
+            for doc, emb in zip(batch["documents"], batch["embeddings"]):
+                vec = np.asarray(emb, dtype=np.float32)
+                norm = np.linalg.norm(vec)
+                if doc and norm:
+                    stored[doc] = vec / norm
+        self._stored_embeddings = stored
+        self._stored_embeddings_count = count
+        return stored
+
+    def _sync_encode_questions(self, texts: list[str]) -> dict[str, np.ndarray]:
+        """
+        Нормированные эмбеддинги текстов без сохранённого в ai_cache вектора.
+        Модель загружается при первом вызове (веб-админка открывает кэш без неё);
+        результаты запоминаются, повторные запросы модель не вызывают.
+        """
+        result = {t: self._encoded_questions[t] for t in texts if t in self._encoded_questions}
+        missing = list(dict.fromkeys(t for t in texts if t not in result))
+        if missing:
+            if self._model is None:
+                logger.info(f"Loading embedding model for similar questions: {self.model_name}...")
+                self._model = SentenceTransformer(self.model_name)
+            vectors = self._model.encode(missing, show_progress_bar=False, normalize_embeddings=True)
+            result.update(zip(missing, np.asarray(vectors, dtype=np.float32)))
+            if len(self._encoded_questions) + len(missing) > ENCODED_QUESTIONS_LIMIT:
+                # Переполнение: запоминаем только текущий запрос
+                self._encoded_questions = dict(result)
+            else:
+                self._encoded_questions.update(result)
+        return result
+
+    def _sync_group_similar(self, questions: list[tuple[str, ...]], threshold: float) -> list[list[int]]:
+        """
+        Жадная кластеризация вопросов по эмбеддингам.
+        Для каждого вопроса передаются варианты текста (нормализованный запрос,
+        совпавший вопрос из кэша) — берётся первый, для которого эмбеддинг уже
+        сохранён в ai_cache. Остальные (неотвеченные вопросы в кэш не попадают)
+        кодируются моделью по первому варианту; если модель недоступна — такие
+        вопросы образуют отдельные группы.
+        Возвращает группы индексов; порядок входа сохраняется (первый — «лидер» группы).
+        """
+        stored = self._sync_load_stored_embeddings()
+        vectors = [next((stored[v] for v in variants if v in stored), None) for variants in questions]
+
+        missing = [variants[0] for variants, vec in zip(questions, vectors) if vec is None and variants]
+        if missing:
+            try:
+                encoded = self._sync_encode_questions(missing)
+                vectors = [
+                    encoded[variants[0]] if vec is None and variants else vec
+                    for variants, vec in zip(questions, vectors)
+                ]
+            except Exception as e:
+                logger.warning(f"Similar questions: cannot encode {len(missing)} questions: {e}")
+
+        groups: list[list[int]] = []
+        leaders: list[np.ndarray] = []
+        leader_groups: list[int] = []
+
+        for i, vec in enumerate(vectors):
+            if vec is None:
+                groups.append([i])
+                continue
+            if leaders:
+                sims = np.stack(leaders) @ vec
+                best = int(np.argmax(sims))
+                if sims[best] >= threshold:
+                    groups[leader_groups[best]].append(i)
+                    continue
+            leaders.append(vec)
+            leader_groups.append(len(groups))
+            groups.append([i])
+
+        return groups
+
+    async def group_similar(self, questions: list[tuple[str, ...]], threshold: float) -> list[list[int]]:
+        return await asyncio.to_thread(self._sync_group_similar, questions, threshold)
+
     def clear_cache(self):
         """Очистка кэша ИИ-ответов."""
         if self._client:
@@ -0,0 +1,26 @@
+"""
+Фоновое обновление статистики для дашбордов.
+Счётчики и rollup-таблицы поддерживаются триггерами SQLite,
+здесь периодически пересчитывается только снимок топ-N вопросов.
+"""
+
+import asyncio
+
+from loguru import logger
+
+from config import STATS_REFRESH_INTERVAL
+
+
+async def stats_refresh_task(db, interval: int = STATS_REFRESH_INTERVAL):
+    """Background task: пересчёт stats_top каждые interval секунд."""
+    while True:
+        try:
+            await db.refresh_top_lists()
+            logger.debug("Stats top lists refreshed")
+            await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            logger.info("Stats refresh task cancelled")
+            break
+        except Exception as e:
+            logger.error(f"Stats refresh task error: {e}")
+            await asyncio.sleep(interval)
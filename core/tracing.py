@@ -0,0 +1,110 @@
+"""
+Трассировка обработки апдейта по этапам.
+
+span("stage") измеряет блок кода; длительности копятся в гистограмме
+bot_stage_duration_seconds{stage=...} (core.metrics → /metrics в веб-админке).
+Внутри trace_update() спаны ещё и собираются в список; при заданном
+TRACE_LOG_PATH медленные апдейты (≥ TRACE_LOG_MIN_MS) пишутся в JSON-лог.
+
+Этапы: update.* (весь апдейт), mw.* (middleware без хендлера), normalize,
+search.*, ai.*, db.* (каждый метод Database), telegram.* (запросы Bot API).
+"""
+
+import functools
+import inspect
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from loguru import logger
+
+from config import TRACE_LOG_PATH, TRACE_LOG_MIN_MS
+from core.metrics import registry
+
+STAGE_SECONDS = registry.histogram(
+    "bot_stage_duration_seconds", "Длительность этапов обработки апдейта", labels=("stage",),
+)
+
+# Спаны текущего апдейта: {"start": perf_counter, "spans": [(stage, offset, duration)]}
+_trace: ContextVar[dict | None] = ContextVar("trace", default=None)
+
+
+class span:
+    """with span("search.context"): ... — длительность блока в гистограмму этапа."""
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, self.start, time.perf_counter() - self.start)
+        return False
+
+
+def record(stage: str, start: float, duration: float):
+    """Учесть уже измеренный этап (start — perf_counter начала)."""
+    STAGE_SECONDS.observe(duration, stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace["spans"].append((stage, start - trace["start"], duration))
+
+
+def traced(stage: str):
+    """Декоратор: вызов функции (обычной или async) — спан stage."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(cls, prefix: str, exclude: tuple[str, ...] = ()):
+    """Обернуть все публичные async-методы класса в спаны prefix.<метод>."""
+    for name, func in list(vars(cls).items()):
+        if name.startswith("_") or name in exclude or not inspect.iscoroutinefunction(func):
+            continue
+        setattr(cls, name, traced(f"{prefix}.{name}")(func))
+    return cls
+
+
+@contextmanager
+def trace_update(stage: str, update_id: int = None):
+    """Корневой спан апдейта; собирает вложенные спаны для JSON-лога."""
+    start = time.perf_counter()
+    trace = {"start": start, "spans": []}
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage)
+        if TRACE_LOG_PATH and duration * 1000 >= TRACE_LOG_MIN_MS:
+            _log_trace(stage, update_id, duration, trace["spans"])
+
+
+def _log_trace(stage: str, update_id: int | None, duration: float, spans: list):
+    logger.bind(trace=True).info(json.dumps({
+        "update_id": update_id,
+        "stage": stage,
+        "ms": round(duration * 1000, 2),
+        "spans": [
+            {"stage": s, "at_ms": round(offset * 1000, 2), "ms": round(d * 1000, 2)}
+            for s, offset, d in spans
+        ],
+    }, ensure_ascii=False))
@@ -6,20 +6,41 @@
 """
 
 import os
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
 
 import aiosqlite
 from loguru import logger
 
 from config import DATABASE_PATH, CONVERSATION_HISTORY_LIMIT, USTAZ_MONTHLY_LIMIT
 from database.models import CREATE_TABLES_SQL
+from database.migrations import run_migrations
+from core.geo import snap_coords
+from core.metrics import registry
+from core.tracing import instrument_methods
+
+DB_STATEMENTS = registry.counter(
+    "db_statements_total", "SQL-операторы SQLite по типу (commit — фиксации транзакций)", labels=("kind",),
+)
+_STATEMENT_KINDS = {"select", "insert", "update", "delete", "commit", "begin", "rollback"}
+
+
+def _count_statement(sql: str):
+    """trace_callback соединения (вызывается в потоке aiosqlite на каждый оператор)."""
+    kind = sql.lstrip()[:8].split(maxsplit=1)[0].lower() if sql.strip() else ""
+    DB_STATEMENTS.inc(kind if kind in _STATEMENT_KINDS else "other")
+
+
+# Чат доступен для рассылок: не помечен недоступным или истёк backoff
+REACHABLE_SQL = "(delivery_retry_at IS NULL OR delivery_retry_at <= CURRENT_TIMESTAMP)"
 
 
 class Database:
     def __init__(self, db_path: str = DATABASE_PATH):
         self.db_path = db_path
         self._conn: Optional[aiosqlite.Connection] = None
+        # (lat, lng, year), для которых времена намаза уже в кэше
+        self._prayer_years: set[tuple[float, float, int]] = set()
 
     async def connect(self):
         """Подключение к БД и создание таблиц."""
@@ -32,6 +53,7 @@ class Database:
         await self._conn.execute("PRAGMA synchronous=NORMAL")
         await self._conn.execute("PRAGMA busy_timeout=5000")
         await self._conn.execute("PRAGMA cache_size=-8000")
+        await self._conn.set_trace_callback(_count_statement)
 
         await self._conn.executescript(CREATE_TABLES_SQL)
         await self._conn.commit()
@@ -42,27 +64,9 @@ class Database:
         logger.info(f"Database connected: {self.db_path} (WAL mode)")
 
     async def _run_migrations(self):
-        """Запуск миграций для добавления новых колонок."""
-        migrations = [
-            ("subscriptions", "telegram_payment_charge_id", "TEXT"),
-            ("users", "city", "TEXT DEFAULT NULL"),
-            ("users", "language", "TEXT DEFAULT 'kk'"),
-            ("users", "is_onboarded", "BOOLEAN DEFAULT FALSE"),
-            ("users", "city_lat", "REAL DEFAULT NULL"),
-            ("users", "city_lng", "REAL DEFAULT NULL"),
-        ]
-        for table, column, col_type in migrations:
-            try:
-                await self._conn.execute(
-                    f"ALTER TABLE {table} ADD COLUMN {column} {col_type}"
-                )
-                await self._conn.commit()
-                logger.info(f"Migration: added {table}.{column}")
-            except Exception:
-                pass  # Колонка уже существует
-
-        # Миграция существующих пользователей: city → city_lat/city_lng
-        await self._migrate_city_coordinates()
+        """Запуск версионированных миграций (database/migrations.py)."""
+        version = await run_migrations(self._conn)
+        logger.info(f"Database schema version: {version}")
 
     async def close(self):
         """Закрытие соединения."""
@@ -91,6 +95,10 @@ class Database:
                     (username, first_name, telegram_id),
                 )
                 await self._conn.commit()
+            # Пользователь снова пишет боту — чат доступен
+            if user.get("delivery_status", "ok") != "ok":
+                await self.mark_users_reachable([telegram_id])
+                user["delivery_status"] = "ok"
             return user
 
         await self._conn.execute(
@@ -127,28 +135,34 @@ class Database:
         row = await cursor.fetchone()
         return row["answers_count"]
 
+    @staticmethod
+    def subscription_active(user: dict) -> bool:
+        """Активна ли подписка по уже загруженной строке users (флаг + дата)."""
+        if not user or not user["is_subscribed"]:
+            return False
+        expires = user.get("subscription_expires_at")
+        return not expires or datetime.fromisoformat(expires) >= datetime.now()
+
+    async def expire_subscription(self, telegram_id: int):
+        """Снять истёкшую подписку."""
+        await self._conn.execute(
+            "UPDATE users SET is_subscribed = FALSE, subscription_expires_at = NULL, "
+            "updated_at = CURRENT_TIMESTAMP WHERE telegram_id = ?",
+            (telegram_id,),
+        )
+        await self._conn.commit()
+
     async def check_subscription(self, telegram_id: int) -> bool:
         """Проверить, активна ли подписка (по флагу + дате)."""
         user = await self.get_user(telegram_id)
-        if not user:
+        if not user or not user["is_subscribed"]:
             return False
 
-        if not user["is_subscribed"]:
+        if not self.subscription_active(user):
+            # Подписка истекла
+            await self.expire_subscription(telegram_id)
             return False
 
-        expires = user.get("subscription_expires_at")
-        if expires:
-            expires_dt = datetime.fromisoformat(expires)
-            if expires_dt < datetime.now():
-                # Подписка истекла
-                await self._conn.execute(
-                    "UPDATE users SET is_subscribed = FALSE, subscription_expires_at = NULL, "
-                    "updated_at = CURRENT_TIMESTAMP WHERE telegram_id = ?",
-                    (telegram_id,),
-                )
-                await self._conn.commit()
-                return False
-
         return True
 
     # ──────────────────── User City/Language/Onboarding ────────────────────
@@ -180,7 +194,8 @@ class Database:
     async def update_user_city_full(
         self, telegram_id: int, city_name: str, lat: float, lng: float
     ):
-        """Сохранить город + координаты пользователя."""
+        """Сохранить город + координаты пользователя (центр ячейки сетки, см. core.geo)."""
+        lat, lng = snap_coords(lat, lng)
         await self._conn.execute(
             "UPDATE users SET city = ?, city_lat = ?, city_lng = ?, "
             "updated_at = CURRENT_TIMESTAMP WHERE telegram_id = ?",
@@ -188,71 +203,129 @@ class Database:
         )
         await self._conn.commit()
 
-    async def _migrate_city_coordinates(self):
-        """Миграция существующих пользователей: заполнить city_lat/city_lng из CITY_COORDINATES."""
-        from core.cities import CITY_COORDINATES
-
-        cursor = await self._conn.execute(
-            "SELECT telegram_id, city FROM users WHERE city IS NOT NULL AND city_lat IS NULL"
-        )
-        rows = await cursor.fetchall()
-        migrated = 0
-        for row in rows:
-            coords = CITY_COORDINATES.get(row["city"])
-            if coords:
-                await self._conn.execute(
-                    "UPDATE users SET city_lat = ?, city_lng = ? WHERE telegram_id = ?",
-                    (coords[0], coords[1], row["telegram_id"]),
-                )
-                migrated += 1
-        if migrated:
-            await self._conn.commit()
-            logger.info(f"Migrated {migrated} users with city coordinates")
-
     # ──────────────── Users grouped by coordinates ──────────────
 
     async def get_users_grouped_by_coordinates(self) -> list[dict]:
-        """DISTINCT (city_lat, city_lng, city) для onboarded юзеров."""
+        """DISTINCT (city_lat, city_lng, city) для onboarded юзеров с доступным чатом."""
         cursor = await self._conn.execute(
             "SELECT DISTINCT city_lat, city_lng, city FROM users "
-            "WHERE is_onboarded = TRUE AND city_lat IS NOT NULL AND city_lng IS NOT NULL"
+            "WHERE is_onboarded = TRUE AND city_lat IS NOT NULL AND city_lng IS NOT NULL "
+            f"AND {REACHABLE_SQL}"
         )
         return [dict(row) for row in await cursor.fetchall()]
 
-    async def get_users_by_coordinates(self, lat: float, lng: float) -> list[dict]:
-        """Все onboarded юзеры с данными координатами."""
-        cursor = await self._conn.execute(
-            "SELECT telegram_id, language, first_name FROM users "
-            "WHERE is_onboarded = TRUE AND city_lat = ? AND city_lng = ?",
-            (lat, lng),
+    async def iter_audience(
+        self,
+        lat: float = None,
+        lng: float = None,
+        with_location: bool = False,
+        chunk_size: int = 500,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Получатели рассылок чанками: onboarded юзеры с доступным чатом.
+        lat/lng — только эта группа координат; with_location — все, у кого задан город.
+        Keyset по telegram_id: каждый чанк — поиск по индексу с позиции last_id
+        (idx_users_onboarded_id, с координатами — idx_users_audience) без сортировки,
+        в памяти не больше чанка.
+        """
+        where = ["is_onboarded = TRUE", REACHABLE_SQL, "telegram_id > ?"]
+        params: list = []
+        if lat is not None and lng is not None:
+            where.append("city_lat = ? AND city_lng = ?")
+            params.extend([lat, lng])
+        elif with_location:
+            where.append("city_lat IS NOT NULL AND city_lng IS NOT NULL")
+        sql = (
+            "SELECT telegram_id, language FROM users "
+            f"WHERE {' AND '.join(where)} ORDER BY telegram_id LIMIT ?"
         )
-        return [dict(row) for row in await cursor.fetchall()]
+
+        last_id = -1
+        while True:
+            cursor = await self._conn.execute(sql, [last_id] + params + [chunk_size])
+            chunk = [dict(row) for row in await cursor.fetchall()]
+            if not chunk:
+                return
+            yield chunk
+            if len(chunk) < chunk_size:
+                return
+            last_id = chunk[-1]["telegram_id"]
+
+    # ──────────────────── Delivery reachability ────────────────────
+
+    async def mark_users_undeliverable(self, failures: list[tuple[str, int]]):
+        """
+        Записать постоянные ошибки доставки: failures = [(reason, telegram_id)].
+        deactivated — навсегда; blocked / chat_not_found — backoff 1, 2, 4 … 30 дней,
+        после которого чат снова получает одно сообщение-пробу.
+        """
+        if not failures:
+            return
+        await self._conn.executemany(
+            "UPDATE users SET delivery_status = ?1, "
+            "delivery_failures = delivery_failures + 1, "
+            "delivery_retry_at = CASE WHEN ?1 = 'deactivated' THEN '9999-12-31 00:00:00' "
+            "ELSE datetime('now', '+' || MIN(30, 1 << MIN(delivery_failures, 5)) || ' days') END "
+            "WHERE telegram_id = ?2",
+            failures,
+        )
+        await self._conn.commit()
+
+    async def mark_users_reachable(self, telegram_ids: list[int]):
+        """Сбросить состояние недоступности (успешная доставка или новое сообщение от юзера)."""
+        if not telegram_ids:
+            return
+        await self._conn.executemany(
+            "UPDATE users SET delivery_status = 'ok', delivery_failures = 0, "
+            "delivery_retry_at = NULL WHERE telegram_id = ? AND delivery_status != 'ok'",
+            [(tid,) for tid in telegram_ids],
+        )
+        await self._conn.commit()
 
     # ──────────────────── Prayer Times Cache ────────────────────
 
     async def cache_prayer_times(
-        self, city_name: str, lat: float, lng: float, prayer_list: list[dict]
+        self, city_name: str, lat: float, lng: float, prayer_list: list[dict],
+        source: str = "api",
     ):
-        """Массовый INSERT времён намаза из API-ответа."""
-        for item in prayer_list:
-            await self._conn.execute(
-                "INSERT OR REPLACE INTO prayer_times_cache "
-                "(city_name, lat, lng, date, imsak, fajr, sunrise, dhuhr, asr, maghrib, isha) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                (
-                    city_name, lat, lng,
-                    item.get("Date", ""),
-                    item.get("imsak", ""),
-                    item.get("fajr", ""),
-                    item.get("sunrise", ""),
-                    item.get("dhuhr", ""),
-                    item.get("asr", ""),
-                    item.get("maghrib", ""),
-                    item.get("isha", ""),
-                ),
+        """
+        Массовый INSERT времён намаза (executemany, одна транзакция).
+        source: "api" — muftyat.kz, "local" — локальный расчёт (core.prayer_calc).
+        """
+        rows = [
+            (
+                city_name, lat, lng,
+                item.get("Date", ""),
+                item.get("imsak", ""),
+                item.get("fajr", ""),
+                item.get("sunrise", ""),
+                item.get("dhuhr", ""),
+                item.get("asr", ""),
+                item.get("maghrib", ""),
+                item.get("isha", ""),
             )
+            for item in prayer_list
+        ]
+        days_per_year: dict[int, int] = {}
+        for row in rows:
+            if row[3][:4].isdigit():
+                year = int(row[3][:4])
+                days_per_year[year] = days_per_year.get(year, 0) + 1
+
+        await self._conn.executemany(
+            "INSERT OR REPLACE INTO prayer_times_cache "
+            "(city_name, lat, lng, date, imsak, fajr, sunrise, dhuhr, asr, maghrib, isha) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        await self._conn.executemany(
+            "INSERT OR REPLACE INTO prayer_times_years (lat, lng, year, days, source) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(lat, lng, year, days, source) for year, days in days_per_year.items()],
+        )
         await self._conn.commit()
-        logger.info(f"Cached {len(prayer_list)} prayer times for {city_name} ({lat}, {lng})")
+        self._prayer_years.update((lat, lng, year) for year in days_per_year)
+        logger.info(f"Cached {len(prayer_list)} prayer times for {city_name} ({lat}, {lng}), source={source}")
 
     async def get_cached_prayer_times(
         self, lat: float, lng: float, date_from: str, date_to: str
@@ -267,14 +340,169 @@ class Database:
         return [dict(row) for row in await cursor.fetchall()]
 
     async def is_prayer_times_cached(self, lat: float, lng: float, year: int) -> bool:
-        """Проверить наличие кэшированных данных за год."""
+        """Проверить наличие кэшированных данных за год (память → PK prayer_times_years)."""
+        key = (lat, lng, year)
+        if key in self._prayer_years:
+            return True
         cursor = await self._conn.execute(
-            "SELECT COUNT(*) as cnt FROM prayer_times_cache "
-            "WHERE lat = ? AND lng = ? AND date LIKE ?",
-            (lat, lng, f"{year}-%"),
+            "SELECT 1 FROM prayer_times_years WHERE lat = ? AND lng = ? AND year = ?",
+            key,
+        )
+        if await cursor.fetchone() is None:
+            return False
+        self._prayer_years.add(key)
+        return True
+
+    async def get_local_prayer_years(self) -> list[dict]:
+        """Годы, закэшированные из локального расчёта (кандидаты на замену данными API)."""
+        cursor = await self._conn.execute(
+            "SELECT y.lat, y.lng, y.year, "
+            "(SELECT c.city_name FROM prayer_times_cache c "
+            " WHERE c.lat = y.lat AND c.lng = y.lng LIMIT 1) as city_name "
+            "FROM prayer_times_years y WHERE y.source = 'local'"
+        )
+        return [dict(row) for row in await cursor.fetchall()]
+
+    async def get_cache_generation(self, name: str) -> int:
+        """Поколение кэша name (0 — ещё не сбрасывался)."""
+        cursor = await self._conn.execute(
+            "SELECT generation FROM cache_generations WHERE name = ?", (name,)
         )
         row = await cursor.fetchone()
-        return row["cnt"] > 0
+        return row[0] if row else 0
+
+    async def bump_cache_generation(self, name: str) -> int:
+        """Сбросить кэш name во всех процессах: новое поколение."""
+        cursor = await self._conn.execute(
+            "INSERT INTO cache_generations (name, generation) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET generation = generation + 1 "
+            "RETURNING generation",
+            (name,),
+        )
+        row = await cursor.fetchone()
+        await self._conn.commit()
+        return row[0]
+
+    # ──────────────────── Muftyat Cities ────────────────────
+
+    async def get_muftyat_cities(self) -> list[dict]:
+        """Сохранённый список городов muftyat.kz (для core.cities.CityIndex)."""
+        cursor = await self._conn.execute("SELECT id, name, lat, lng FROM muftyat_cities")
+        return [dict(row) for row in await cursor.fetchall()]
+
+    async def get_muftyat_cities_updated_at(self) -> float:
+        """Unix-время последней выгрузки списка городов (0 — не выгружался)."""
+        cursor = await self._conn.execute(
+            "SELECT CAST(strftime('%s', MAX(updated_at)) AS REAL) FROM muftyat_cities"
+        )
+        row = await cursor.fetchone()
+        return row[0] or 0.0
+
+    async def save_muftyat_cities(self, cities: list[dict]):
+        """Заменить список городов одной транзакцией."""
+        await self._conn.execute("DELETE FROM muftyat_cities")
+        await self._conn.executemany(
+            "INSERT OR REPLACE INTO muftyat_cities (id, name, lat, lng) VALUES (?, ?, ?, ?)",
+            [(c["id"], c["name"], c["lat"], c["lng"]) for c in cities],
+        )
+        await self._conn.commit()
+
+    # ──────────────────── FSM Storage ────────────────────
+
+    async def get_fsm_record(self, key: str) -> Optional[dict]:
+        """Состояние и данные FSM по ключу (bot.storage.SQLiteStorage)."""
+        cursor = await self._conn.execute(
+            "SELECT state, data FROM fsm_storage WHERE key = ?", (key,)
+        )
+        row = await cursor.fetchone()
+        return dict(row) if row else None
+
+    async def save_fsm_records(self, upserts: list[tuple[str, str, str]], deletes: list[str]):
+        """Пачка изменений FSM: [(key, state, data_json)] и ключи к удалению."""
+        if upserts:
+            await self._conn.executemany(
+                "INSERT INTO fsm_storage (key, state, data) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET state = excluded.state, data = excluded.data, "
+                "updated_at = CURRENT_TIMESTAMP",
+                upserts,
+            )
+        if deletes:
+            await self._conn.executemany(
+                "DELETE FROM fsm_storage WHERE key = ?", [(k,) for k in deletes]
+            )
+        await self._conn.commit()
+
+    # ──────────────────────── Metrics ────────────────────────
+
+    async def save_metrics_snapshot(self, process: str, data: str):
+        """Снимок метрик процесса (core.metrics); снимки давно остановленных процессов удаляются."""
+        await self._conn.execute(
+            "INSERT INTO metrics_snapshots (process, data) VALUES (?, ?) "
+            "ON CONFLICT(process) DO UPDATE SET data = excluded.data, updated_at = CURRENT_TIMESTAMP",
+            (process, data),
+        )
+        await self._conn.execute(
+            "DELETE FROM metrics_snapshots WHERE updated_at < datetime('now', '-1 day')"
+        )
+        await self._conn.commit()
+
+    async def get_metrics_snapshots(self, max_age_seconds: int) -> list[str]:
+        """JSON-снимки процессов, обновлявшихся за последние max_age_seconds."""
+        cursor = await self._conn.execute(
+            "SELECT data FROM metrics_snapshots WHERE updated_at >= datetime('now', ?)",
+            (f"-{int(max_age_seconds)} seconds",),
+        )
+        return [row["data"] for row in await cursor.fetchall()]
+
+    # ──────────────────────── Profiling ────────────────────────
+
+    async def create_profile_request(self, seconds: float, fmt: str) -> int:
+        """Заявка на профиль процесса бота (core.profiler); старые заявки удаляются."""
+        await self._conn.execute(
+            "DELETE FROM profile_requests WHERE created_at < datetime('now', '-7 days')"
+        )
+        cursor = await self._conn.execute(
+            "INSERT INTO profile_requests (seconds, format) VALUES (?, ?)", (seconds, fmt)
+        )
+        await self._conn.commit()
+        return cursor.lastrowid
+
+    async def claim_profile_request(self, process: str) -> Optional[dict]:
+        """Забрать ожидающую заявку (pending → running); одну заявку берёт один процесс."""
+        # Процесс остановился, не закончив профиль
+        await self._conn.execute(
+            "UPDATE profile_requests SET status = 'failed', error = 'Process stopped while profiling', "
+            "finished_at = CURRENT_TIMESTAMP "
+            "WHERE status = 'running' "
+            "AND started_at < datetime('now', '-' || CAST(seconds + 60 AS INTEGER) || ' seconds')"
+        )
+        cursor = await self._conn.execute(
+            "UPDATE profile_requests SET status = 'running', process = ?, started_at = CURRENT_TIMESTAMP "
+            "WHERE id = (SELECT id FROM profile_requests WHERE status = 'pending' ORDER BY id LIMIT 1) "
+            "RETURNING id, seconds, format",
+            (process,),
+        )
+        row = await cursor.fetchone()
+        await self._conn.commit()
+        return dict(row) if row else None
+
+    async def finish_profile_request(self, request_id: int, result: str = None, error: str = None):
+        await self._conn.execute(
+            "UPDATE profile_requests SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP "
+            "WHERE id = ?",
+            ("failed" if error else "done", result, error, request_id),
+        )
+        await self._conn.commit()
+
+    async def get_profile_request(self, request_id: int, with_result: bool = False) -> Optional[dict]:
+        columns = "*" if with_result else (
+            "id, seconds, format, status, process, error, created_at, started_at, finished_at"
+        )
+        cursor = await self._conn.execute(
+            f"SELECT {columns} FROM profile_requests WHERE id = ?", (request_id,)
+        )
+        row = await cursor.fetchone()
+        return dict(row) if row else None
 
     # ──────────────────────── Subscriptions ────────────────────────
 
@@ -350,50 +578,112 @@ class Database:
         return cursor.lastrowid
 
     # ──────────────────────── Statistics ────────────────────────
+    # Счётчики поддерживаются триггерами (database/migrations.py, миграция 4),
+    # поэтому чтение не зависит от размера логов.
 
-    async def get_total_users(self) -> int:
-        cursor = await self._conn.execute("SELECT COUNT(*) as cnt FROM users")
+    async def get_stats_counters(self) -> dict[str, int]:
+        """Все материализованные счётчики одним запросом."""
+        cursor = await self._conn.execute("SELECT name, value FROM stats_counters")
+        return {row["name"]: row["value"] for row in await cursor.fetchall()}
+
+    async def _get_counter(self, name: str) -> int:
+        cursor = await self._conn.execute(
+            "SELECT value FROM stats_counters WHERE name = ?", (name,)
+        )
         row = await cursor.fetchone()
-        return row["cnt"]
+        return row["value"] if row else 0
+
+    async def get_total_users(self) -> int:
+        return await self._get_counter("users_total")
 
     async def get_total_queries(self) -> int:
-        cursor = await self._conn.execute("SELECT COUNT(*) as cnt FROM query_logs")
-        row = await cursor.fetchone()
-        return row["cnt"]
+        return await self._get_counter("queries_total")
 
     async def get_answered_queries(self) -> int:
+        return await self._get_counter("queries_answered")
+
+    async def get_subscribed_users(self) -> int:
+        return await self._get_counter("users_subscribed")
+
+    async def get_stats_rollup(self, period: str = "daily", limit: int = 14) -> list[dict]:
+        """Последние N часов/дней из rollup-таблиц: [{bucket, metric: value, ...}]."""
+        if period == "hourly":
+            table, column = "stats_hourly", "hour"
+        else:
+            table, column = "stats_daily", "day"
         cursor = await self._conn.execute(
-            "SELECT COUNT(*) as cnt FROM query_logs WHERE was_answered = TRUE"
+            f"SELECT {column} AS bucket, metric, value FROM {table} "
+            f"WHERE {column} IN (SELECT DISTINCT {column} FROM {table} "
+            f"ORDER BY {column} DESC LIMIT ?) "
+            f"ORDER BY {column} DESC",
+            (limit,),
         )
-        row = await cursor.fetchone()
-        return row["cnt"]
+        buckets: dict[str, dict] = {}
+        for row in await cursor.fetchall():
+            bucket = buckets.setdefault(row["bucket"], {"bucket": row["bucket"]})
+            bucket[row["metric"]] = row["value"]
+        return list(buckets.values())
+
+    async def refresh_top_lists(self, limit: int = 20):
+        """Пересчитать снимок топ-N вопросов (вызывается фоновой задачей)."""
+        queries = {
+            "unanswered": (
+                "SELECT MIN(query_text) AS text, COUNT(*) AS cnt FROM query_logs "
+                "WHERE was_answered = FALSE "
+                "GROUP BY normalized_text ORDER BY cnt DESC LIMIT ?"
+            ),
+            "questions": (
+                "SELECT matched_question AS text, COUNT(*) AS cnt FROM query_logs "
+                "WHERE was_answered = TRUE AND matched_question IS NOT NULL "
+                "GROUP BY matched_question ORDER BY cnt DESC LIMIT ?"
+            ),
+        }
+        for kind, sql in queries.items():
+            cursor = await self._conn.execute(sql, (limit,))
+            rows = await cursor.fetchall()
+            # Перезапись по (kind, rank) без DELETE всего снимка —
+            # читатели никогда не видят пустую таблицу
+            await self._conn.executemany(
+                "INSERT OR REPLACE INTO stats_top (kind, rank, text, cnt, refreshed_at) "
+                "VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)",
+                [(kind, rank, row["text"], row["cnt"]) for rank, row in enumerate(rows, 1)],
+            )
+            await self._conn.execute(
+                "DELETE FROM stats_top WHERE kind = ? AND rank > ?", (kind, len(rows))
+            )
+        await self._conn.commit()
 
-    async def get_subscribed_users(self) -> int:
+    async def _get_top(self, kind: str, limit: int) -> list[tuple[str, int]]:
         cursor = await self._conn.execute(
-            "SELECT COUNT(*) as cnt FROM users WHERE is_subscribed = TRUE"
+            "SELECT text, cnt FROM stats_top WHERE kind = ? ORDER BY rank LIMIT ?",
+            (kind, limit),
         )
-        row = await cursor.fetchone()
-        return row["cnt"]
+        rows = await cursor.fetchall()
+        if not rows:
+            # Снимок ещё не построен (первый запуск) — строим сразу
+            cursor = await self._conn.execute("SELECT 1 FROM stats_top LIMIT 1")
+            if await cursor.fetchone() is None:
+                await self.refresh_top_lists()
+                cursor = await self._conn.execute(
+                    "SELECT text, cnt FROM stats_top WHERE kind = ? ORDER BY rank LIMIT ?",
+                    (kind, limit),
+                )
+                rows = await cursor.fetchall()
+        return [(row["text"], row["cnt"]) for row in rows]
 
     async def get_top_unanswered(self, limit: int = 10) -> list:
         """Топ неотвеченных вопросов (для пополнения базы)."""
-        cursor = await self._conn.execute(
-            "SELECT query_text, COUNT(*) as cnt FROM query_logs "
-            "WHERE was_answered = FALSE "
-            "GROUP BY normalized_text ORDER BY cnt DESC LIMIT ?",
-            (limit,),
-        )
-        return [dict(row) for row in await cursor.fetchall()]
+        return [
+            {"query_text": text, "cnt": cnt}
+            for text, cnt in await self._get_top("unanswered", limit)
+        ]
 
     async def get_top_questions(self, limit: int = 10) -> list:
         """Топ популярных вопросов."""
-        cursor = await self._conn.execute(
-            "SELECT matched_question, COUNT(*) as cnt FROM query_logs "
-            "WHERE was_answered = TRUE AND matched_question IS NOT NULL "
-            "GROUP BY matched_question ORDER BY cnt DESC LIMIT ?",
-            (limit,),
-        )
-        return [dict(row) for row in await cursor.fetchall()]
+        return [
+            {"matched_question": text, "cnt": cnt}
+            for text, cnt in await self._get_top("questions", limit)
+        ]
 
     # ──────────────────────── Conversation History ────────────────────────
 
@@ -585,17 +875,12 @@ class Database:
 
     async def get_consultation_stats(self) -> dict:
         """Статистика консультаций."""
-        stats = {}
-        for status in ("pending", "in_progress", "answered"):
-            cursor = await self._conn.execute(
-                "SELECT COUNT(*) as cnt FROM consultations WHERE status = ?",
-                (status,),
-            )
-            row = await cursor.fetchone()
-            stats[status] = row["cnt"]
-        cursor = await self._conn.execute("SELECT COUNT(*) as cnt FROM consultations")
-        row = await cursor.fetchone()
-        stats["total"] = row["cnt"]
+        counters = await self.get_stats_counters()
+        stats = {
+            status: counters.get(f"consultations:{status}", 0)
+            for status in ("pending", "in_progress", "answered")
+        }
+        stats["total"] = counters.get("consultations_total", 0)
         return stats
 
     # ──────────────────────── Ustaz Usage (Monthly Limits) ────────────────────────
@@ -748,17 +1033,12 @@ class Database:
 
     async def get_ticket_stats(self) -> dict:
         """Статистика тикетов модератора."""
-        stats = {}
-        for status in ("pending", "answered"):
-            cursor = await self._conn.execute(
-                "SELECT COUNT(*) as cnt FROM moderator_tickets WHERE status = ?",
-                (status,),
-            )
-            row = await cursor.fetchone()
-            stats[status] = row["cnt"]
-        cursor = await self._conn.execute("SELECT COUNT(*) as cnt FROM moderator_tickets")
-        row = await cursor.fetchone()
-        stats["total"] = row["cnt"]
+        counters = await self.get_stats_counters()
+        stats = {
+            status: counters.get(f"tickets:{status}", 0)
+            for status in ("pending", "answered")
+        }
+        stats["total"] = counters.get("tickets_total", 0)
         return stats
 
     # ──────────────────────── Kaspi Payments ────────────────────────
@@ -884,3 +1164,141 @@ class Database:
         )
         await self._conn.commit()
         logger.info(f"Kaspi payment #{payment_id} rejected by {admin_username}")
+
+    # ──────────────────────── Delivery Outbox ────────────────────────
+
+    async def create_delivery_job(self, kind: str, text: str = None) -> int:
+        """Создать задание рассылки. text — общий текст для всех получателей."""
+        cursor = await self._conn.execute(
+            "INSERT INTO delivery_jobs (kind, text) VALUES (?, ?)", (kind, text)
+        )
+        await self._conn.commit()
+        return cursor.lastrowid
+
+    async def enqueue_outbox(
+        self,
+        job_id: int,
+        items: list[tuple[int, Optional[str], Optional[str]]],
+        priority: int = 10,
+        expires_at: datetime = None,
+    ) -> int:
+        """
+        Поставить сообщения в очередь: items = [(chat_id, text | None, dedup_key | None)].
+        Повторы по dedup_key игнорируются. Возвращает число добавленных.
+        """
+        expires = (
+            expires_at.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            if expires_at else None
+        )
+        cursor = await self._conn.executemany(
+            "INSERT OR IGNORE INTO outbox "
+            "(job_id, chat_id, text, dedup_key, priority, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(job_id, chat_id, text, key, priority, expires) for chat_id, text, key in items],
+        )
+        added = max(cursor.rowcount, 0)
+        await self._conn.execute(
+            "UPDATE delivery_jobs SET total = total + ? WHERE id = ?", (added, job_id)
+        )
+        await self._conn.commit()
+        return added
+
+    async def claim_outbox(self, limit: int) -> list[dict]:
+        """Забрать готовые к отправке сообщения (pending → sending) по приоритету."""
+        cursor = await self._conn.execute(
+            "SELECT o.id, o.job_id, o.chat_id, COALESCE(o.text, j.text) as text, o.attempts, "
+            "COALESCE(u.delivery_status, 'ok') as delivery_status, "
+            "(u.delivery_retry_at IS NULL OR u.delivery_retry_at <= CURRENT_TIMESTAMP) as reachable "
+            "FROM outbox o JOIN delivery_jobs j ON j.id = o.job_id "
+            "LEFT JOIN users u ON u.telegram_id = o.chat_id "
+            "WHERE o.status = 'pending' "
+            "AND (o.not_before IS NULL OR o.not_before <= CURRENT_TIMESTAMP) "
+            "AND (o.expires_at IS NULL OR o.expires_at > CURRENT_TIMESTAMP) "
+            "ORDER BY o.priority, o.id LIMIT ?",
+            (limit,),
+        )
+        items = [dict(row) for row in await cursor.fetchall()]
+        if items:
+            await self._conn.executemany(
+                "UPDATE outbox SET status = 'sending', attempts = attempts + 1 WHERE id = ?",
+                [(item["id"],) for item in items],
+            )
+            await self._conn.commit()
+            for item in items:
+                item["attempts"] += 1
+        return items
+
+    async def complete_outbox(
+        self,
+        sent: list[int],
+        failed: list[tuple[str, str, int]],
+        retry: list[tuple[int, str, int]],
+    ):
+        """
+        Записать результаты отправки одной транзакцией:
+        sent = [id], failed = [(status, error, id)], retry = [(delay_sec, error, id)].
+        """
+        if sent:
+            await self._conn.executemany(
+                "UPDATE outbox SET status = 'sent', sent_at = CURRENT_TIMESTAMP, error = NULL "
+                "WHERE id = ?",
+                [(oid,) for oid in sent],
+            )
+        if failed:
+            await self._conn.executemany(
+                "UPDATE outbox SET status = ?, error = ? WHERE id = ?", failed
+            )
+        if retry:
+            await self._conn.executemany(
+                "UPDATE outbox SET status = 'pending', "
+                "not_before = datetime('now', '+' || ? || ' seconds'), error = ? WHERE id = ?",
+                retry,
+            )
+        await self._conn.commit()
+
+    async def release_stuck_outbox(self) -> int:
+        """Вернуть в очередь сообщения, оставшиеся в sending после падения процесса."""
+        cursor = await self._conn.execute(
+            "UPDATE outbox SET status = 'pending' WHERE status = 'sending'"
+        )
+        await self._conn.commit()
+        return cursor.rowcount
+
+    async def expire_outbox(self) -> int:
+        """Пометить просроченные (expires_at прошёл) сообщения."""
+        cursor = await self._conn.execute(
+            "UPDATE outbox SET status = 'expired' "
+            "WHERE status = 'pending' AND expires_at <= CURRENT_TIMESTAMP"
+        )
+        await self._conn.commit()
+        return cursor.rowcount
+
+    async def purge_outbox(self, days: int = 7) -> int:
+        """Удалить завершённые сообщения старше N дней."""
+        cursor = await self._conn.execute(
+            "DELETE FROM outbox WHERE status NOT IN ('pending', 'sending') "
+            "AND created_at < datetime('now', ?)",
+            (f"-{days} days",),
+        )
+        await self._conn.commit()
+        return cursor.rowcount
+
+    async def get_delivery_job(self, job_id: int) -> Optional[dict]:
+        """Задание рассылки с разбивкой сообщений по статусам."""
+        cursor = await self._conn.execute(
+            "SELECT id, kind, total, created_at FROM delivery_jobs WHERE id = ?", (job_id,)
+        )
+        row = await cursor.fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        cursor = await self._conn.execute(
+            "SELECT status, COUNT(*) as cnt FROM outbox WHERE job_id = ? GROUP BY status",
+            (job_id,),
+        )
+        job["statuses"] = {r["status"]: r["cnt"] for r in await cursor.fetchall()}
+        return job
+
+
+# Каждый публичный метод — спан db.<метод> (core.tracing)
+instrument_methods(Database, "db", exclude=("connect", "close"))
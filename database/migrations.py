@@ -0,0 +1,565 @@
+"""
+Версионированные миграции схемы SQLite.
+Номер последней применённой миграции хранится в PRAGMA user_version,
+поэтому при старте уже применённые шаги пропускаются одним чтением.
+Каждая миграция выполняется в одной транзакции вместе с записью версии.
+"""
+
+from typing import Awaitable, Callable
+
+import aiosqlite
+from loguru import logger
+
+MigrationFunc = Callable[[aiosqlite.Connection], Awaitable[None]]
+
+# [(version, description, func)] — строго по возрастанию версии
+MIGRATIONS: list[tuple[int, str, MigrationFunc]] = []
+
+
+def migration(version: int, description: str):
+    """Декоратор регистрации миграции."""
+    def decorator(func: MigrationFunc) -> MigrationFunc:
+        if MIGRATIONS and MIGRATIONS[-1][0] >= version:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append((version, description, func))
+        return func
+    return decorator
+
+
+async def _get_columns(conn: aiosqlite.Connection, table: str) -> set[str]:
+    cursor = await conn.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in await cursor.fetchall()}
+
+
+async def _add_columns(
+    conn: aiosqlite.Connection, columns: list[tuple[str, str, str]]
+):
+    """ALTER TABLE ADD COLUMN только для отсутствующих колонок."""
+    existing: dict[str, set[str]] = {}
+    for table, column, col_type in columns:
+        if table not in existing:
+            existing[table] = await _get_columns(conn, table)
+        if column in existing[table]:
+            continue
+        await conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+        existing[table].add(column)
+        logger.info(f"Migration: added {table}.{column}")
+
+
+# ──────────────────────── Миграции ────────────────────────
+
+
+@migration(1, "legacy columns: payments, city, language, onboarding, coordinates")
+async def _m001_legacy_columns(conn: aiosqlite.Connection):
+    await _add_columns(conn, [
+        ("subscriptions", "telegram_payment_charge_id", "TEXT"),
+        ("users", "city", "TEXT DEFAULT NULL"),
+        ("users", "language", "TEXT DEFAULT 'kk'"),
+        ("users", "is_onboarded", "BOOLEAN DEFAULT FALSE"),
+        ("users", "city_lat", "REAL DEFAULT NULL"),
+        ("users", "city_lng", "REAL DEFAULT NULL"),
+    ])
+
+
+@migration(2, "users.city → city_lat/city_lng")
+async def _m002_city_coordinates(conn: aiosqlite.Connection):
+    from core.cities import CITY_COORDINATES
+
+    cursor = await conn.execute(
+        "SELECT telegram_id, city FROM users WHERE city IS NOT NULL AND city_lat IS NULL"
+    )
+    params = []
+    for telegram_id, city in await cursor.fetchall():
+        coords = CITY_COORDINATES.get(city)
+        if coords:
+            params.append((coords[0], coords[1], telegram_id))
+    if params:
+        await conn.executemany(
+            "UPDATE users SET city_lat = ?, city_lng = ? WHERE telegram_id = ?",
+            params,
+        )
+        logger.info(f"Migrated {len(params)} users with city coordinates")
+
+
+@migration(3, "covering indexes for logs, reminder groups, conversation history")
+async def _m003_covering_indexes(conn: aiosqlite.Connection):
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_query_logs_answered_normalized "
+        "ON query_logs(was_answered, normalized_text)"
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_onboarded_coords "
+        "ON users(is_onboarded, city_lat, city_lng)"
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_conversation_history_user_id "
+        "ON conversation_history(user_telegram_id, id)"
+    )
+    # Перекрывается индексом (user_telegram_id, id)
+    await conn.execute("DROP INDEX IF EXISTS idx_conversation_history_user")
+
+
+def _bump(table: str, key_cols: str, key_values: str, delta: str) -> str:
+    """UPSERT-инкремент счётчика (для тела триггера)."""
+    return (
+        f"INSERT INTO {table} ({key_cols}, value) VALUES ({key_values}, {delta}) "
+        f"ON CONFLICT({key_cols}) DO UPDATE SET value = value + excluded.value;"
+    )
+
+
+def _counter(name: str, delta: str) -> str:
+    return _bump("stats_counters", "name", name, delta)
+
+
+def _rollup(metric: str, created_at: str, delta: str) -> str:
+    return (
+        _bump("stats_hourly", "hour, metric",
+              f"strftime('%Y-%m-%d %H:00', {created_at}), '{metric}'", delta)
+        + "\n"
+        + _bump("stats_daily", "day, metric", f"date({created_at}), '{metric}'", delta)
+    )
+
+
+STATS_TRIGGERS = {
+    "trg_stats_users_insert": (
+        "AFTER INSERT ON users",
+        [
+            _counter("'users_total'", "1"),
+            _counter("'users_subscribed'", "IFNULL(NEW.is_subscribed, 0) = 1"),
+            _rollup("new_users", "NEW.created_at", "1"),
+        ],
+    ),
+    "trg_stats_users_delete": (
+        "AFTER DELETE ON users",
+        [
+            _counter("'users_total'", "-1"),
+            _counter("'users_subscribed'", "-(IFNULL(OLD.is_subscribed, 0) = 1)"),
+        ],
+    ),
+    "trg_stats_users_subscription": (
+        "AFTER UPDATE OF is_subscribed ON users "
+        "WHEN (IFNULL(OLD.is_subscribed, 0) = 1) != (IFNULL(NEW.is_subscribed, 0) = 1)",
+        [
+            _counter("'users_subscribed'", "CASE WHEN NEW.is_subscribed = 1 THEN 1 ELSE -1 END"),
+        ],
+    ),
+    "trg_stats_query_logs_insert": (
+        "AFTER INSERT ON query_logs",
+        [
+            _counter("'queries_total'", "1"),
+            _counter("'queries_answered'", "IFNULL(NEW.was_answered, 0) = 1"),
+            _rollup("queries", "NEW.created_at", "1"),
+            _rollup("answered", "NEW.created_at", "IFNULL(NEW.was_answered, 0) = 1"),
+        ],
+    ),
+    "trg_stats_query_logs_delete": (
+        "AFTER DELETE ON query_logs",
+        [
+            _counter("'queries_total'", "-1"),
+            _counter("'queries_answered'", "-(IFNULL(OLD.was_answered, 0) = 1)"),
+        ],
+    ),
+}
+
+for _table, _prefix in (("consultations", "consultations"), ("moderator_tickets", "tickets")):
+    STATS_TRIGGERS[f"trg_stats_{_prefix}_insert"] = (
+        f"AFTER INSERT ON {_table}",
+        [
+            _counter(f"'{_prefix}_total'", "1"),
+            _counter(f"'{_prefix}:' || NEW.status", "1"),
+            _rollup(_prefix, "NEW.created_at", "1"),
+        ],
+    )
+    STATS_TRIGGERS[f"trg_stats_{_prefix}_status"] = (
+        f"AFTER UPDATE OF status ON {_table} WHEN OLD.status IS NOT NEW.status",
+        [
+            _counter(f"'{_prefix}:' || OLD.status", "-1"),
+            _counter(f"'{_prefix}:' || NEW.status", "1"),
+        ],
+    )
+    STATS_TRIGGERS[f"trg_stats_{_prefix}_delete"] = (
+        f"AFTER DELETE ON {_table}",
+        [
+            _counter(f"'{_prefix}_total'", "-1"),
+            _counter(f"'{_prefix}:' || OLD.status", "-1"),
+        ],
+    )
+
+
+@migration(4, "materialized statistics: counters, hourly/daily rollups, top-N snapshot")
+async def _m004_stats_counters(conn: aiosqlite.Connection):
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS stats_counters ("
+        "name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)"
+    )
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS stats_hourly ("
+        "hour TEXT NOT NULL, metric TEXT NOT NULL, value INTEGER NOT NULL DEFAULT 0, "
+        "PRIMARY KEY (hour, metric))"
+    )
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS stats_daily ("
+        "day TEXT NOT NULL, metric TEXT NOT NULL, value INTEGER NOT NULL DEFAULT 0, "
+        "PRIMARY KEY (day, metric))"
+    )
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS stats_top ("
+        "kind TEXT NOT NULL, rank INTEGER NOT NULL, text TEXT, cnt INTEGER NOT NULL, "
+        "refreshed_at DATETIME DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (kind, rank))"
+    )
+
+    # Начальные значения — один раз по существующим данным
+    await conn.execute("DELETE FROM stats_counters")
+    await conn.execute(
+        "INSERT INTO stats_counters (name, value) "
+        "SELECT 'users_total', COUNT(*) FROM users UNION ALL "
+        "SELECT 'users_subscribed', COUNT(*) FROM users WHERE is_subscribed = TRUE UNION ALL "
+        "SELECT 'queries_total', COUNT(*) FROM query_logs UNION ALL "
+        "SELECT 'queries_answered', COUNT(*) FROM query_logs WHERE was_answered = TRUE UNION ALL "
+        "SELECT 'consultations_total', COUNT(*) FROM consultations UNION ALL "
+        "SELECT 'tickets_total', COUNT(*) FROM moderator_tickets"
+    )
+    await conn.execute(
+        "INSERT INTO stats_counters (name, value) "
+        "SELECT 'consultations:' || status, COUNT(*) FROM consultations GROUP BY status"
+    )
+    await conn.execute(
+        "INSERT INTO stats_counters (name, value) "
+        "SELECT 'tickets:' || status, COUNT(*) FROM moderator_tickets GROUP BY status"
+    )
+
+    await conn.execute("DELETE FROM stats_hourly")
+    await conn.execute("DELETE FROM stats_daily")
+    rollup_sources = [
+        ("new_users", "users", "1"),
+        ("queries", "query_logs", "1"),
+        ("answered", "query_logs", "was_answered = TRUE"),
+        ("consultations", "consultations", "1"),
+        ("tickets", "moderator_tickets", "1"),
+    ]
+    for metric, table, condition in rollup_sources:
+        await conn.execute(
+            "INSERT INTO stats_hourly (hour, metric, value) "
+            f"SELECT strftime('%Y-%m-%d %H:00', created_at), '{metric}', COUNT(*) "
+            f"FROM {table} WHERE {condition} AND created_at IS NOT NULL GROUP BY 1"
+        )
+        await conn.execute(
+            "INSERT INTO stats_daily (day, metric, value) "
+            f"SELECT date(created_at), '{metric}', COUNT(*) "
+            f"FROM {table} WHERE {condition} AND created_at IS NOT NULL GROUP BY 1"
+        )
+
+    for name, (event, statements) in STATS_TRIGGERS.items():
+        await conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        await conn.execute(
+            f"CREATE TRIGGER {name} {event} BEGIN\n" + "\n".join(statements) + "\nEND"
+        )
+
+
+@migration(5, "keyset pagination indexes, FTS5 index over users")
+async def _m005_keyset_and_users_fts(conn: aiosqlite.Connection):
+    indexes = {
+        "idx_users_created_id": "users(created_at, id)",
+        "idx_users_subscribed_created_id": "users(is_subscribed, created_at, id)",
+        "idx_query_logs_created_id": "query_logs(created_at, id)",
+        "idx_query_logs_answered_created_id": "query_logs(was_answered, created_at, id)",
+        "idx_consultations_created_id": "consultations(created_at, id)",
+        "idx_consultations_status_created_id": "consultations(status, created_at, id)",
+        "idx_moderator_tickets_created_id": "moderator_tickets(created_at, id)",
+        "idx_moderator_tickets_status_created_id": "moderator_tickets(status, created_at, id)",
+    }
+    for name, target in indexes.items():
+        await conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    # Перекрывается индексом (created_at, id)
+    await conn.execute("DROP INDEX IF EXISTS idx_query_logs_created")
+
+    await conn.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+        "username, first_name, content='users', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    await conn.execute("DROP TRIGGER IF EXISTS trg_users_fts_insert")
+    await conn.execute(
+        "CREATE TRIGGER trg_users_fts_insert AFTER INSERT ON users BEGIN "
+        "INSERT INTO users_fts (rowid, username, first_name) "
+        "VALUES (NEW.id, NEW.username, NEW.first_name); END"
+    )
+    await conn.execute("DROP TRIGGER IF EXISTS trg_users_fts_delete")
+    await conn.execute(
+        "CREATE TRIGGER trg_users_fts_delete AFTER DELETE ON users BEGIN "
+        "INSERT INTO users_fts (users_fts, rowid, username, first_name) "
+        "VALUES ('delete', OLD.id, OLD.username, OLD.first_name); END"
+    )
+    await conn.execute("DROP TRIGGER IF EXISTS trg_users_fts_update")
+    await conn.execute(
+        "CREATE TRIGGER trg_users_fts_update AFTER UPDATE OF username, first_name ON users BEGIN "
+        "INSERT INTO users_fts (users_fts, rowid, username, first_name) "
+        "VALUES ('delete', OLD.id, OLD.username, OLD.first_name); "
+        "INSERT INTO users_fts (rowid, username, first_name) "
+        "VALUES (NEW.id, NEW.username, NEW.first_name); END"
+    )
+    await conn.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+
+
+@migration(6, "FTS5 index over query logs")
+async def _m006_query_logs_fts(conn: aiosqlite.Connection):
+    await conn.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS query_logs_fts USING fts5("
+        "query_text, answer_text, content='query_logs', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='3')"
+    )
+    await conn.execute("DROP TRIGGER IF EXISTS trg_query_logs_fts_insert")
+    await conn.execute(
+        "CREATE TRIGGER trg_query_logs_fts_insert AFTER INSERT ON query_logs BEGIN "
+        "INSERT INTO query_logs_fts (rowid, query_text, answer_text) "
+        "VALUES (NEW.id, NEW.query_text, NEW.answer_text); END"
+    )
+    await conn.execute("DROP TRIGGER IF EXISTS trg_query_logs_fts_delete")
+    await conn.execute(
+        "CREATE TRIGGER trg_query_logs_fts_delete AFTER DELETE ON query_logs BEGIN "
+        "INSERT INTO query_logs_fts (query_logs_fts, rowid, query_text, answer_text) "
+        "VALUES ('delete', OLD.id, OLD.query_text, OLD.answer_text); END"
+    )
+    await conn.execute("DROP TRIGGER IF EXISTS trg_query_logs_fts_update")
+    await conn.execute(
+        "CREATE TRIGGER trg_query_logs_fts_update AFTER UPDATE OF query_text, answer_text ON query_logs BEGIN "
+        "INSERT INTO query_logs_fts (query_logs_fts, rowid, query_text, answer_text) "
+        "VALUES ('delete', OLD.id, OLD.query_text, OLD.answer_text); "
+        "INSERT INTO query_logs_fts (rowid, query_text, answer_text) "
+        "VALUES (NEW.id, NEW.query_text, NEW.answer_text); END"
+    )
+    await conn.execute("INSERT INTO query_logs_fts (query_logs_fts) VALUES ('rebuild')")
+
+
+@migration(7, "presence table for cached prayer-time years")
+async def _m007_prayer_times_years(conn: aiosqlite.Connection):
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS prayer_times_years ("
+        "lat REAL NOT NULL, lng REAL NOT NULL, year INTEGER NOT NULL, "
+        "days INTEGER NOT NULL DEFAULT 0, "
+        "cached_at DATETIME DEFAULT CURRENT_TIMESTAMP, "
+        "PRIMARY KEY (lat, lng, year)) WITHOUT ROWID"
+    )
+    await conn.execute(
+        "INSERT OR REPLACE INTO prayer_times_years (lat, lng, year, days) "
+        "SELECT lat, lng, CAST(SUBSTR(date, 1, 4) AS INTEGER), COUNT(*) "
+        "FROM prayer_times_cache WHERE date GLOB '[0-9][0-9][0-9][0-9]-*' "
+        "GROUP BY lat, lng, SUBSTR(date, 1, 4)"
+    )
+
+
+@migration(8, "delivery outbox")
+async def _m008_delivery_outbox(conn: aiosqlite.Connection):
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS delivery_jobs ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "kind TEXT NOT NULL, "
+        "text TEXT, "
+        "total INTEGER DEFAULT 0, "
+        "created_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+    )
+    # text = NULL → берётся из delivery_jobs.text (рассылка одного текста всем)
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS outbox ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "job_id INTEGER NOT NULL, "
+        "chat_id BIGINT NOT NULL, "
+        "text TEXT, "
+        "priority INTEGER DEFAULT 10, "
+        "status TEXT DEFAULT 'pending', "
+        "attempts INTEGER DEFAULT 0, "
+        "not_before DATETIME, "
+        "expires_at DATETIME, "
+        "dedup_key TEXT UNIQUE, "
+        "error TEXT, "
+        "created_at DATETIME DEFAULT CURRENT_TIMESTAMP, "
+        "sent_at DATETIME)"
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_dispatch ON outbox(status, priority, id)"
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_job_status ON outbox(job_id, status)"
+    )
+
+
+@migration(9, "delivery reachability state on users")
+async def _m009_users_delivery_state(conn: aiosqlite.Connection):
+    await _add_columns(conn, [
+        ("users", "delivery_status", "TEXT DEFAULT 'ok'"),
+        ("users", "delivery_failures", "INTEGER DEFAULT 0"),
+        ("users", "delivery_retry_at", "DATETIME DEFAULT NULL"),
+    ])
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_delivery_status ON users(delivery_status)"
+    )
+
+
+@migration(10, "audience index for keyset recipient streaming")
+async def _m010_audience_index(conn: aiosqlite.Connection):
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_audience "
+        "ON users(is_onboarded, city_lat, city_lng, telegram_id)"
+    )
+    # Префикс нового индекса
+    await conn.execute("DROP INDEX IF EXISTS idx_users_onboarded_coords")
+
+
+@migration(11, "source of cached prayer-time years (api / local)")
+async def _m011_prayer_times_source(conn: aiosqlite.Connection):
+    await _add_columns(conn, [
+        ("prayer_times_years", "source", "TEXT DEFAULT 'api'"),
+    ])
+
+
+@migration(12, "snap coordinates to the geo grid, merge prayer-time cache")
+async def _m012_geo_buckets(conn: aiosqlite.Connection):
+    from core.geo import snap_coords
+
+    cursor = await conn.execute(
+        "SELECT DISTINCT city_lat, city_lng FROM users "
+        "WHERE city_lat IS NOT NULL AND city_lng IS NOT NULL"
+    )
+    params = []
+    for lat, lng in await cursor.fetchall():
+        snapped = snap_coords(lat, lng)
+        if snapped != (lat, lng):
+            params.append((*snapped, lat, lng))
+    if params:
+        await conn.executemany(
+            "UPDATE users SET city_lat = ?, city_lng = ? WHERE city_lat = ? AND city_lng = ?",
+            params,
+        )
+        logger.info(f"Migration: snapped {len(params)} user coordinate pairs to the grid")
+
+    # Кэш: данные API переносятся первыми, дубликаты ячейки удаляются
+    cursor = await conn.execute(
+        "SELECT lat, lng, MIN(source = 'local') FROM prayer_times_years "
+        "GROUP BY lat, lng ORDER BY 3"
+    )
+    merged = 0
+    for lat, lng, _ in await cursor.fetchall():
+        snapped = snap_coords(lat, lng)
+        if snapped == (lat, lng):
+            continue
+        for table in ("prayer_times_cache", "prayer_times_years"):
+            await conn.execute(
+                f"UPDATE OR IGNORE {table} SET lat = ?, lng = ? WHERE lat = ? AND lng = ?",
+                (*snapped, lat, lng),
+            )
+            await conn.execute(f"DELETE FROM {table} WHERE lat = ? AND lng = ?", (lat, lng))
+        merged += 1
+    if merged:
+        logger.info(f"Migration: merged prayer-time cache of {merged} coordinate pairs")
+
+
+@migration(13, "persistent city index from muftyat.kz")
+async def _m013_muftyat_cities(conn: aiosqlite.Connection):
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS muftyat_cities ("
+        "id INTEGER PRIMARY KEY, "
+        "name TEXT NOT NULL, "
+        "lat REAL NOT NULL, "
+        "lng REAL NOT NULL, "
+        "updated_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+
+@migration(14, "aiogram FSM storage")
+async def _m014_fsm_storage(conn: aiosqlite.Connection):
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS fsm_storage ("
+        "key TEXT PRIMARY KEY, "
+        "state TEXT, "
+        "data TEXT NOT NULL DEFAULT '{}', "
+        "updated_at DATETIME DEFAULT CURRENT_TIMESTAMP"
+        ") WITHOUT ROWID"
+    )
+
+
+@migration(15, "per-process metrics snapshots for /metrics")
+async def _m015_metrics_snapshots(conn: aiosqlite.Connection):
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS metrics_snapshots ("
+        "process TEXT PRIMARY KEY, "
+        "data TEXT NOT NULL, "
+        "updated_at DATETIME DEFAULT CURRENT_TIMESTAMP"
+        ") WITHOUT ROWID"
+    )
+
+
+@migration(16, "on-demand profile requests from the web admin")
+async def _m016_profile_requests(conn: aiosqlite.Connection):
+    # status: pending → running → done / failed; result — файл профиля (текст)
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS profile_requests ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "seconds REAL NOT NULL, "
+        "format TEXT NOT NULL, "
+        "status TEXT NOT NULL DEFAULT 'pending', "
+        "process TEXT, "
+        "result TEXT, "
+        "error TEXT, "
+        "created_at DATETIME DEFAULT CURRENT_TIMESTAMP, "
+        "started_at DATETIME, "
+        "finished_at DATETIME"
+        ")"
+    )
+
+
+@migration(17, "keyset index for the whole broadcast audience")
+async def _m017_audience_keyset_index(conn: aiosqlite.Connection):
+    # Рассылки без координат: без этого индекса (и без ANALYZE) планировщик берёт
+    # idx_users_audience по префиксу is_onboarded и сортирует всех onboarded
+    # во временном B-дереве на каждом чанке — поток становится квадратичным
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_onboarded_id ON users(is_onboarded, telegram_id)"
+    )
+
+
+@migration(18, "cache generations shared between processes")
+async def _m018_cache_generations(conn: aiosqlite.Connection):
+    # Кэши в памяти у каждого процесса свои (run_cluster.py): процесс, изменивший
+    # данные, увеличивает поколение, остальные сравнивают его со своим и сбрасывают кэш
+    await conn.execute(
+        "CREATE TABLE IF NOT EXISTS cache_generations ("
+        "name TEXT PRIMARY KEY, "
+        "generation INTEGER NOT NULL DEFAULT 0"
+        ") WITHOUT ROWID"
+    )
+
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ──────────────────────── Запуск ────────────────────────
+
+
+async def get_schema_version(conn: aiosqlite.Connection) -> int:
+    cursor = await conn.execute("PRAGMA user_version")
+    row = await cursor.fetchone()
+    return row[0]
+
+
+async def run_migrations(conn: aiosqlite.Connection) -> int:
+    """Применить недостающие миграции. Возвращает текущую версию схемы."""
+    current = await get_schema_version(conn)
+    if current >= LATEST_VERSION:
+        return current
+
+    for version, description, func in MIGRATIONS:
+        if version <= current:
+            continue
+        await conn.execute("BEGIN")
+        try:
+            await func(conn)
+            await conn.execute(f"PRAGMA user_version = {version}")
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            logger.error(f"Migration {version} failed: {description}")
+            raise
+        logger.info(f"Migration {version} applied: {description}")
+        current = version
+
+    return current
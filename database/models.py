@@ -133,9 +133,7 @@ CREATE TABLE IF NOT EXISTS prayer_times_cache (
 
 CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_query_logs_user ON query_logs(user_telegram_id);
-CREATE INDEX IF NOT EXISTS idx_query_logs_created ON query_logs(created_at);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscriptions(user_telegram_id);
-CREATE INDEX IF NOT EXISTS idx_conversation_history_user ON conversation_history(user_telegram_id);
 CREATE INDEX IF NOT EXISTS idx_ustaz_profiles_telegram_id ON ustaz_profiles(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_consultations_status ON consultations(status);
 CREATE INDEX IF NOT EXISTS idx_consultations_user ON consultations(user_telegram_id);
@@ -5,193 +5,118 @@
 import asyncio
 import sys
 import os
-from datetime import datetime, timedelta
+from typing import Awaitable, Callable
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.base import BaseSession
 from aiogram.enums import ParseMode
 from aiogram.types import BotCommand
-from aiogram.fsm.storage.memory import MemoryStorage
 from loguru import logger
 
-from config import BOT_TOKEN, LOG_PATH, OPENAI_API_KEY, MODERATOR_BOT_TOKEN, USTAZ_BOT_TOKEN
+from config import BOT_TOKEN, LOG_PATH, TRACE_LOG_PATH, OPENAI_API_KEY, MODERATOR_BOT_TOKEN, USTAZ_BOT_TOKEN
 from database.db import Database
+from bot.storage import create_fsm_storage
 from core.search_engine import SearchEngine
 from core.ai_engine import AIEngine
 from core.knowledge_loader import load_all_knowledge
 from core.muftyat_api import MuftyatAPI
-from core.ramadan_calendar import is_ramadan, get_ramadan_day_number, ensure_prayer_times, RAMADAN_START, RAMADAN_END
-from core.messages import get_msg
-from core.daily_tips import DAILY_TIPS
+from core.calendar_render import calendar_warm_task
+from core.cities import city_index_task
+from core.delivery import DeliveryEngine
+from core.reminders import ramadan_reminder_task
+from core.stats import stats_refresh_task
+from core.metrics import metrics_flush_task
+from core.profiler import profile_request_task, slow_callback_task
 from bot.handlers import user, admin, subscription
 from bot.handlers import consultation, calendar, moderator_request
 from bot.handlers import onboarding, kaspi_payment
-from bot.middlewares.rate_limit import RateLimitMiddleware
-from bot.middlewares.subscription_check import SubscriptionCheckMiddleware
+from bot.middlewares.user_context import UserContextMiddleware
+from bot.middlewares.tracing import TelegramTracing, TracedMiddleware, TracingMiddleware
 
 
-def setup_logging():
-    """Настройка логирования с ротацией."""
+def setup_logging(process_name: str = None):
+    """Настройка логирования с ротацией; process_name — отдельный файл на процесс (run_cluster.py)."""
     os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+    log_path = LOG_PATH
+    if process_name:
+        base, ext = os.path.splitext(LOG_PATH)
+        log_path = f"{base}.{process_name}{ext}"
     logger.remove()
-    logger.add(sys.stderr, level="INFO")
+    logger.add(sys.stderr, level="INFO", filter=_not_trace)
     logger.add(
-        LOG_PATH,
+        log_path,
         rotation="10 MB",
         retention="30 days",
         compression="zip",
         level="DEBUG",
         encoding="utf-8",
+        filter=_not_trace,
     )
+    if TRACE_LOG_PATH:
+        trace_path = TRACE_LOG_PATH
+        if process_name:
+            base, ext = os.path.splitext(TRACE_LOG_PATH)
+            trace_path = f"{base}.{process_name}{ext}"
+        # JSON-строки трассировки апдейтов (core.tracing) — отдельным файлом
+        logger.add(
+            trace_path,
+            format="{message}",
+            filter=lambda record: "trace" in record["extra"],
+            rotation="50 MB",
+            retention="7 days",
+            encoding="utf-8",
+        )
 
 
-async def ramadan_reminder_task(bot: Bot, db: Database, muftyat_api: MuftyatAPI):
-    """Background task: отправка напоминаний за 10 мин до сәресі/ауызашар."""
-    sent_today: set[str] = set()
-    last_reset_date = datetime.now().date()
+def _not_trace(record) -> bool:
+    return "trace" not in record["extra"]
 
-    while True:
-        try:
-            await asyncio.sleep(60)
-
-            now = datetime.now()
-
-            # Reset tracking set at midnight
-            if now.date() != last_reset_date:
-                sent_today.clear()
-                last_reset_date = now.date()
-
-            if not is_ramadan():
-                continue
-
-            # Get distinct coordinate groups
-            groups = await db.get_users_grouped_by_coordinates()
-            if not groups:
-                continue
-
-            today_str = now.strftime("%Y-%m-%d")
-
-            for group in groups:
-                lat = group["city_lat"]
-                lng = group["city_lng"]
-                city = group["city"] or "?"
-
-                # Ensure prayer times are cached
-                await ensure_prayer_times(muftyat_api, db, city, lat, lng)
-
-                # Get today's prayer times
-                cached = await db.get_cached_prayer_times(lat, lng, today_str, today_str)
-                if not cached:
-                    continue
-
-                day_data = cached[0]
-                fajr_str = day_data.get("fajr", "")
-                maghrib_str = day_data.get("maghrib", "")
-
-                if not fajr_str or not maghrib_str:
-                    continue
-
-                # Parse times
-                try:
-                    fajr_time = datetime.strptime(f"{today_str} {fajr_str}", "%Y-%m-%d %H:%M")
-                    maghrib_time = datetime.strptime(f"{today_str} {maghrib_str}", "%Y-%m-%d %H:%M")
-                except ValueError:
-                    continue
-
-                # Check suhoor reminder window: fajr - 10 min to fajr - 9 min
-                suhoor_target = fajr_time - timedelta(minutes=10)
-                should_send_suhoor = suhoor_target <= now < suhoor_target + timedelta(minutes=1)
-
-                # Check iftar reminder window: maghrib - 10 min to maghrib - 9 min
-                iftar_target = maghrib_time - timedelta(minutes=10)
-                should_send_iftar = iftar_target <= now < iftar_target + timedelta(minutes=1)
-
-                if not should_send_suhoor and not should_send_iftar:
-                    continue
-
-                # Get users for this coordinate group
-                users = await db.get_users_by_coordinates(lat, lng)
-
-                for u in users:
-                    tid = u["telegram_id"]
-                    lang = u.get("language", "kk")
-
-                    if should_send_suhoor:
-                        key = f"{today_str}:{tid}:suhoor"
-                        if key not in sent_today:
-                            try:
-                                text = get_msg("suhoor_reminder", lang, city=city, fajr=fajr_str)
-                                await bot.send_message(tid, text, parse_mode=ParseMode.HTML)
-                                sent_today.add(key)
-                            except Exception as e:
-                                logger.debug(f"Suhoor reminder failed for {tid}: {e}")
-
-                    if should_send_iftar:
-                        key = f"{today_str}:{tid}:iftar"
-                        if key not in sent_today:
-                            try:
-                                text = get_msg("iftar_reminder", lang, city=city, maghrib=maghrib_str)
-                                await bot.send_message(tid, text, parse_mode=ParseMode.HTML)
-                                sent_today.add(key)
-                            except Exception as e:
-                                logger.debug(f"Iftar reminder failed for {tid}: {e}")
-
-            # ── Daily tip at 12:00 ──
-            if is_ramadan() and now.hour == 12 and now.minute < 1:
-                day_num = get_ramadan_day_number()
-                if day_num and 1 <= day_num <= len(DAILY_TIPS):
-                    tip = DAILY_TIPS[day_num - 1]
-                    all_users = []
-                    for group in groups:
-                        users = await db.get_users_by_coordinates(group["city_lat"], group["city_lng"])
-                        all_users.extend(users)
-                    # Deduplicate by telegram_id
-                    seen_tids: set[int] = set()
-                    unique_users = []
-                    for u in all_users:
-                        if u["telegram_id"] not in seen_tids:
-                            seen_tids.add(u["telegram_id"])
-                            unique_users.append(u)
-                    sent_count = 0
-                    for u in unique_users:
-                        tid = u["telegram_id"]
-                        key = f"{today_str}:{tid}:daily_tip"
-                        if key not in sent_today:
-                            try:
-                                await bot.send_message(tid, tip, parse_mode=ParseMode.HTML)
-                                sent_today.add(key)
-                                sent_count += 1
-                                if sent_count % 25 == 0:
-                                    await asyncio.sleep(1)
-                            except Exception as e:
-                                logger.debug(f"Daily tip failed for {tid}: {e}")
-                    if sent_count:
-                        logger.info(f"Daily tip #{day_num} sent to {sent_count} users")
 
-        except asyncio.CancelledError:
-            logger.info("Ramadan reminder task cancelled")
-            break
-        except Exception as e:
-            logger.error(f"Ramadan reminder task error: {e}")
-            await asyncio.sleep(60)
+def start_background_tasks(delivery: DeliveryEngine, db: Database, muftyat_api: MuftyatAPI) -> list[asyncio.Task]:
+    """
+    Доставка, напоминания, статистика, прогрев календаря, индекс городов,
+    снимки метрик, детектор медленных колбэков.
+    """
+    # Очередь исходящих сообщений (напоминания, советы, рассылки из веб-админки)
+    tasks = [asyncio.create_task(delivery.run())]
+    logger.info("Delivery engine started")
 
+    # Start Ramadan reminder background task
+    tasks.append(asyncio.create_task(ramadan_reminder_task(delivery, db, muftyat_api)))
+    logger.info("Ramadan reminder task started")
 
-async def main():
-    setup_logging()
-    logger.info("Starting bot...")
+    tasks.append(asyncio.create_task(stats_refresh_task(db)))
+    tasks.append(asyncio.create_task(metrics_flush_task(db)))
+    tasks.append(asyncio.create_task(calendar_warm_task(db, muftyat_api)))
+    tasks.append(asyncio.create_task(city_index_task(db, muftyat_api)))
+    tasks.append(asyncio.create_task(slow_callback_task()))
+    return tasks
+
+
+async def stop_tasks(tasks: list[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
 
-    if not BOT_TOKEN:
-        logger.error("BOT_TOKEN is not set! Check .env file.")
-        sys.exit(1)
 
+async def setup_user_bot(
+    db: Database, background: bool = True, session: BaseSession = None,
+) -> tuple[Bot, Dispatcher, Callable[[], Awaitable[None]]]:
+    """
+    Собрать пользовательского бота: зависимости, роутеры, фоновые задачи.
+    Возвращает (bot, dispatcher, shutdown); используется polling (main), webhook (run_webhook.py)
+    и воркерами run_cluster.py (background=False: фоновые задачи — в процессе-планировщике,
+    индекс городов только перечитывается из SQLite, кэш календаря прогревается свой). session — своя сессия Bot API
+    (scripts/load_test.py подставляет фейковую).
+    """
     if not OPENAI_API_KEY:
         logger.error("OPENAI_API_KEY is not set! Check .env file.")
         sys.exit(1)
 
-    # Инициализация БД
-    db = Database()
-    await db.connect()
-
     # Инициализация API muftyat.kz
     muftyat_api = MuftyatAPI()
     await muftyat_api.init()
@@ -216,9 +141,10 @@ async def main():
     # Создание бота и диспетчера
     bot = Bot(
         token=BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    dp = Dispatcher(storage=create_fsm_storage(db))
 
     # Moderator bot instance для нотификаций
     moderator_bot = None
@@ -238,9 +164,13 @@ async def main():
         )
         logger.info("Ustaz bot connected for notifications")
 
+    delivery = DeliveryEngine(bot, db)
+
     # Регистрация middleware
-    dp.message.middleware(RateLimitMiddleware())
-    dp.message.middleware(SubscriptionCheckMiddleware(db))
+    # Трассировка: апдейт целиком, middleware, запросы Bot API (core.tracing)
+    dp.update.outer_middleware(TracingMiddleware())
+    bot.session.middleware(TelegramTracing())
+    dp.message.middleware(TracedMiddleware(UserContextMiddleware(db)))
 
     # Регистрация роутеров (порядок важен!)
     dp.include_router(onboarding.router)    # Онбординг — ПЕРЕД user
@@ -261,6 +191,7 @@ async def main():
         "moderator_bot": moderator_bot,
         "ustaz_bot": ustaz_bot_notifier,
         "muftyat_api": muftyat_api,
+        "delivery": delivery,
     })
 
     # Устанавливаем меню команд
@@ -273,31 +204,54 @@ async def main():
         BotCommand(command="paysupport", description="Төлем бойынша көмек / Помощь с оплатой"),
     ])
 
+    if background:
+        tasks = start_background_tasks(delivery, db, muftyat_api)
+    else:
+        tasks = [
+            asyncio.create_task(city_index_task(db, muftyat_api, refresh=False)),
+            asyncio.create_task(calendar_warm_task(db, muftyat_api, replace_local=False)),
+            asyncio.create_task(metrics_flush_task(db)),
+            asyncio.create_task(slow_callback_task()),
+        ]
+    # Профиль по заявке из веб-админки снимает процесс, обрабатывающий апдейты
+    tasks.append(asyncio.create_task(profile_request_task(db)))
+
+    async def shutdown():
+        await stop_tasks(tasks)
+        await muftyat_api.close()
+        await bot.session.close()
+        if moderator_bot:
+            await moderator_bot.session.close()
+        if ustaz_bot_notifier:
+            await ustaz_bot_notifier.session.close()
+
+    return bot, dp, shutdown
+
+
+async def main():
+    setup_logging()
+    logger.info("Starting bot...")
+
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN is not set! Check .env file.")
+        sys.exit(1)
+
+    # Инициализация БД
+    db = Database()
+    await db.connect()
+
+    bot, dp, shutdown = await setup_user_bot(db)
     logger.info("Bot is starting polling...")
 
-    # Start Ramadan reminder background task
-    reminder_task = asyncio.create_task(
-        ramadan_reminder_task(bot, db, muftyat_api)
-    )
-    logger.info("Ramadan reminder task started")
+    # Webhook мог остаться от run_webhook.py — polling с ним не работает
+    await bot.delete_webhook(drop_pending_updates=False)
 
     try:
         await dp.start_polling(bot)
     finally:
-        reminder_task.cancel()
-        try:
-            await reminder_task
-        except asyncio.CancelledError:
-            pass
-        await muftyat_api.close()
+        await shutdown()
         await db.close()
-        await bot.session.close()
-        if moderator_bot:
-            await moderator_bot.session.close()
-        if ustaz_bot_notifier:
-            await ustaz_bot_notifier.session.close()
         logger.info("Bot stopped")
 
-
 if __name__ == "__main__":
     asyncio.run(main())
@@ -14,6 +14,7 @@ from loguru import logger
 
 from config import BOT_TOKEN, USTAZ_BOT_TOKEN, LOG_PATH, OPENAI_API_KEY
 from database.db import Database
+from bot.storage import create_fsm_storage
 from core.search_engine import SearchEngine
 from core.ai_engine import AIEngine
 from core.knowledge_loader import load_all_knowledge
@@ -21,8 +22,7 @@ from core.knowledge_loader import load_all_knowledge
 # User bot imports
 from bot.handlers import user, admin, subscription
 from bot.handlers import consultation
-from bot.middlewares.rate_limit import RateLimitMiddleware
-from bot.middlewares.subscription_check import SubscriptionCheckMiddleware
+from bot.middlewares.user_context import UserContextMiddleware
 
 # Ustaz bot imports
 from ustaz_bot.handlers import ustaz, auth as ustaz_auth
@@ -82,10 +82,9 @@ async def main():
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    user_dp = Dispatcher()
+    user_dp = Dispatcher(storage=create_fsm_storage(db))
 
-    user_dp.message.middleware(RateLimitMiddleware())
-    user_dp.message.middleware(SubscriptionCheckMiddleware(db))
+    user_dp.message.middleware(UserContextMiddleware(db))
 
     user_dp.include_router(admin.router)
     user_dp.include_router(subscription.router)
@@ -97,7 +96,7 @@ async def main():
         token=USTAZ_BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    ustaz_dp = Dispatcher()
+    ustaz_dp = Dispatcher(storage=create_fsm_storage(db))
 
     ustaz_dp.message.middleware(UstazAuthMiddleware(db))
     ustaz_dp.callback_query.middleware(UstazAuthMiddleware(db))
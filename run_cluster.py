@@ -0,0 +1,261 @@
+"""
+Точка входа: многопроцессный режим (webhook) с шардированием по user_id.
+
+Супервизор принимает webhook-апдейты всех ботов (как run_webhook.py) и раскладывает
+их по CLUSTER_WORKERS процессам: user_id % N — апдейты одного пользователя всегда
+попадают в один процесс и обрабатываются по порядку (внутри процесса — ещё раз
+по user_id % WEBHOOK_WORKERS на последовательные очереди).
+
+- Воркеры: диспетчеры ботов без фоновых задач; состояние — в SQLite (WAL)
+  и FSM-хранилище (его кэш корректен, т.к. пользователь закреплён за процессом).
+  Кэш готовых текстов календаря у каждого процесса свой: воркер прогревает его
+  сам и сбрасывает по поколению "render" в SQLite (core.calendar_render).
+- Планировщик: один процесс с доставкой (outbox), напоминаниями, статистикой,
+  загрузкой времён намаза (замена локального расчёта данными API) и обновлением
+  индекса городов.
+- Упавший процесс перезапускается супервизором.
+"""
+
+import asyncio
+import multiprocessing
+import signal
+import sys
+from multiprocessing.process import BaseProcess
+from queue import Full
+
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+from loguru import logger
+
+from config import (
+    BOT_TOKEN, USTAZ_BOT_TOKEN, MODERATOR_BOT_TOKEN,
+    WEBHOOK_SECRET, WEBHOOK_BASE_URL, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_QUEUE_SIZE, WEBHOOK_WORKERS, CLUSTER_WORKERS,
+)
+from database.db import Database
+from core.delivery import DeliveryEngine
+from core.muftyat_api import MuftyatAPI
+from bot.middlewares.tracing import TelegramTracing
+from main import setup_logging, start_background_tasks, stop_tasks
+from run_webhook import (
+    DRAIN_TIMEOUT, WebhookEndpoint, create_app, enabled_bots, feed_update, start_bot, stop_bot,
+)
+from aiohttp import web
+
+MONITOR_INTERVAL = 5.0
+# Сколько ждать места в очереди воркера под sentinel: упавший воркер
+# успевает перезапуститься (MONITOR_INTERVAL) и разобрать очередь
+SENTINEL_TIMEOUT = DRAIN_TIMEOUT + MONITOR_INTERVAL
+
+
+def update_user_id(data: dict) -> int:
+    """id пользователя (или чата) из «сырого» апдейта: message.from, callback_query.from, ..."""
+    for value in data.values():
+        if isinstance(value, dict):
+            sender = value.get("from") or value.get("chat") or value.get("user")
+            if isinstance(sender, dict) and "id" in sender:
+                return abs(int(sender["id"]))
+    return 0
+
+
+# ──────────────── Процесс-воркер ────────────────
+
+
+async def _worker_async(index: int, inbox: multiprocessing.Queue):
+    db = Database()
+    await db.connect()
+
+    endpoints = {}
+    for name, setup in enabled_bots(user_background=False):
+        # Webhook ставит только первый воркер
+        endpoints[name] = await start_bot(name, setup, db, set_webhook=index == 0)
+
+    # Последовательные очереди внутри процесса: порядок апдейтов пользователя сохраняется
+    lanes = [asyncio.Queue() for _ in range(WEBHOOK_WORKERS)]
+
+    async def consume(lane: asyncio.Queue):
+        while True:
+            endpoint, data = await lane.get()
+            try:
+                await feed_update(endpoint, data)
+            finally:
+                lane.task_done()
+
+    consumers = [asyncio.create_task(consume(lane)) for lane in lanes]
+    logger.info(f"Cluster worker {index} ready")
+
+    while True:
+        item = await asyncio.to_thread(inbox.get)
+        if item is None:
+            break
+        name, data = item
+        endpoint = endpoints.get(name)
+        if endpoint is None:
+            continue
+        lanes[update_user_id(data) % len(lanes)].put_nowait((endpoint, data))
+
+    try:
+        await asyncio.wait_for(asyncio.gather(*(lane.join() for lane in lanes)), timeout=DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Cluster worker {index}: unprocessed updates dropped")
+    for task in consumers:
+        task.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+    for endpoint in endpoints.values():
+        await stop_bot(endpoint)
+    await db.close()
+    logger.info(f"Cluster worker {index} stopped")
+
+
+def worker_main(index: int, inbox: multiprocessing.Queue):
+    # Останавливает супервизор (sentinel в очереди), Ctrl+C терминала игнорируем
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging(f"worker{index}")
+    asyncio.run(_worker_async(index, inbox))
+
+
+# ──────────────── Процесс-планировщик ────────────────
+
+
+async def _scheduler_async():
+    db = Database()
+    await db.connect()
+    muftyat_api = MuftyatAPI()
+    await muftyat_api.init()
+    bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot.session.middleware(TelegramTracing())
+    delivery = DeliveryEngine(bot, db)
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+    tasks = start_background_tasks(delivery, db, muftyat_api)
+    logger.info("Cluster scheduler ready")
+    await stop.wait()
+
+    await stop_tasks(tasks)
+    await muftyat_api.close()
+    await bot.session.close()
+    await db.close()
+    logger.info("Cluster scheduler stopped")
+
+
+def scheduler_main():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_logging("scheduler")
+    asyncio.run(_scheduler_async())
+
+
+# ──────────────── Супервизор ────────────────
+
+
+class Supervisor:
+    def __init__(self, workers: int = CLUSTER_WORKERS):
+        self._ctx = multiprocessing.get_context("spawn")
+        self.inboxes = [self._ctx.Queue(maxsize=WEBHOOK_QUEUE_SIZE) for _ in range(workers)]
+        self.workers: list[BaseProcess | None] = [None] * workers
+        self.scheduler: BaseProcess | None = None
+        self._monitor: asyncio.Task | None = None
+        # Воркеры, которым доставлен sentinel: они завершаются сами, не перезапускаем
+        self._stopping: set[int] = set()
+
+    def _start_worker(self, index: int):
+        process = self._ctx.Process(
+            target=worker_main, args=(index, self.inboxes[index]), name=f"worker{index}", daemon=False,
+        )
+        process.start()
+        self.workers[index] = process
+
+    def _start_scheduler(self):
+        self.scheduler = self._ctx.Process(target=scheduler_main, name="scheduler")
+        self.scheduler.start()
+
+    def accept(self, endpoint: WebhookEndpoint, data: dict) -> bool:
+        inbox = self.inboxes[update_user_id(data) % len(self.inboxes)]
+        try:
+            inbox.put_nowait((endpoint.name, data))
+            return True
+        except Full:
+            return False
+
+    async def _watch(self):
+        """Перезапуск упавших процессов."""
+        while True:
+            await asyncio.sleep(MONITOR_INTERVAL)
+            for index, process in enumerate(self.workers):
+                if process is not None and index not in self._stopping and not process.is_alive():
+                    logger.error(f"Cluster worker {index} exited ({process.exitcode}), restarting")
+                    self._start_worker(index)
+            if self.scheduler is not None and not self.scheduler.is_alive():
+                logger.error(f"Cluster scheduler exited ({self.scheduler.exitcode}), restarting")
+                self._start_scheduler()
+
+    async def on_startup(self, app: web.Application):
+        self._start_scheduler()
+        for index in range(len(self.workers)):
+            self._start_worker(index)
+        self._monitor = asyncio.create_task(self._watch())
+        logger.info(f"Cluster started: {len(self.workers)} workers + scheduler")
+
+    async def _stop_worker(self, index: int):
+        """
+        Sentinel в очередь воркера без блокировки event loop. Пока ждём места,
+        монитор продолжает перезапускать упавший воркер, чтобы очередь разобралась.
+        """
+        try:
+            await asyncio.to_thread(self.inboxes[index].put, None, True, SENTINEL_TIMEOUT)
+        except Full:
+            logger.warning(f"Cluster worker {index}: queue is not draining, terminating")
+            self._stopping.add(index)
+            self.workers[index].terminate()
+        else:
+            self._stopping.add(index)
+        process = self.workers[index]
+        await asyncio.to_thread(process.join, DRAIN_TIMEOUT + 10)
+        if process.is_alive():
+            process.terminate()
+            await asyncio.to_thread(process.join, 5)
+
+    async def on_shutdown(self, app: web.Application):
+        app["closing"] = True
+        await asyncio.gather(*(self._stop_worker(index) for index in range(len(self.workers))))
+        self._monitor.cancel()
+        self.scheduler.terminate()
+        await asyncio.to_thread(self.scheduler.join, 10)
+        logger.info("Cluster stopped")
+
+
+async def _prepare_database():
+    """Миграции один раз до старта процессов (а не параллельно в каждом)."""
+    db = Database()
+    await db.connect()
+    await db.close()
+
+
+def main():
+    setup_logging()
+    logger.info("Starting bots in cluster mode...")
+
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN is not set! Check .env file.")
+        sys.exit(1)
+
+    if not WEBHOOK_SECRET or not WEBHOOK_BASE_URL:
+        logger.error("WEBHOOK_SECRET and DOMAIN (or WEBHOOK_BASE_URL) must be set for cluster mode")
+        sys.exit(1)
+
+    asyncio.run(_prepare_database())
+
+    tokens = {"user": BOT_TOKEN, "ustaz": USTAZ_BOT_TOKEN, "moderator": MODERATOR_BOT_TOKEN}
+    endpoints = {name: WebhookEndpoint(name, tokens[name]) for name, _ in enabled_bots()}
+
+    supervisor = Supervisor()
+    app = create_app(endpoints, supervisor.accept)
+    app.on_startup.append(supervisor.on_startup)
+    app.on_shutdown.append(supervisor.on_shutdown)
+    web.run_app(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,15 +7,16 @@
 import asyncio
 import sys
 import os
+from typing import Awaitable, Callable
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from loguru import logger
 
 from config import BOT_TOKEN, MODERATOR_BOT_TOKEN, LOG_PATH
 from database.db import Database
+from bot.storage import create_fsm_storage
 from moderator_bot.handlers import moderator
 
 
@@ -34,24 +35,14 @@ def setup_logging():
     )
 
 
-async def main():
-    setup_logging()
-    logger.info("Starting moderator bot...")
-
-    if not MODERATOR_BOT_TOKEN:
-        logger.error("MODERATOR_BOT_TOKEN is not set! Check .env file.")
-        sys.exit(1)
-
-    # Инициализация БД (общая с пользовательским ботом)
-    db = Database()
-    await db.connect()
-
+async def setup_moderator_bot(db: Database) -> tuple[Bot, Dispatcher, Callable[[], Awaitable[None]]]:
+    """Собрать модератор-бота. Возвращает (bot, dispatcher, shutdown); polling и webhook (run_webhook.py)."""
     # Модератор-бот
     mod_bot = Bot(
         token=MODERATOR_BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    dp = Dispatcher(storage=create_fsm_storage(db))
 
     # Роутеры
     dp.include_router(moderator.router)
@@ -73,15 +64,37 @@ async def main():
         "user_bot": user_bot,
     })
 
+    async def shutdown():
+        await mod_bot.session.close()
+        if user_bot:
+            await user_bot.session.close()
+
+    return mod_bot, dp, shutdown
+
+
+async def main():
+    setup_logging()
+    logger.info("Starting moderator bot...")
+
+    if not MODERATOR_BOT_TOKEN:
+        logger.error("MODERATOR_BOT_TOKEN is not set! Check .env file.")
+        sys.exit(1)
+
+    # Инициализация БД (общая с пользовательским ботом)
+    db = Database()
+    await db.connect()
+
+    mod_bot, dp, shutdown = await setup_moderator_bot(db)
     logger.info("Moderator bot is starting polling...")
 
+    # Webhook мог остаться от run_webhook.py — polling с ним не работает
+    await mod_bot.delete_webhook(drop_pending_updates=False)
+
     try:
         await dp.start_polling(mod_bot)
     finally:
+        await shutdown()
         await db.close()
-        await mod_bot.session.close()
-        if user_bot:
-            await user_bot.session.close()
         logger.info("Moderator bot stopped")
 
 
@@ -7,15 +7,16 @@
 import asyncio
 import sys
 import os
+from typing import Awaitable, Callable
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from loguru import logger
 
 from config import BOT_TOKEN, USTAZ_BOT_TOKEN, LOG_PATH
 from database.db import Database
+from bot.storage import create_fsm_storage
 from ustaz_bot.handlers import ustaz, auth as ustaz_auth
 from ustaz_bot.middlewares.ustaz_auth import UstazAuthMiddleware
 
@@ -35,24 +36,14 @@ def setup_logging():
     )
 
 
-async def main():
-    setup_logging()
-    logger.info("Starting ustaz bot...")
-
-    if not USTAZ_BOT_TOKEN:
-        logger.error("USTAZ_BOT_TOKEN is not set! Check .env file.")
-        sys.exit(1)
-
-    # Инициализация БД (общая с пользовательским ботом)
-    db = Database()
-    await db.connect()
-
+async def setup_ustaz_bot(db: Database) -> tuple[Bot, Dispatcher, Callable[[], Awaitable[None]]]:
+    """Собрать устаз-бота. Возвращает (bot, dispatcher, shutdown); polling и webhook (run_webhook.py)."""
     # Устаз-бот
     ustaz_bot = Bot(
         token=USTAZ_BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    dp = Dispatcher(storage=create_fsm_storage(db))
 
     # Middleware авторизации
     dp.message.middleware(UstazAuthMiddleware(db))
@@ -79,15 +70,37 @@ async def main():
         "user_bot": user_bot,
     })
 
+    async def shutdown():
+        await ustaz_bot.session.close()
+        if user_bot:
+            await user_bot.session.close()
+
+    return ustaz_bot, dp, shutdown
+
+
+async def main():
+    setup_logging()
+    logger.info("Starting ustaz bot...")
+
+    if not USTAZ_BOT_TOKEN:
+        logger.error("USTAZ_BOT_TOKEN is not set! Check .env file.")
+        sys.exit(1)
+
+    # Инициализация БД (общая с пользовательским ботом)
+    db = Database()
+    await db.connect()
+
+    ustaz_bot, dp, shutdown = await setup_ustaz_bot(db)
     logger.info("Ustaz bot is starting polling...")
 
+    # Webhook мог остаться от run_webhook.py — polling с ним не работает
+    await ustaz_bot.delete_webhook(drop_pending_updates=False)
+
     try:
         await dp.start_polling(ustaz_bot)
     finally:
+        await shutdown()
         await db.close()
-        await ustaz_bot.session.close()
-        if user_bot:
-            await user_bot.session.close()
         logger.info("Ustaz bot stopped")
 
 
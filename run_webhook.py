@@ -0,0 +1,223 @@
+"""
+Точка входа: пользовательский, устаз- и модератор-бот через webhook
+на одном aiohttp-приложении (альтернатива polling в main.py / run_*_bot.py).
+
+nginx проксирует /webhook/ на WEBHOOK_HOST:WEBHOOK_PORT. У каждого бота свой
+секретный путь и secret_token (заголовок X-Telegram-Bot-Api-Secret-Token),
+оба выводятся из WEBHOOK_SECRET и токена бота. Обработчик запроса только
+кладёт апдейт в ограниченную очередь и сразу отвечает 200; апдейты
+обрабатывают воркеры. Очередь переполнена → 503, Telegram повторит доставку.
+"""
+
+import asyncio
+import functools
+import hashlib
+import hmac
+import sys
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+from loguru import logger
+
+from config import (
+    BOT_TOKEN, USTAZ_BOT_TOKEN, MODERATOR_BOT_TOKEN,
+    WEBHOOK_SECRET, WEBHOOK_BASE_URL, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_QUEUE_SIZE, WEBHOOK_WORKERS,
+)
+from database.db import Database
+from core.metrics import registry
+from main import setup_logging, setup_user_bot
+from run_moderator_bot import setup_moderator_bot
+from run_ustaz_bot import setup_ustaz_bot
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Сколько ждать обработки уже принятых апдейтов при остановке
+DRAIN_TIMEOUT = 15.0
+
+
+def _derive_secret(purpose: str, token: str) -> str:
+    return hmac.new(WEBHOOK_SECRET.encode(), f"{purpose}:{token}".encode(), hashlib.sha256).hexdigest()
+
+
+@dataclass
+class WebhookEndpoint:
+    """Секретный путь и secret_token бота (выводятся из WEBHOOK_SECRET и токена)."""
+    name: str
+    token: str
+
+    @property
+    def path_secret(self) -> str:
+        return _derive_secret("path", self.token)[:32]
+
+    @property
+    def secret_token(self) -> str:
+        return _derive_secret("header", self.token)
+
+    @property
+    def path(self) -> str:
+        return f"/webhook/{self.name}/{self.path_secret}"
+
+
+@dataclass
+class WebhookBot(WebhookEndpoint):
+    bot: Bot
+    dp: Dispatcher
+    shutdown: Callable[[], Awaitable[None]]
+
+
+def enabled_bots(user_background: bool = True) -> list[tuple[str, Callable]]:
+    """[(имя, setup-функция)] ботов, для которых задан токен."""
+    bots = [("user", functools.partial(setup_user_bot, background=user_background))]
+    if USTAZ_BOT_TOKEN:
+        bots.append(("ustaz", setup_ustaz_bot))
+    if MODERATOR_BOT_TOKEN:
+        bots.append(("moderator", setup_moderator_bot))
+    return bots
+
+
+async def start_bot(name: str, setup: Callable, db: Database, set_webhook: bool = True) -> WebhookBot:
+    """Собрать бота, вызвать startup-хуки диспетчера и (опционально) установить webhook."""
+    bot, dp, shutdown = await setup(db)
+    endpoint = WebhookBot(name, bot.token, bot, dp, shutdown)
+    await dp.emit_startup(bot=bot, bots=[bot], dispatcher=dp, **dp.workflow_data)
+    if set_webhook:
+        await bot.set_webhook(
+            url=f"{WEBHOOK_BASE_URL}{endpoint.path}",
+            secret_token=endpoint.secret_token,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=False,
+        )
+        logger.info(f"Webhook set for {name} bot: {WEBHOOK_BASE_URL}/webhook/{name}/…")
+    return endpoint
+
+
+async def stop_bot(endpoint: WebhookBot):
+    # Вебхуки не удаляем: на время перезапуска Telegram копит апдейты у себя
+    try:
+        await endpoint.dp.emit_shutdown(bot=endpoint.bot, bots=[endpoint.bot], dispatcher=endpoint.dp)
+        await endpoint.shutdown()
+    except Exception as e:
+        logger.error(f"Webhook {endpoint.name} shutdown error: {e}")
+
+
+async def feed_update(endpoint: WebhookBot, data: dict):
+    try:
+        update = Update.model_validate(data, context={"bot": endpoint.bot})
+        await endpoint.dp.feed_update(endpoint.bot, update)
+    except Exception as e:
+        logger.error(f"Webhook {endpoint.name}: update {data.get('update_id')} failed: {e}")
+
+
+async def handle_update(request: web.Request) -> web.Response:
+    """Принять апдейт: проверка секрета, передача в очередь (app["accept"]), мгновенный ответ."""
+    endpoint: WebhookEndpoint | None = request.app["endpoints"].get(request.match_info["name"])
+    if endpoint is None or not hmac.compare_digest(request.match_info["secret"], endpoint.path_secret):
+        raise web.HTTPNotFound()
+    if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), endpoint.secret_token):
+        logger.warning(f"Webhook {endpoint.name}: bad secret token from {request.remote}")
+        raise web.HTTPUnauthorized()
+    if request.app["closing"]:
+        raise web.HTTPServiceUnavailable()
+
+    try:
+        data = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest()
+
+    if not request.app["accept"](endpoint, data):
+        logger.warning(f"Webhook queue is full, update {data.get('update_id')} rejected")
+        raise web.HTTPServiceUnavailable()
+    return web.Response()
+
+
+async def _worker(queue: asyncio.Queue):
+    while True:
+        endpoint, data = await queue.get()
+        try:
+            await feed_update(endpoint, data)
+        finally:
+            queue.task_done()
+
+
+def _accept(queue: asyncio.Queue):
+    def accept(endpoint: WebhookBot, data: dict) -> bool:
+        try:
+            queue.put_nowait((endpoint, data))
+            return True
+        except asyncio.QueueFull:
+            return False
+    return accept
+
+
+async def on_startup(app: web.Application):
+    db = Database()
+    await db.connect()
+    app["db"] = db
+
+    for name, setup in enabled_bots():
+        app["endpoints"][name] = await start_bot(name, setup, db)
+
+    app["workers"] = [
+        asyncio.create_task(_worker(app["queue"])) for _ in range(WEBHOOK_WORKERS)
+    ]
+
+
+async def on_shutdown(app: web.Application):
+    """Перестать принимать апдейты, дообработать очередь, закрыть ботов и БД."""
+    app["closing"] = True
+    try:
+        await asyncio.wait_for(app["queue"].join(), timeout=DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Webhook: {app['queue'].qsize()} updates left unprocessed")
+
+    for task in app["workers"]:
+        task.cancel()
+    await asyncio.gather(*app["workers"], return_exceptions=True)
+
+    for endpoint in app["endpoints"].values():
+        await stop_bot(endpoint)
+    await app["db"].close()
+    logger.info("Webhook bots stopped")
+
+
+def create_app(endpoints: dict, accept: Callable[[WebhookEndpoint, dict], bool]) -> web.Application:
+    """aiohttp-приложение приёма апдейтов; accept(endpoint, data) → False, если очередь полна."""
+    app = web.Application(client_max_size=1024 * 1024)
+    app["endpoints"] = endpoints
+    app["accept"] = accept
+    app["closing"] = False
+    app.router.add_post("/webhook/{name}/{secret}", handle_update)
+    return app
+
+
+def init_app() -> web.Application:
+    queue = asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+    registry.gauge("webhook_queue_size", "Принятые, но ещё не обработанные апдейты", func=queue.qsize)
+    app = create_app({}, _accept(queue))
+    app["queue"] = queue
+    app["workers"] = []
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    return app
+
+
+def main():
+    setup_logging()
+    logger.info("Starting bots in webhook mode...")
+
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN is not set! Check .env file.")
+        sys.exit(1)
+
+    if not WEBHOOK_SECRET or not WEBHOOK_BASE_URL:
+        logger.error("WEBHOOK_SECRET and DOMAIN (or WEBHOOK_BASE_URL) must be set for webhook mode")
+        sys.exit(1)
+
+    web.run_app(init_app(), host=WEBHOOK_HOST, port=WEBHOOK_PORT, print=None)
+
+
+if __name__ == "__main__":
+    main()
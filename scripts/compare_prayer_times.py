@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Сверка локального расчёта времён намаза (core.prayer_calc) с данными muftyat.kz.
+Запуск: python scripts/compare_prayer_times.py
+
+Берёт закэшированные ответы API (prayer_times_years.source = 'api'),
+считает те же годы локально и печатает расхождение по каждому намазу в минутах
+и предлагаемую поправку для MUFTYAT_METHOD["adjust"].
+"""
+
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config import DATABASE_PATH
+from core.prayer_calc import compute_prayer_times
+
+PRAYERS = ("imsak", "fajr", "sunrise", "dhuhr", "asr", "maghrib", "isha")
+
+
+def _minutes(value: str) -> int | None:
+    try:
+        hours, minutes = value.split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    except (ValueError, AttributeError):
+        return None
+
+
+def main():
+    if not os.path.exists(DATABASE_PATH):
+        print(f"Database not found: {DATABASE_PATH}")
+        sys.exit(1)
+
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    years = conn.execute(
+        "SELECT lat, lng, year FROM prayer_times_years WHERE source = 'api' ORDER BY lat, lng, year"
+    ).fetchall()
+    if not years:
+        print("No prayer times from API in cache.")
+        return
+
+    diffs: dict[str, list[int]] = {name: [] for name in PRAYERS}
+    for row in years:
+        lat, lng, year = row["lat"], row["lng"], row["year"]
+        local = {d["Date"]: d for d in compute_prayer_times(year, lat, lng)}
+        cached = conn.execute(
+            "SELECT * FROM prayer_times_cache WHERE lat = ? AND lng = ? AND date LIKE ?",
+            (lat, lng, f"{year}-%"),
+        ).fetchall()
+        city_diffs: dict[str, list[int]] = {name: [] for name in PRAYERS}
+        for api_day in cached:
+            day = local.get(api_day["date"])
+            if not day:
+                continue
+            for name in PRAYERS:
+                api_min = _minutes(api_day[name])
+                local_min = _minutes(day[name])
+                if api_min is not None and local_min is not None:
+                    city_diffs[name].append(api_min - local_min)
+        worst = max((abs(d) for values in city_diffs.values() for d in values), default=0)
+        city = cached[0]["city_name"] if cached else "?"
+        print(f"{city} ({lat}, {lng}) {year}: {len(cached)} days, max |diff| {worst} min")
+        for name in PRAYERS:
+            diffs[name].extend(city_diffs[name])
+
+    conn.close()
+
+    print()
+    print(f"{'prayer':<8} {'mean':>7} {'max|d|':>7} {'adjust':>7}")
+    for name in PRAYERS:
+        values = diffs[name]
+        if not values:
+            continue
+        mean = sum(values) / len(values)
+        worst = max(abs(v) for v in values)
+        print(f"{name:<8} {mean:>7.2f} {worst:>7} {round(mean):>+7}")
+    print("\nadjust > 0: API позже локального расчёта (минуты к MUFTYAT_METHOD['adjust']).")
+
+
+if __name__ == "__main__":
+    main()
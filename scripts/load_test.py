@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест пользовательского бота без Telegram и OpenAI.
+Запуск: python scripts/load_test.py [--stages 1,5,10,25,50] [--stage-seconds 30]
+
+Строит aiogram Update из query_logs (или синтетической смеси казахских
+и русских вопросов) и подаёт их в настоящий Dispatcher из setup_user_bot:
+middleware, FSM, поиск, кэш, SQLite работают как в проде. Вместо Bot API —
+фейковая сессия с задержкой --tg-latency, вместо OpenAI — локальная заглушка
+с задержкой --ai-latency (или --openai-url на свой сервер).
+
+Рабочие копии БД и ChromaDB создаются во временном каталоге — прод-данные
+не меняются. Для каждой ступени конкурентности печатаются пропускная
+способность, доля ошибок и p50/p95/p99: всего апдейта (точно) и этапов
+трассировки (core.tracing, интерполяция по бакетам гистограммы).
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Синтетическая смесь: казахский (кириллица и латиница), русский, кнопки и команды
+SYNTHETIC_QUESTIONS = [
+    "Ораза кезінде тіс жууға бола ма?",
+    "Сәресі уақыты қашан аяқталады?",
+    "Ауызашар дұғасы қалай оқылады?",
+    "Пітір садақа мөлшері қанша?",
+    "Тарауих намазы неше ракағат?",
+    "Науқас адам оразаны қалай өтейді?",
+    "Oraza kezinde dári ishuge bola ma?",
+    "Auyzashar duğasy qalai oqylady?",
+    "Можно ли чистить зубы во время поста?",
+    "Сколько стоит фитр садака в этом году?",
+    "Нарушает ли пост укол?",
+    "Как восполнить пропущенные дни поста?",
+    "Можно ли беременным не держать оразу?",
+]
+SYNTHETIC_COMMANDS = ["📊 Статистика", "❓ Анықтама", "❓ Справка", "/help"]
+COMMAND_SHARE = 0.1
+
+STUB_ANSWER = (
+    "Ораза кезінде тіс жууға болады, бірақ суды жұтпау керек. "
+    "Тіс пастасын абайлап қолданған жөн.\n\n"
+    "[SUGGESTIONS]\n"
+    "💡 Ораза кезінде дәрі ішуге бола ма?\n"
+    "💡 Сәресі уақыты қашан аяқталады?"
+)
+
+
+def _jitter(mean: float) -> float:
+    """Лог-нормальная задержка со средним mean (хвост как у настоящих API)."""
+    if mean <= 0:
+        return 0.0
+    sigma = 0.5
+    return random.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+
+
+# ──────────────── Заглушки Telegram и OpenAI ────────────────
+
+
+async def start_openai_stub(latency: float):
+    """Локальный /v1/chat/completions; возвращает (runner, base_url)."""
+    from aiohttp import web
+
+    async def completions(request: web.Request) -> web.Response:
+        body = await request.json()
+        await asyncio.sleep(_jitter(latency))
+        return web.json_response({
+            "id": "chatcmpl-loadtest",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": STUB_ANSWER},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 900, "completion_tokens": 120, "total_tokens": 1020},
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/v1"
+
+
+def make_fake_session(latency: float):
+    """Сессия Bot API без сети: отвечает правдоподобными объектами с задержкой latency."""
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Chat, Message
+
+    class FakeSession(BaseSession):
+        def __init__(self):
+            super().__init__()
+            self._message_ids = itertools.count(1)
+
+        async def make_request(self, bot, method, timeout=None):
+            await asyncio.sleep(_jitter(latency))
+            chat_id = getattr(method, "chat_id", None)
+            if "Message" not in str(method.__returning__):
+                return True
+            message = Message(
+                message_id=getattr(method, "message_id", None) or next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=int(chat_id or 0), type="private"),
+                text=getattr(method, "text", None),
+            )
+            return message.as_(bot)
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b""
+
+        async def close(self):
+            pass
+
+    return FakeSession()
+
+
+# ──────────────── Трафик ────────────────
+
+
+def load_questions(db_path: str, limit: int) -> list[str]:
+    """Реальные вопросы из query_logs; пусто — синтетическая смесь."""
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(
+                "SELECT query_text FROM query_logs ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        conn.close()
+        if rows:
+            return [r[0] for r in rows if r[0]]
+    return SYNTHETIC_QUESTIONS
+
+
+def build_update(update_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load", "language_code": "kk"},
+            "text": text,
+        },
+    }
+
+
+# ──────────────── Статистика ────────────────
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def histogram_quantile(q: float, bounds: list[float], counts: list[int]) -> float:
+    """Квантиль по бакетам (как histogram_quantile в Prometheus)."""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if count and cumulative + count >= rank:
+            lower = bounds[i - 1] if i > 0 else 0.0
+            upper = bounds[i] if i < len(bounds) else bounds[-1]
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+    return bounds[-1]
+
+
+def stage_deltas(before: dict, after: dict) -> dict[str, list[int]]:
+    """Разница гистограммы этапов между двумя снимками: stage → счётчики бакетов."""
+    result = {}
+    for key, series in after["series"].items():
+        prev = before["series"].get(key, [0] * len(series))
+        counts = [a - b for a, b in zip(series[:-1], prev[:-1])]
+        if sum(counts):
+            result[json.loads(key)[0]] = counts
+    return result
+
+
+# ──────────────── Прогон ────────────────
+
+
+async def run_stage(dp, bot, concurrency: int, seconds: float, questions: list[str], users: int, ids) -> dict:
+    from aiogram.types import Update
+
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.monotonic() + seconds
+
+    async def virtual_user():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            user_id = 7_000_000_000 + random.randrange(users)
+            text = random.choice(SYNTHETIC_COMMANDS) if random.random() < COMMAND_SHARE else random.choice(questions)
+            update = Update.model_validate(build_update(next(ids), user_id, text), context={"bot": bot})
+            start = time.perf_counter()
+            try:
+                await dp.feed_update(bot, update)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    started = time.monotonic()
+    await asyncio.gather(*(virtual_user() for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "errors": errors,
+        "error_rate": errors / len(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def print_stage(result: dict):
+    print(
+        f"\n=== concurrency {result['concurrency']}: {result['requests']} updates, "
+        f"{result['throughput']:.1f} upd/s, errors {result['errors']} ({result['error_rate']:.1%}) ==="
+    )
+    print(f"{'stage':<36}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    print(f"{'total (exact)':<36}{result['requests']:>8}"
+          f"{result['p50'] * 1000:>10.1f}{result['p95'] * 1000:>10.1f}{result['p99'] * 1000:>10.1f}")
+    for stage, row in sorted(result["stages"].items(), key=lambda kv: -kv[1]["p95"]):
+        print(f"{stage:<36}{row['count']:>8}"
+              f"{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}{row['p99'] * 1000:>10.1f}")
+
+
+async def run(args):
+    # Импорты после подмены окружения в main(): config читает его при импорте
+    from loguru import logger
+
+    from config import DATABASE_PATH
+    from core.tracing import STAGE_SECONDS
+    from database.db import Database
+    from main import setup_user_bot
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    stub = None
+    if not args.openai_url:
+        stub, base_url = await start_openai_stub(args.ai_latency)
+        os.environ["OPENAI_BASE_URL"] = base_url
+
+    db = Database(DATABASE_PATH)
+    await db.connect()
+    bot, dp, shutdown = await setup_user_bot(db, background=False, session=make_fake_session(args.tg_latency))
+    await dp.emit_startup(bot=bot, bots=[bot], dispatcher=dp, **dp.workflow_data)
+
+    questions = load_questions(args.source_db, args.max_questions)
+    print(f"Questions: {len(questions)}, virtual users: {args.users}, "
+          f"telegram latency {args.tg_latency * 1000:.0f} ms, AI latency {args.ai_latency * 1000:.0f} ms")
+
+    ids = itertools.count(1)
+    results = []
+    try:
+        for concurrency in args.stages:
+            before = STAGE_SECONDS.snapshot()
+            result = await run_stage(dp, bot, concurrency, args.stage_seconds, questions, args.users, ids)
+            bounds = STAGE_SECONDS.buckets
+            result["stages"] = {
+                stage: {
+                    "count": sum(counts),
+                    "p50": histogram_quantile(0.50, bounds, counts),
+                    "p95": histogram_quantile(0.95, bounds, counts),
+                    "p99": histogram_quantile(0.99, bounds, counts),
+                }
+                for stage, counts in stage_deltas(before, STAGE_SECONDS.snapshot()).items()
+            }
+            print_stage(result)
+            results.append(result)
+    finally:
+        await dp.emit_shutdown(bot=bot, bots=[bot], dispatcher=dp)
+        await shutdown()
+        await db.close()
+        if stub:
+            await stub.cleanup()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nReport saved: {args.json}")
+
+
+def _copy_database(source: str, target: str):
+    """Согласованная копия SQLite (с учётом WAL) через backup API."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    src.backup(dst)
+    dst.close()
+    src.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the user bot dispatcher")
+    parser.add_argument("--stages", default="1,5,10,25,50",
+                        type=lambda s: [int(x) for x in s.split(",")], help="concurrency ramp")
+    parser.add_argument("--stage-seconds", type=float, default=30.0)
+    parser.add_argument("--users", type=int, default=5000, help="distinct virtual user ids")
+    parser.add_argument("--tg-latency", type=float, default=0.08, help="mean Bot API latency, s")
+    parser.add_argument("--ai-latency", type=float, default=3.0, help="mean OpenAI stub latency, s")
+    parser.add_argument("--openai-url", default="", help="use this OpenAI-compatible endpoint instead of the stub")
+    parser.add_argument("--max-questions", type=int, default=5000, help="questions taken from query_logs")
+    parser.add_argument("--fresh", action="store_true", help="empty database and knowledge base instead of copies")
+    parser.add_argument("--json", default="", help="write results to this file")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    # Окружение до импорта config: рабочие копии данных и фейковые ключи
+    from dotenv import load_dotenv
+    load_dotenv()
+    source_db = os.getenv("DATABASE_PATH", "./database/bot.db")
+    source_chroma = os.getenv("CHROMA_PATH", "./chroma_db")
+    args.source_db = source_db
+
+    workdir = tempfile.mkdtemp(prefix="ramadan-load-")
+    db_path = os.path.join(workdir, "bot.db")
+    chroma_path = os.path.join(workdir, "chroma_db")
+    if not args.fresh:
+        if os.path.exists(source_db):
+            _copy_database(source_db, db_path)
+        if os.path.isdir(source_chroma):
+            shutil.copytree(source_chroma, chroma_path)
+    os.environ.update({
+        "DATABASE_PATH": db_path,
+        "CHROMA_PATH": chroma_path,
+        "BOT_TOKEN": "123456:LOADTEST",
+        "USTAZ_BOT_TOKEN": "",
+        "MODERATOR_BOT_TOKEN": "",
+        "FSM_STORAGE": "sqlite",
+    })
+    if args.openai_url:
+        os.environ["OPENAI_BASE_URL"] = args.openai_url
+    else:
+        os.environ["OPENAI_API_KEY"] = "sk-loadtest"
+    print(f"Working copy: {workdir}")
+
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
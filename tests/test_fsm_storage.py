@@ -0,0 +1,60 @@
+"""Регрессии SQLiteStorage (bot/storage.py)."""
+
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+
+import bot.storage as storage
+from bot.storage import SQLiteStorage
+
+
+class FlakyDB:
+    """Поддельная БД: первая запись падает, дальше пишет в словарь."""
+
+    def __init__(self):
+        self.records: dict[str, tuple] = {}
+        self.failures = 1
+
+    async def get_fsm_record(self, skey):
+        return None
+
+    async def save_fsm_records(self, upserts, deletes):
+        # Пока запись «в полёте», обработчики успевают прочитать другие ключи
+        await asyncio.sleep(0)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        for skey, state, data in upserts:
+            self.records[skey] = (state, data)
+        for skey in deletes:
+            self.records.pop(skey, None)
+
+
+def _key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def test_eviction_during_failed_flush(monkeypatch):
+    monkeypatch.setattr(storage, "CACHE_MAX_SIZE", 1)
+
+    async def scenario():
+        db = FlakyDB()
+        fsm = SQLiteStorage(db, cache_ttl=0)
+        await fsm.set_state(_key(1), "A")
+        fsm._flusher.cancel()
+
+        flush = asyncio.create_task(fsm.flush())
+        await asyncio.sleep(0)
+        # Чтение другого ключа во время записи вытесняет кэш
+        await fsm.get_state(_key(2))
+        try:
+            await flush
+        except RuntimeError:
+            pass
+
+        await fsm.flush()
+        return db.records, fsm._dirty
+
+    records, dirty = asyncio.run(scenario())
+    assert records == {"fsm:1:1:1:default": ("A", "{}")}
+    assert dirty == set()
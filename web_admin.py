@@ -9,6 +9,7 @@ import base64
 import io
 import json
 import os
+import re
 import sys
 
 from aiohttp import web
@@ -29,13 +30,20 @@ from config import (
     OPENAI_MODEL,
     DATABASE_PATH,
     CACHE_THRESHOLD,
+    SIMILAR_QUESTIONS_THRESHOLD,
     SUBSCRIPTION_PLANS,
     DOMAIN,
     KASPI_PAY_LINK,
     KASPI_PRICE_KZT,
     KASPI_PLAN_DAYS,
+    METRICS_FLUSH_INTERVAL,
+    PROFILE_MAX_SECONDS,
 )
 from database.db import Database
+from core.metrics import merge_snapshots, render_prometheus
+from core.profiler import FORMATS as PROFILE_FORMATS
+from core.delivery import PRIORITY_BROADCAST
+from core.stats import stats_refresh_task
 
 ADMIN_PORT = int(os.getenv("ADMIN_PORT", "8888"))
 
@@ -45,59 +53,106 @@ ADMIN_PORT = int(os.getenv("ADMIN_PORT", "8888"))
 # ══════════════════════════════════════════════════════════════════
 
 
-async def sql_list_users(db: Database, page: int = 1, per_page: int = 25,
+def _parse_cursor(cursor: str) -> tuple[str, int] | None:
+    """Курсор keyset-пагинации: "created_at|id"."""
+    if not cursor or "|" not in cursor:
+        return None
+    created_at, _, row_id = cursor.rpartition("|")
+    try:
+        return created_at, int(row_id)
+    except ValueError:
+        return None
+
+
+def _keyset_page(rows, per_page: int) -> tuple[list[dict], str | None]:
+    """Отрезать лишнюю строку (LIMIT per_page + 1) и построить курсор следующей страницы."""
+    items = [dict(row) for row in rows[:per_page]]
+    next_cursor = None
+    if len(rows) > per_page and items:
+        last = items[-1]
+        next_cursor = f"{last['created_at']}|{last['id']}"
+    return items, next_cursor
+
+
+def _fts_query(search: str) -> str:
+    """Префиксный FTS5-запрос: каждое слово → "слово"*."""
+    tokens = re.findall(r"[^\W_]+", search.lower())
+    return " ".join(f'"{t}"*' for t in tokens[:8])
+
+
+async def sql_list_users(db: Database, cursor: str = "", per_page: int = 25,
                          search: str = "", filter_: str = "all"):
-    """Список пользователей с пагинацией, поиском и фильтром."""
-    offset = (page - 1) * per_page
+    """Список пользователей: keyset-пагинация, FTS5-поиск, точный поиск по ID."""
     where = []
     params = []
-
-    if search:
-        where.append(
-            "(u.username LIKE ? OR u.first_name LIKE ? OR CAST(u.telegram_id AS TEXT) LIKE ?)"
-        )
-        like = f"%{search}%"
-        params.extend([like, like, like])
+    counters = await db.get_stats_counters()
+    total = counters.get("users_total", 0)
+
+    search = search.strip().lstrip("@")
+    if search.isdigit():
+        # Быстрый путь: точное совпадение telegram_id по уникальному индексу
+        where.append("u.telegram_id = ?")
+        params.append(int(search))
+        total = None
+    elif search:
+        match = _fts_query(search)
+        if not match:
+            return [], 0, None
+        where.append("u.id IN (SELECT rowid FROM users_fts WHERE users_fts MATCH ?)")
+        params.append(match)
+        total = None
 
     if filter_ == "subscribed":
         where.append("u.is_subscribed = TRUE")
+        if total is not None:
+            total = counters.get("users_subscribed", 0)
     elif filter_ == "free":
         where.append("u.is_subscribed = FALSE")
+        if total is not None:
+            total -= counters.get("users_subscribed", 0)
+    elif filter_ == "unreachable":
+        where.append("u.delivery_status != 'ok'")
+        total = None
 
-    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    position = _parse_cursor(cursor)
+    if position:
+        where.append("(u.created_at, u.id) < (?, ?)")
+        params.extend(position)
 
-    count_sql = f"SELECT COUNT(*) as cnt FROM users u {where_sql}"
-    cursor = await db._conn.execute(count_sql, params)
-    total = (await cursor.fetchone())["cnt"]
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
 
     data_sql = (
         f"SELECT u.id, u.telegram_id, u.username, u.first_name, "
         f"u.answers_count, u.is_subscribed, u.subscription_expires_at, "
-        f"u.city, u.language, u.is_onboarded, u.created_at "
+        f"u.city, u.language, u.is_onboarded, u.delivery_status, u.created_at "
         f"FROM users u {where_sql} "
-        f"ORDER BY u.created_at DESC LIMIT ? OFFSET ?"
+        f"ORDER BY u.created_at DESC, u.id DESC LIMIT ?"
     )
-    cursor = await db._conn.execute(data_sql, params + [per_page, offset])
-    items = [dict(row) for row in await cursor.fetchall()]
-    return items, total
+    rows = await (await db._conn.execute(data_sql, params + [per_page + 1])).fetchall()
+    items, next_cursor = _keyset_page(rows, per_page)
+    return items, total, next_cursor
 
 
-async def sql_list_consultations(db: Database, page: int = 1, per_page: int = 20,
+async def sql_list_consultations(db: Database, cursor: str = "", per_page: int = 20,
                                  status: str = "all"):
     """Список консультаций с JOIN пользователей и устазов."""
-    offset = (page - 1) * per_page
     where = []
     params = []
+    counters = await db.get_stats_counters()
 
     if status != "all":
         where.append("c.status = ?")
         params.append(status)
+        total = counters.get(f"consultations:{status}", 0)
+    else:
+        total = counters.get("consultations_total", 0)
 
-    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    position = _parse_cursor(cursor)
+    if position:
+        where.append("(c.created_at, c.id) < (?, ?)")
+        params.extend(position)
 
-    count_sql = f"SELECT COUNT(*) as cnt FROM consultations c {where_sql}"
-    cursor = await db._conn.execute(count_sql, params)
-    total = (await cursor.fetchone())["cnt"]
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
 
     data_sql = (
         f"SELECT c.id, c.user_telegram_id, c.ustaz_telegram_id, c.status, "
@@ -109,29 +164,33 @@ async def sql_list_consultations(db: Database, page: int = 1, per_page: int = 20
         f"FROM consultations c "
         f"LEFT JOIN users u ON c.user_telegram_id = u.telegram_id "
         f"LEFT JOIN ustaz_profiles up ON c.ustaz_telegram_id = up.telegram_id "
-        f"{where_sql} ORDER BY c.created_at DESC LIMIT ? OFFSET ?"
+        f"{where_sql} ORDER BY c.created_at DESC, c.id DESC LIMIT ?"
     )
-    cursor = await db._conn.execute(data_sql, params + [per_page, offset])
-    items = [dict(row) for row in await cursor.fetchall()]
-    return items, total
+    rows = await (await db._conn.execute(data_sql, params + [per_page + 1])).fetchall()
+    items, next_cursor = _keyset_page(rows, per_page)
+    return items, total, next_cursor
 
 
-async def sql_list_tickets(db: Database, page: int = 1, per_page: int = 20,
+async def sql_list_tickets(db: Database, cursor: str = "", per_page: int = 20,
                            status: str = "all"):
     """Список тикетов с JOIN пользователей."""
-    offset = (page - 1) * per_page
     where = []
     params = []
+    counters = await db.get_stats_counters()
 
     if status != "all":
         where.append("t.status = ?")
         params.append(status)
+        total = counters.get(f"tickets:{status}", 0)
+    else:
+        total = counters.get("tickets_total", 0)
 
-    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    position = _parse_cursor(cursor)
+    if position:
+        where.append("(t.created_at, t.id) < (?, ?)")
+        params.extend(position)
 
-    count_sql = f"SELECT COUNT(*) as cnt FROM moderator_tickets t {where_sql}"
-    cursor = await db._conn.execute(count_sql, params)
-    total = (await cursor.fetchone())["cnt"]
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
 
     data_sql = (
         f"SELECT t.id, t.user_telegram_id, t.status, "
@@ -141,30 +200,34 @@ async def sql_list_tickets(db: Database, page: int = 1, per_page: int = 20,
         f"u.username, u.first_name "
         f"FROM moderator_tickets t "
         f"LEFT JOIN users u ON t.user_telegram_id = u.telegram_id "
-        f"{where_sql} ORDER BY t.created_at DESC LIMIT ? OFFSET ?"
+        f"{where_sql} ORDER BY t.created_at DESC, t.id DESC LIMIT ?"
     )
-    cursor = await db._conn.execute(data_sql, params + [per_page, offset])
-    items = [dict(row) for row in await cursor.fetchall()]
-    return items, total
+    rows = await (await db._conn.execute(data_sql, params + [per_page + 1])).fetchall()
+    items, next_cursor = _keyset_page(rows, per_page)
+    return items, total, next_cursor
 
 
-async def sql_list_logs(db: Database, page: int = 1, per_page: int = 50,
+async def sql_list_logs(db: Database, cursor: str = "", per_page: int = 50,
                         filter_: str = "all"):
     """Недавние запросы с JOIN пользователей."""
-    offset = (page - 1) * per_page
     where = []
     params = []
+    counters = await db.get_stats_counters()
+    total = counters.get("queries_total", 0)
 
     if filter_ == "answered":
         where.append("q.was_answered = TRUE")
+        total = counters.get("queries_answered", 0)
     elif filter_ == "unanswered":
         where.append("q.was_answered = FALSE")
+        total -= counters.get("queries_answered", 0)
 
-    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    position = _parse_cursor(cursor)
+    if position:
+        where.append("(q.created_at, q.id) < (?, ?)")
+        params.extend(position)
 
-    count_sql = f"SELECT COUNT(*) as cnt FROM query_logs q {where_sql}"
-    cursor = await db._conn.execute(count_sql, params)
-    total = (await cursor.fetchone())["cnt"]
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
 
     data_sql = (
         f"SELECT q.id, q.user_telegram_id, "
@@ -174,11 +237,110 @@ async def sql_list_logs(db: Database, page: int = 1, per_page: int = 50,
         f"u.username, u.first_name "
         f"FROM query_logs q "
         f"LEFT JOIN users u ON q.user_telegram_id = u.telegram_id "
-        f"{where_sql} ORDER BY q.created_at DESC LIMIT ? OFFSET ?"
+        f"{where_sql} ORDER BY q.created_at DESC, q.id DESC LIMIT ?"
     )
-    cursor = await db._conn.execute(data_sql, params + [per_page, offset])
-    items = [dict(row) for row in await cursor.fetchall()]
-    return items, total
+    rows = await (await db._conn.execute(data_sql, params + [per_page + 1])).fetchall()
+    items, next_cursor = _keyset_page(rows, per_page)
+    return items, total, next_cursor
+
+
+async def sql_search_logs(db: Database, search: str, limit: int = 100, filter_: str = "all"):
+    """Полнотекстовый поиск по логам (FTS5) со сниппетами, по релевантности."""
+    match = _fts_query(search)
+    if not match:
+        return []
+    where = ["query_logs_fts MATCH ?"]
+    params = [match]
+
+    if filter_ == "answered":
+        where.append("q.was_answered = TRUE")
+    elif filter_ == "unanswered":
+        where.append("q.was_answered = FALSE")
+
+    # char(2)/char(3) — маркеры подсветки, заменяются на <mark> после экранирования в SPA
+    data_sql = (
+        f"SELECT q.id, q.user_telegram_id, "
+        f"snippet(query_logs_fts, 0, char(2), char(3), '…', 16) as query_snippet, "
+        f"snippet(query_logs_fts, 1, char(2), char(3), '…', 16) as answer_snippet, "
+        f"SUBSTR(q.matched_question, 1, 200) as matched_question, "
+        f"q.similarity_score, q.was_answered, q.created_at, "
+        f"u.username, u.first_name "
+        f"FROM query_logs_fts "
+        f"JOIN query_logs q ON q.id = query_logs_fts.rowid "
+        f"LEFT JOIN users u ON q.user_telegram_id = u.telegram_id "
+        f"WHERE {' AND '.join(where)} "
+        f"ORDER BY bm25(query_logs_fts, 2.0, 1.0) LIMIT ?"
+    )
+    cursor = await db._conn.execute(data_sql, params + [limit])
+    return [dict(row) for row in await cursor.fetchall()]
+
+
+async def sql_distinct_questions(db: Database, search: str = "", filter_: str = "unanswered",
+                                 limit: int = 300):
+    """Различные нормализованные запросы с частотой — вход для группировки похожих."""
+    where = []
+    params = []
+
+    if filter_ == "answered":
+        where.append("q.was_answered = TRUE")
+    elif filter_ == "unanswered":
+        where.append("q.was_answered = FALSE")
+
+    if search:
+        match = _fts_query(search)
+        if not match:
+            return []
+        where.append("q.id IN (SELECT rowid FROM query_logs_fts WHERE query_logs_fts MATCH ?)")
+        params.append(match)
+
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+
+    data_sql = (
+        f"SELECT q.normalized_text, MAX(q.matched_question) as matched_question, "
+        f"SUBSTR(MAX(q.query_text), 1, 200) as query_text, COUNT(*) as cnt "
+        f"FROM query_logs q {where_sql} "
+        f"GROUP BY q.normalized_text ORDER BY cnt DESC LIMIT ?"
+    )
+    cursor = await db._conn.execute(data_sql, params + [limit])
+    return [dict(row) for row in await cursor.fetchall()]
+
+
+async def sql_list_broadcasts(db: Database, limit: int = 20):
+    """Последние рассылки со статусами сообщений (одним запросом)."""
+    cursor = await db._conn.execute(
+        "SELECT j.id, j.total, j.created_at, o.status, COUNT(o.id) as cnt "
+        "FROM (SELECT * FROM delivery_jobs WHERE kind = 'broadcast' ORDER BY id DESC LIMIT ?) j "
+        "LEFT JOIN outbox o ON o.job_id = j.id "
+        "GROUP BY j.id, o.status ORDER BY j.id DESC",
+        (limit,),
+    )
+    jobs: dict[int, dict] = {}
+    for row in await cursor.fetchall():
+        job = jobs.setdefault(row["id"], {
+            "id": row["id"], "total": row["total"], "created_at": row["created_at"], "statuses": {},
+        })
+        if row["status"]:
+            job["statuses"][row["status"]] = row["cnt"]
+    return list(jobs.values())
+
+
+async def _get_cache_engine(app):
+    """
+    ChromaDB-кэш ИИ-ответов: открывается при первом обращении. Модель
+    эмбеддингов грузится позже — при первой группировке вопросов без вектора в кэше.
+    """
+    state = app["ai_cache"]
+    async with state["lock"]:
+        if not state["opened"]:
+            state["opened"] = True
+            try:
+                from core.search_engine import SearchEngine
+                engine = SearchEngine()
+                await asyncio.to_thread(engine.init_cache_only)
+                state["engine"] = engine
+            except Exception as e:
+                logger.warning(f"AI cache unavailable, similar questions grouped by exact text: {e}")
+    return state["engine"]
 
 
 async def sql_get_user_detail(db: Database, telegram_id: int):
@@ -256,23 +418,24 @@ def _json(data, status=200):
 
 async def handle_dashboard(request):
     db: Database = request.app["db"]
-    total_users = await db.get_total_users()
-    total_queries = await db.get_total_queries()
-    answered = await db.get_answered_queries()
-    subscribed = await db.get_subscribed_users()
+    counters = await db.get_stats_counters()
     consultation_stats = await db.get_consultation_stats()
     ticket_stats = await db.get_ticket_stats()
+    daily = await db.get_stats_rollup("daily", 14)
 
+    total_queries = counters.get("queries_total", 0)
+    answered = counters.get("queries_answered", 0)
     answered_pct = round(answered / total_queries * 100, 1) if total_queries else 0
 
     return _json({
-        "total_users": total_users,
+        "total_users": counters.get("users_total", 0),
         "total_queries": total_queries,
         "answered_queries": answered,
         "answered_pct": answered_pct,
-        "subscribed_users": subscribed,
+        "subscribed_users": counters.get("users_subscribed", 0),
         "consultation_stats": consultation_stats,
         "ticket_stats": ticket_stats,
+        "daily": daily,
     })
 
 
@@ -280,11 +443,11 @@ async def handle_dashboard(request):
 
 async def handle_users_list(request):
     db: Database = request.app["db"]
-    page = max(1, min(int(request.query.get("page", 1)), 10000))
+    cursor = request.query.get("cursor", "")[:64]
     search = request.query.get("search", "")[:200]
     filter_ = request.query.get("filter", "all")
-    items, total = await sql_list_users(db, page, 25, search, filter_)
-    return _json({"items": items, "total": total, "page": page, "per_page": 25})
+    items, total, next_cursor = await sql_list_users(db, cursor, 25, search, filter_)
+    return _json({"items": items, "total": total, "next_cursor": next_cursor, "per_page": 25})
 
 
 async def handle_user_detail(request):
@@ -317,10 +480,10 @@ async def handle_user_revoke(request):
 
 async def handle_consultations_list(request):
     db: Database = request.app["db"]
-    page = max(1, min(int(request.query.get("page", 1)), 10000))
+    cursor = request.query.get("cursor", "")[:64]
     status = request.query.get("status", "all")
-    items, total = await sql_list_consultations(db, page, 20, status)
-    return _json({"items": items, "total": total, "page": page, "per_page": 20})
+    items, total, next_cursor = await sql_list_consultations(db, cursor, 20, status)
+    return _json({"items": items, "total": total, "next_cursor": next_cursor, "per_page": 20})
 
 
 async def handle_consultation_detail(request):
@@ -368,10 +531,10 @@ async def handle_ustaz_activate(request):
 
 async def handle_tickets_list(request):
     db: Database = request.app["db"]
-    page = max(1, min(int(request.query.get("page", 1)), 10000))
+    cursor = request.query.get("cursor", "")[:64]
     status = request.query.get("status", "all")
-    items, total = await sql_list_tickets(db, page, 20, status)
-    return _json({"items": items, "total": total, "page": page, "per_page": 20})
+    items, total, next_cursor = await sql_list_tickets(db, cursor, 20, status)
+    return _json({"items": items, "total": total, "next_cursor": next_cursor, "per_page": 20})
 
 
 async def handle_ticket_detail(request):
@@ -448,10 +611,50 @@ async def handle_kaspi_receipt(request):
 
 async def handle_logs_list(request):
     db: Database = request.app["db"]
-    page = max(1, min(int(request.query.get("page", 1)), 10000))
+    cursor = request.query.get("cursor", "")[:64]
     filter_ = request.query.get("filter", "all")
-    items, total = await sql_list_logs(db, page, 50, filter_)
-    return _json({"items": items, "total": total, "page": page, "per_page": 50})
+    items, total, next_cursor = await sql_list_logs(db, cursor, 50, filter_)
+    return _json({"items": items, "total": total, "next_cursor": next_cursor, "per_page": 50})
+
+
+async def handle_logs_search(request):
+    db: Database = request.app["db"]
+    search = request.query.get("q", "")[:200]
+    filter_ = request.query.get("filter", "all")
+    items = await sql_search_logs(db, search, 100, filter_)
+    return _json({"items": items})
+
+
+async def handle_logs_similar(request):
+    """
+    Группы похожих вопросов по эмбеддингам: из кэша ИИ-ответов, а для вопросов
+    без кэшированного ответа (неотвеченные) — посчитанным моделью в процессе админки.
+    """
+    db: Database = request.app["db"]
+    search = request.query.get("q", "")[:200]
+    filter_ = request.query.get("filter", "unanswered")
+    rows = await sql_distinct_questions(db, search, filter_)
+
+    engine = await _get_cache_engine(request.app)
+    if engine is not None and rows:
+        variants = [
+            tuple(v for v in (r["normalized_text"], r["matched_question"]) if v)
+            for r in rows
+        ]
+        index_groups = await engine.group_similar(variants, SIMILAR_QUESTIONS_THRESHOLD)
+    else:
+        index_groups = [[i] for i in range(len(rows))]
+
+    groups = []
+    for indexes in index_groups:
+        members = [rows[i] for i in indexes]
+        groups.append({
+            "question": members[0]["query_text"],
+            "total": sum(m["cnt"] for m in members),
+            "variants": [{"query_text": m["query_text"], "cnt": m["cnt"]} for m in members],
+        })
+    groups.sort(key=lambda g: g["total"], reverse=True)
+    return _json({"items": groups[:50], "embeddings": engine is not None})
 
 
 async def handle_logs_top_unanswered(request):
@@ -469,36 +672,49 @@ async def handle_logs_top_questions(request):
 # ─── Broadcast ───
 
 async def handle_broadcast(request):
+    """Поставить рассылку в outbox; отправляет DeliveryEngine в процессе бота."""
     db: Database = request.app["db"]
-    bot: Bot = request.app["bot"]
     body = await request.json()
     message = body.get("message", "").strip()
     if not message:
         return _json({"error": "Message cannot be empty"}, 400)
 
-    cursor = await db._conn.execute(
-        "SELECT telegram_id FROM users WHERE is_onboarded = TRUE"
-    )
-    rows = await cursor.fetchall()
-    user_ids = [row["telegram_id"] for row in rows]
+    job_id = await db.create_delivery_job("broadcast", message)
+    total = 0
+    async for chunk in db.iter_audience():
+        total += await db.enqueue_outbox(
+            job_id, [(u["telegram_id"], None, None) for u in chunk], PRIORITY_BROADCAST,
+        )
 
-    total = len(user_ids)
-    sent = 0
-    failed = 0
-    errors = []
+    logger.info(f"Broadcast #{job_id} queued: total={total}")
+    return _json({"job_id": job_id, "total": total})
+
+
+async def handle_broadcast_status(request):
+    db: Database = request.app["db"]
+    job = await db.get_delivery_job(int(request.match_info["id"]))
+    if not job:
+        return _json({"error": "Broadcast not found"}, 404)
+    return _json(_job_progress(job))
 
-    for i, tid in enumerate(user_ids):
-        try:
-            await bot.send_message(tid, message, parse_mode=ParseMode.HTML)
-            sent += 1
-        except Exception as e:
-            failed += 1
-            errors.append({"telegram_id": tid, "error": str(e)})
-        if (i + 1) % 25 == 0:
-            await asyncio.sleep(1)
 
-    logger.info(f"Broadcast: total={total}, sent={sent}, failed={failed}")
-    return _json({"total": total, "sent": sent, "failed": failed, "errors": errors})
+async def handle_broadcasts_list(request):
+    db: Database = request.app["db"]
+    items = await sql_list_broadcasts(db)
+    return _json({"items": [_job_progress(job) for job in items]})
+
+
+def _job_progress(job: dict) -> dict:
+    statuses = job.get("statuses", {})
+    return {
+        "id": job["id"],
+        "created_at": job["created_at"],
+        "total": job["total"],
+        "sent": statuses.get("sent", 0),
+        "pending": statuses.get("pending", 0) + statuses.get("sending", 0),
+        "failed": statuses.get("failed", 0) + statuses.get("expired", 0),
+        "unreachable": statuses.get("unreachable", 0),
+    }
 
 
 # ─── Settings ───
@@ -518,9 +734,68 @@ async def handle_settings(request):
         "KASPI_PAY_LINK": KASPI_PAY_LINK or "-",
         "KASPI_PRICE_KZT": KASPI_PRICE_KZT,
         "KASPI_PLAN_DAYS": KASPI_PLAN_DAYS,
+        "PROFILE_MAX_SECONDS": PROFILE_MAX_SECONDS,
     })
 
 
+# ─── Metrics (Prometheus) ───
+
+async def handle_metrics(request):
+    """Метрики всех процессов бота: сумма свежих снимков из metrics_snapshots."""
+    db: Database = request.app["db"]
+    max_age = max(60, 4 * METRICS_FLUSH_INTERVAL)
+    snapshots = [json.loads(data) for data in await db.get_metrics_snapshots(max_age)]
+    return web.Response(
+        text=render_prometheus(merge_snapshots(snapshots)),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+# ─── Profiling ───
+
+async def handle_profile_start(request):
+    """Заявка на профиль; снимает процесс бота (core.profiler.profile_request_task)."""
+    db: Database = request.app["db"]
+    body = await request.json()
+    try:
+        seconds = float(body.get("seconds", 10))
+    except (TypeError, ValueError):
+        return _json({"error": "seconds must be a number"}, 400)
+    if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+        return _json({"error": f"seconds must be between 1 and {PROFILE_MAX_SECONDS}"}, 400)
+    fmt = body.get("format", "speedscope")
+    if fmt not in PROFILE_FORMATS:
+        return _json({"error": f"format must be one of: {', '.join(PROFILE_FORMATS)}"}, 400)
+
+    request_id = await db.create_profile_request(seconds, fmt)
+    logger.info(f"Profile #{request_id} requested: {seconds:g}s, {fmt}")
+    return _json({"id": request_id})
+
+
+async def handle_profile_status(request):
+    db: Database = request.app["db"]
+    item = await db.get_profile_request(int(request.match_info["id"]))
+    if not item:
+        return _json({"error": "Profile not found"}, 404)
+    return _json(item)
+
+
+async def handle_profile_download(request):
+    db: Database = request.app["db"]
+    item = await db.get_profile_request(int(request.match_info["id"]), with_result=True)
+    if not item or item["status"] != "done":
+        return _json({"error": "Profile not ready"}, 404)
+    if item["format"] == "collapsed":
+        filename, content_type = f"profile-{item['id']}.collapsed.txt", "text/plain"
+    else:
+        filename, content_type = f"profile-{item['id']}.speedscope.json", "application/json"
+    return web.Response(
+        text=item["result"],
+        content_type=content_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 # ══════════════════════════════════════════════════════════════════
 #  Секция 4: HTML SPA
 # ══════════════════════════════════════════════════════════════════
@@ -654,6 +929,9 @@ textarea{resize:vertical;min-height:80px;width:100%;font-family:inherit}
 .tab:hover{color:#e4e6eb}
 .tab.active{color:#3390ec;border-bottom-color:#3390ec}
 
+/* FTS highlight */
+mark{background:#3390ec33;color:#e4e6eb;border-radius:2px;padding:0 1px}
+
 /* Truncate */
 .truncate{max-width:300px;overflow:hidden;text-overflow:ellipsis;white-space:nowrap;display:block}
 
@@ -796,6 +1074,24 @@ function paginationHTML(total, page, perPage, onClickFn) {
   return h;
 }
 
+// ─── Keyset pagination (курсоры страниц по разделам) ───
+const cursors = {};
+function cursorFor(view, page) {
+  if (page <= 1 || !cursors[view]) cursors[view] = [''];
+  return cursors[view][page - 1] || '';
+}
+function keysetPaginationHTML(view, d, page, onClickFn) {
+  if (d.next_cursor) cursors[view][page] = d.next_cursor;
+  if (page <= 1 && !d.next_cursor) return '';
+  let h = '<div class="pagination">';
+  if (page > 1) h += `<div class="pg-btn" onclick="${onClickFn}(${page-1})">&laquo;</div>`;
+  h += `<div class="pg-btn active">${page}</div>`;
+  if (d.next_cursor) h += `<div class="pg-btn" onclick="${onClickFn}(${page+1})">&raquo;</div>`;
+  if (d.total !== null && d.total !== undefined) h += `<div class="pg-info">${d.total} total</div>`;
+  h += '</div>';
+  return h;
+}
+
 // ─── Navigation ───
 function navigate(page) {
   currentPage = page;
@@ -872,6 +1168,14 @@ async function renderDashboard() {
             <div class="stat-card"><div class="label">Total</div><div class="value">${ts.total||0}</div></div>
           </div>
         </div>
+      </div>
+      <div class="section">
+        <h2>Last 14 days</h2>
+        <table>
+          <tr><th>Day</th><th>New Users</th><th>Queries</th><th>Answered</th><th>Consultations</th><th>Tickets</th></tr>
+          ${(d.daily||[]).map(r => `<tr><td>${esc(r.bucket)}</td><td>${r.new_users||0}</td><td>${r.queries||0}</td>
+            <td>${r.answered||0}</td><td>${r.consultations||0}</td><td>${r.tickets||0}</td></tr>`).join('')}
+        </table>
       </div>`;
   } catch(e) { toast(e.message, 'error'); }
 }
@@ -882,7 +1186,7 @@ let usersFilter = 'all';
 
 async function renderUsers(page) {
   try {
-    const d = await apiGet(`/api/admin/users?page=${page}&search=${encodeURIComponent(usersSearch)}&filter=${usersFilter}`);
+    const d = await apiGet(`/api/admin/users?cursor=${encodeURIComponent(cursorFor('users', page))}&search=${encodeURIComponent(usersSearch)}&filter=${usersFilter}`);
     let h = `
       <div class="section">
         <h2>Users</h2>
@@ -893,6 +1197,7 @@ async function renderUsers(page) {
             <option value="all"${usersFilter==='all'?' selected':''}>All</option>
             <option value="subscribed"${usersFilter==='subscribed'?' selected':''}>Subscribed</option>
             <option value="free"${usersFilter==='free'?' selected':''}>Free</option>
+            <option value="unreachable"${usersFilter==='unreachable'?' selected':''}>Unreachable</option>
           </select>
         </div>
         <table>
@@ -904,7 +1209,7 @@ async function renderUsers(page) {
       h += `<tr>
         <td>${u.telegram_id}</td>
         <td>${esc(u.username ? '@'+u.username : '-')}</td>
-        <td>${esc(u.first_name||'-')}</td>
+        <td>${esc(u.first_name||'-')}${u.delivery_status && u.delivery_status !== 'ok' ? ` <span class="badge badge-no">${esc(u.delivery_status)}</span>` : ''}</td>
         <td>${u.answers_count}</td>
         <td>${sub}</td>
         <td>${esc(u.city||'-')}</td>
@@ -919,7 +1224,7 @@ async function renderUsers(page) {
         </td>
       </tr>`;
     }
-    h += `</table>${paginationHTML(d.total, d.page, d.per_page, 'renderUsers')}</div>`;
+    h += `</table>${keysetPaginationHTML('users', d, page, 'renderUsers')}</div>`;
     document.getElementById('main').innerHTML = h;
   } catch(e) { toast(e.message, 'error'); }
 }
@@ -1012,7 +1317,7 @@ let consFilter = 'all';
 
 async function renderConsultations(page) {
   try {
-    const d = await apiGet(`/api/admin/consultations?page=${page}&status=${consFilter}`);
+    const d = await apiGet(`/api/admin/consultations?cursor=${encodeURIComponent(cursorFor('consultations', page))}&status=${consFilter}`);
     let h = `
       <div class="section">
         <h2>Consultations</h2>
@@ -1037,7 +1342,7 @@ async function renderConsultations(page) {
         <td><button class="btn btn-primary btn-sm" onclick="showConsultation(${c.id})">View</button></td>
       </tr>`;
     }
-    h += `</table>${paginationHTML(d.total, d.page, d.per_page, 'renderConsultations')}</div>`;
+    h += `</table>${keysetPaginationHTML('consultations', d, page, 'renderConsultations')}</div>`;
     document.getElementById('main').innerHTML = h;
   } catch(e) { toast(e.message,'error'); }
 }
@@ -1134,7 +1439,7 @@ let ticketFilter = 'all';
 
 async function renderTickets(page) {
   try {
-    const d = await apiGet(`/api/admin/tickets?page=${page}&status=${ticketFilter}`);
+    const d = await apiGet(`/api/admin/tickets?cursor=${encodeURIComponent(cursorFor('tickets', page))}&status=${ticketFilter}`);
     let h = `
       <div class="section">
         <h2>Tickets</h2>
@@ -1161,7 +1466,7 @@ async function renderTickets(page) {
         <td>${actions}</td>
       </tr>`;
     }
-    h += `</table>${paginationHTML(d.total, d.page, d.per_page, 'renderTickets')}</div>`;
+    h += `</table>${keysetPaginationHTML('tickets', d, page, 'renderTickets')}</div>`;
     document.getElementById('main').innerHTML = h;
   } catch(e) { toast(e.message,'error'); }
 }
@@ -1214,30 +1519,47 @@ async function doAnswerTicket(id) {
 // ─── Logs ───
 let logsFilter = 'all';
 let logsTab = 'recent';
-
-async function renderLogs(page) {
-  let tabsH = `
-    <div class="tabs">
-      <div class="tab${logsTab==='recent'?' active':''}" onclick="logsTab='recent';renderLogs(1)">Recent Queries</div>
-      <div class="tab${logsTab==='unanswered'?' active':''}" onclick="logsTab='unanswered';renderLogsUnanswered()">Top Unanswered</div>
-      <div class="tab${logsTab==='popular'?' active':''}" onclick="logsTab='popular';renderLogsPopular()">Top Popular</div>
-    </div>`;
-
-  if (logsTab !== 'recent') {
-    if (logsTab === 'unanswered') { renderLogsUnanswered(); return; }
-    if (logsTab === 'popular') { renderLogsPopular(); return; }
+let logsSearch = '';
+
+function logsTabsHTML() {
+  const tabs = [
+    ['recent', 'Recent Queries', 'renderLogs(1)'],
+    ['unanswered', 'Top Unanswered', 'renderLogsUnanswered()'],
+    ['popular', 'Top Popular', 'renderLogsPopular()'],
+    ['similar', 'Similar Questions', 'renderLogsSimilar()'],
+  ];
+  let h = '<div class="tabs">';
+  for (const [key, title, fn] of tabs) {
+    h += `<div class="tab${logsTab===key?' active':''}" onclick="logsTab='${key}';${fn}">${title}</div>`;
   }
+  return h + '</div>';
+}
 
-  try {
-    const d = await apiGet(`/api/admin/logs?page=${page}&filter=${logsFilter}`);
-    let h = `<div class="section"><h2>Logs</h2>${tabsH}
+function logsToolbarHTML(onChangeFn) {
+  return `
       <div class="toolbar">
-        <select onchange="logsFilter=this.value;renderLogs(1)">
+        <input type="text" id="logsSearch" placeholder="Full-text search..." value="${esc(logsSearch)}"
+          oninput="clearTimeout(debounceTimer);debounceTimer=setTimeout(()=>{logsSearch=this.value;${onChangeFn}},400)">
+        <select onchange="logsFilter=this.value;${onChangeFn}">
           <option value="all"${logsFilter==='all'?' selected':''}>All</option>
           <option value="answered"${logsFilter==='answered'?' selected':''}>Answered</option>
           <option value="unanswered"${logsFilter==='unanswered'?' selected':''}>Unanswered</option>
         </select>
-      </div>
+      </div>`;
+}
+
+// Сниппет FTS5: экранируем, затем маркеры \u0002/\u0003 → <mark>
+function hl(s) { return esc(s).replace(/\u0002/g,'<mark>').replace(/\u0003/g,'</mark>'); }
+
+async function renderLogs(page) {
+  if (logsTab === 'unanswered') { renderLogsUnanswered(); return; }
+  if (logsTab === 'popular') { renderLogsPopular(); return; }
+  if (logsTab === 'similar') { renderLogsSimilar(); return; }
+  if (logsSearch.trim()) { renderLogsSearch(); return; }
+
+  try {
+    const d = await apiGet(`/api/admin/logs?cursor=${encodeURIComponent(cursorFor('logs', page))}&filter=${logsFilter}`);
+    let h = `<div class="section"><h2>Logs</h2>${logsTabsHTML()}${logsToolbarHTML('renderLogs(1)')}
       <table>
         <tr><th>ID</th><th>User</th><th>Query</th><th>Matched</th><th>Score</th><th>Answered</th><th>Date</th></tr>`;
     for (const l of d.items) {
@@ -1251,22 +1573,38 @@ async function renderLogs(page) {
         <td>${fmtDate(l.created_at)}</td>
       </tr>`;
     }
-    h += `</table>${paginationHTML(d.total, d.page, d.per_page, 'renderLogs')}</div>`;
+    h += `</table>${keysetPaginationHTML('logs', d, page, 'renderLogs')}</div>`;
+    document.getElementById('main').innerHTML = h;
+  } catch(e) { toast(e.message,'error'); }
+}
+
+async function renderLogsSearch() {
+  try {
+    const d = await apiGet(`/api/admin/logs/search?q=${encodeURIComponent(logsSearch)}&filter=${logsFilter}`);
+    let h = `<div class="section"><h2>Logs</h2>${logsTabsHTML()}${logsToolbarHTML('renderLogs(1)')}
+      <table>
+        <tr><th>ID</th><th>User</th><th>Query</th><th>Answer</th><th>Answered</th><th>Date</th></tr>`;
+    for (const l of d.items) {
+      h += `<tr>
+        <td>${l.id}</td>
+        <td>${userName(l,'')}</td>
+        <td>${hl(l.query_snippet)}</td>
+        <td>${hl(l.answer_snippet) || '-'}</td>
+        <td>${l.was_answered ? '<span class="badge badge-yes">Yes</span>' : '<span class="badge badge-no">No</span>'}</td>
+        <td>${fmtDate(l.created_at)}</td>
+      </tr>`;
+    }
+    if (!d.items.length) h += '<tr><td colspan="6" style="text-align:center;color:#8899a6">Nothing found</td></tr>';
+    h += '</table></div>';
     document.getElementById('main').innerHTML = h;
   } catch(e) { toast(e.message,'error'); }
 }
 
 async function renderLogsUnanswered() {
   logsTab = 'unanswered';
-  const tabsH = `
-    <div class="tabs">
-      <div class="tab" onclick="logsTab='recent';renderLogs(1)">Recent Queries</div>
-      <div class="tab active" onclick="logsTab='unanswered';renderLogsUnanswered()">Top Unanswered</div>
-      <div class="tab" onclick="logsTab='popular';renderLogsPopular()">Top Popular</div>
-    </div>`;
   try {
     const d = await apiGet('/api/admin/logs/top-unanswered');
-    let h = `<div class="section"><h2>Logs</h2>${tabsH}
+    let h = `<div class="section"><h2>Logs</h2>${logsTabsHTML()}
       <table><tr><th>#</th><th>Question</th><th>Count</th></tr>`;
     d.items.forEach((item, i) => {
       h += `<tr><td>${i+1}</td><td>${esc(item.query_text)}</td><td><span class="badge badge-pending">${item.cnt}</span></td></tr>`;
@@ -1279,15 +1617,9 @@ async function renderLogsUnanswered() {
 
 async function renderLogsPopular() {
   logsTab = 'popular';
-  const tabsH = `
-    <div class="tabs">
-      <div class="tab" onclick="logsTab='recent';renderLogs(1)">Recent Queries</div>
-      <div class="tab" onclick="logsTab='unanswered';renderLogsUnanswered()">Top Unanswered</div>
-      <div class="tab active" onclick="logsTab='popular';renderLogsPopular()">Top Popular</div>
-    </div>`;
   try {
     const d = await apiGet('/api/admin/logs/top-questions');
-    let h = `<div class="section"><h2>Logs</h2>${tabsH}
+    let h = `<div class="section"><h2>Logs</h2>${logsTabsHTML()}
       <table><tr><th>#</th><th>Matched Question</th><th>Count</th></tr>`;
     d.items.forEach((item, i) => {
       h += `<tr><td>${i+1}</td><td>${esc(item.matched_question)}</td><td><span class="badge badge-answered">${item.cnt}</span></td></tr>`;
@@ -1298,6 +1630,23 @@ async function renderLogsPopular() {
   } catch(e) { toast(e.message,'error'); }
 }
 
+async function renderLogsSimilar() {
+  logsTab = 'similar';
+  try {
+    const d = await apiGet(`/api/admin/logs/similar?q=${encodeURIComponent(logsSearch)}&filter=${logsFilter}`);
+    let h = `<div class="section"><h2>Logs</h2>${logsTabsHTML()}${logsToolbarHTML('renderLogsSimilar()')}`;
+    if (!d.embeddings) h += '<p style="color:#8899a6;font-size:13px;margin-bottom:12px">AI cache unavailable — grouped by exact text</p>';
+    h += '<table><tr><th>#</th><th>Question</th><th>Variants</th><th>Count</th></tr>';
+    d.items.forEach((g, i) => {
+      const variants = g.variants.slice(1).map(v => `${esc(v.query_text)} <span style="color:#8899a6">(${v.cnt})</span>`).join('<br>');
+      h += `<tr><td>${i+1}</td><td>${esc(g.question)}</td><td>${variants || '-'}</td><td><span class="badge badge-pending">${g.total}</span></td></tr>`;
+    });
+    if (!d.items.length) h += '<tr><td colspan="4" style="text-align:center;color:#8899a6">No data</td></tr>';
+    h += '</table></div>';
+    document.getElementById('main').innerHTML = h;
+  } catch(e) { toast(e.message,'error'); }
+}
+
 // ─── Kaspi Payments ───
 let kaspiFilter = 'all';
 
@@ -1388,12 +1737,15 @@ async function showReceipt(id, amount, status, createdAt) {
 }
 
 // ─── Broadcast ───
+let broadcastPoll = null;
+
 function renderBroadcast() {
   document.getElementById('main').innerHTML = `
     <div class="section">
       <h2>Broadcast Message</h2>
       <p style="color:#8899a6;font-size:13px;margin-bottom:16px">
         Send a message to all onboarded users. Supports HTML formatting.
+        Messages are queued and delivered by the bot at Telegram's rate limit.
       </p>
       <div style="display:grid;grid-template-columns:1fr 1fr;gap:16px">
         <div>
@@ -1412,7 +1764,9 @@ function renderBroadcast() {
         </div>
       </div>
       <div id="broadcastResult" style="margin-top:20px"></div>
+      <div id="broadcastHistory" style="margin-top:20px"></div>
     </div>`;
+  renderBroadcastHistory();
 }
 
 function updateBroadcastPreview() {
@@ -1420,6 +1774,48 @@ function updateBroadcastPreview() {
   document.getElementById('broadcastPreview').innerHTML = msg || '<span style="color:#8899a6">Preview will appear here...</span>';
 }
 
+function broadcastProgressHTML(r) {
+  return `<div class="stat-cards">
+      <div class="stat-card"><div class="label">Total</div><div class="value">${r.total}</div></div>
+      <div class="stat-card"><div class="label">Sent</div><div class="value green">${r.sent}</div></div>
+      <div class="stat-card"><div class="label">Pending</div><div class="value">${r.pending}</div></div>
+      <div class="stat-card"><div class="label">Failed</div><div class="value orange">${r.failed}</div></div>
+      <div class="stat-card"><div class="label">Unreachable</div><div class="value orange">${r.unreachable}</div></div>
+    </div>`;
+}
+
+async function renderBroadcastHistory() {
+  const el = document.getElementById('broadcastHistory');
+  if (!el) return;
+  try {
+    const d = await apiGet('/api/admin/broadcasts');
+    if (!d.items.length) { el.innerHTML = ''; return; }
+    let h = '<h3>Recent broadcasts</h3><table><tr><th>ID</th><th>Date</th><th>Total</th><th>Sent</th><th>Pending</th><th>Failed</th><th>Unreachable</th></tr>';
+    for (const j of d.items) {
+      h += `<tr><td>${j.id}</td><td>${fmtDate(j.created_at)}</td><td>${j.total}</td><td>${j.sent}</td>
+        <td>${j.pending}</td><td>${j.failed}</td><td>${j.unreachable}</td></tr>`;
+    }
+    el.innerHTML = h + '</table>';
+  } catch(e) { toast(e.message,'error'); }
+}
+
+function watchBroadcast(jobId) {
+  clearInterval(broadcastPoll);
+  broadcastPoll = setInterval(async () => {
+    const el = document.getElementById('broadcastResult');
+    if (!el) { clearInterval(broadcastPoll); return; }
+    try {
+      const r = await apiGet(`/api/admin/broadcast/${jobId}`);
+      el.innerHTML = broadcastProgressHTML(r);
+      if (!r.pending) {
+        clearInterval(broadcastPoll);
+        toast('Broadcast complete: ' + r.sent + ' sent, ' + (r.failed + r.unreachable) + ' failed', 'success');
+        renderBroadcastHistory();
+      }
+    } catch(e) { clearInterval(broadcastPoll); toast(e.message,'error'); }
+  }, 2000);
+}
+
 async function doBroadcast() {
   const msg = document.getElementById('broadcastMsg').value.trim();
   if (!msg) { toast('Message cannot be empty','error'); return; }
@@ -1427,24 +1823,15 @@ async function doBroadcast() {
 
   const btn = document.getElementById('broadcastBtn');
   btn.disabled = true;
-  btn.textContent = 'Sending...';
+  btn.textContent = 'Queueing...';
 
   try {
     const r = await apiPost('/api/admin/broadcast', {message: msg});
-    let h = `<div class="stat-cards">
-      <div class="stat-card"><div class="label">Total</div><div class="value">${r.total}</div></div>
-      <div class="stat-card"><div class="label">Sent</div><div class="value green">${r.sent}</div></div>
-      <div class="stat-card"><div class="label">Failed</div><div class="value orange">${r.failed}</div></div>
-    </div>`;
-    if (r.errors && r.errors.length) {
-      h += '<div class="section" style="margin-top:12px"><h3>Errors</h3><table><tr><th>Telegram ID</th><th>Error</th></tr>';
-      for (const e of r.errors) {
-        h += '<tr><td>' + e.telegram_id + '</td><td>' + esc(e.error) + '</td></tr>';
-      }
-      h += '</table></div>';
-    }
-    document.getElementById('broadcastResult').innerHTML = h;
-    toast('Broadcast complete: ' + r.sent + ' sent, ' + r.failed + ' failed', 'success');
+    document.getElementById('broadcastResult').innerHTML =
+      broadcastProgressHTML({total: r.total, sent: 0, pending: r.total, failed: 0, unreachable: 0});
+    toast(`Broadcast #${r.job_id} queued for ${r.total} users`, 'success');
+    watchBroadcast(r.job_id);
+    renderBroadcastHistory();
   } catch(e) { toast(e.message,'error'); }
   finally {
     btn.disabled = false;
@@ -1480,10 +1867,60 @@ async function renderSettings() {
       h += `<tr><td>${esc(name)}</td><td>${plan.price}</td><td>${esc(plan.currency)}</td><td>${plan.days}</td><td>${esc(plan.label)}</td></tr>`;
     }
     h += '</table></div>';
+    h += `<div class="section"><h2>Profiling</h2>
+      <p style="color:#8899a6;font-size:13px;margin-bottom:16px">
+        Sampling profile of the running bot process (event loop, worker threads, SQLite).
+        Open speedscope files at speedscope.app; collapsed stacks work with flamegraph.pl.
+      </p>
+      <div style="display:flex;gap:12px;align-items:flex-end;flex-wrap:wrap">
+        <div class="form-group"><label>Seconds</label>
+          <input id="profileSeconds" type="number" min="1" max="${s.PROFILE_MAX_SECONDS}" value="10" style="width:100px"></div>
+        <div class="form-group"><label>Format</label>
+          <select id="profileFormat"><option value="speedscope">speedscope</option><option value="collapsed">collapsed</option></select></div>
+        <div class="form-group"><button class="btn btn-primary" id="profileBtn" onclick="doProfile()">Start profile</button></div>
+      </div>
+      <div id="profileResult" style="margin-top:12px;color:#8899a6"></div></div>`;
     document.getElementById('main').innerHTML = h;
   } catch(e) { toast(e.message,'error'); }
 }
 
+// ─── Profiling ───
+let profilePoll = null;
+
+async function doProfile() {
+  const seconds = Number(document.getElementById('profileSeconds').value);
+  const format = document.getElementById('profileFormat').value;
+  const btn = document.getElementById('profileBtn');
+  btn.disabled = true;
+  try {
+    const r = await apiPost('/api/admin/profile', {seconds, format});
+    document.getElementById('profileResult').textContent = `Profile #${r.id}: pending...`;
+    watchProfile(r.id);
+  } catch(e) { toast(e.message,'error'); btn.disabled = false; }
+}
+
+function watchProfile(id) {
+  clearInterval(profilePoll);
+  profilePoll = setInterval(async () => {
+    const el = document.getElementById('profileResult');
+    if (!el) { clearInterval(profilePoll); return; }
+    try {
+      const p = await apiGet(`/api/admin/profile/${id}`);
+      if (p.status === 'done') {
+        clearInterval(profilePoll);
+        el.innerHTML = `Profile #${p.id} (${esc(p.process)}): <a href="/api/admin/profile/${p.id}/download">download</a>`;
+      } else if (p.status === 'failed') {
+        clearInterval(profilePoll);
+        el.textContent = `Profile #${p.id} failed: ${p.error}`;
+      } else {
+        el.textContent = `Profile #${p.id}: ${p.status}...`;
+        return;
+      }
+      document.getElementById('profileBtn').disabled = false;
+    } catch(e) { clearInterval(profilePoll); toast(e.message,'error'); }
+  }, 2000);
+}
+
 // ─── Init ───
 navigate('dashboard');
 </script>
@@ -1544,7 +1981,7 @@ async def init_app():
     await db.connect()
     app["db"] = db
 
-    # Bot instance for broadcast
+    # Bot instance (чеки Kaspi)
     bot = Bot(
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
@@ -1556,6 +1993,23 @@ async def init_app():
 
     app.on_cleanup.append(cleanup_bot)
 
+    # Периодический пересчёт топ-N вопросов
+    async def start_stats_refresh(app):
+        app["stats_task"] = asyncio.create_task(stats_refresh_task(app["db"]))
+
+    async def stop_stats_refresh(app):
+        app["stats_task"].cancel()
+        try:
+            await app["stats_task"]
+        except asyncio.CancelledError:
+            pass
+
+    app.on_startup.append(start_stats_refresh)
+    app.on_cleanup.append(stop_stats_refresh)
+
+    # Кэш ИИ-ответов (эмбеддинги для группировки похожих вопросов), открывается лениво
+    app["ai_cache"] = {"engine": None, "opened": False, "lock": asyncio.Lock()}
+
     # SPA
     app.router.add_get("/", handle_index)
 
@@ -1593,13 +2047,25 @@ async def init_app():
     app.router.add_get("/api/admin/logs", handle_logs_list)
     app.router.add_get("/api/admin/logs/top-unanswered", handle_logs_top_unanswered)
     app.router.add_get("/api/admin/logs/top-questions", handle_logs_top_questions)
+    app.router.add_get("/api/admin/logs/search", handle_logs_search)
+    app.router.add_get("/api/admin/logs/similar", handle_logs_similar)
 
     # Broadcast
     app.router.add_post("/api/admin/broadcast", handle_broadcast)
+    app.router.add_get("/api/admin/broadcast/{id}", handle_broadcast_status)
+    app.router.add_get("/api/admin/broadcasts", handle_broadcasts_list)
 
     # Settings
     app.router.add_get("/api/admin/settings", handle_settings)
 
+    # Profiling
+    app.router.add_post("/api/admin/profile", handle_profile_start)
+    app.router.add_get("/api/admin/profile/{id}", handle_profile_status)
+    app.router.add_get("/api/admin/profile/{id}/download", handle_profile_download)
+
+    # Prometheus (та же Basic Auth — basic_auth в scrape_config)
+    app.router.add_get("/metrics", handle_metrics)
+
     return app
 
 